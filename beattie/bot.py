@@ -13,7 +13,6 @@ from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, NoReturn, TypeVar, overload
 
-import httpx
 import toml
 
 from discord import AllowedMentions, Game, Guild, Intents, Message
@@ -25,11 +24,13 @@ from beattie.context import BContext
 from beattie.help import BHelp
 from beattie.utils import contextmanagers, exceptions
 from beattie.utils.aioutils import do_every
+from beattie.utils.http import HTTPClients
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Coroutine, Iterable
 
     import asyncpg
+    import httpx
 
     from discord.http import HTTPClient
 
@@ -44,6 +45,7 @@ class Shared:
     archive_task: Task[NoReturn] | None
     close_task: Task[None] | None
     logger: logging.Logger
+    http: HTTPClients
     session: httpx.AsyncClient
     pool: asyncpg.Pool
     extra: dict[str, Any]
@@ -84,7 +86,8 @@ class Shared:
         self.new_logger()
 
     async def async_init(self):
-        self.session = httpx.AsyncClient(follow_redirects=True, timeout=None)
+        self.http = HTTPClients()
+        self.session = self.http.get()
         await self.config.async_init()
 
     def create_task(self, coro: Coroutine) -> None:
@@ -101,7 +104,7 @@ class Shared:
         return when_mentioned_or(*prefix)(bot, message)
 
     async def _close(self):
-        await self.session.aclose()
+        await self.http.aclose()
         await self.pool.close()
         if self.archive_task is not None:
             self.archive_task.cancel()
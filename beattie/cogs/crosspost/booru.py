@@ -33,7 +33,7 @@ async def get_booru_post(
         return None
     id_ = id_[0]
     params["id"] = id_
-    async with cog.get(api_url, params=params) as resp:
+    async with cog.get(api_url, params=params, coalesce=True) as resp:
         data: Response | list[Post] | None = resp.json()
     if not data:
         return None
@@ -6,26 +6,25 @@ import logging
 import re
 from datetime import datetime
 from itertools import groupby
-from sys import getsizeof
 from typing import TYPE_CHECKING, Any, Literal, NotRequired, TypedDict
 
 import aiohttp
 import httpx
 import toml
 from lxml import etree, html
-from tldextract import ExtractResult, TLDExtract
 
 import discord
 from discord import CategoryChannel, Message, Thread
 from discord.ext import commands
 from discord.ext.commands import BadUnionArgument, ChannelNotFound, Cog
-from discord.utils import format_dt
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES, format_dt
 
-from beattie.cogs.crosspost.exceptions import DownloadError
+from beattie.cogs.crosspost.exceptions import DownloadError, FileTooLargeError
 from beattie.cogs.crosspost.flaresolverr import FlareSolverr
 from beattie.utils.checks import is_owner_or
 from beattie.utils.contextmanagers import get
-from beattie.utils.etc import GB, URL_EXPR, display_bytes, spoiler_spans
+from beattie.utils.etc import URL_EXPR, display_bytes, spoiler_spans
+from beattie.utils.exceptions import ResponseError
 from beattie.utils.type_hints import GuildMessageable
 
 from .context import CrosspostContext
@@ -33,10 +32,21 @@ from .converters import LanguageConverter, PostFlags, text_length_from_arg
 from .converters import Site as SiteConverter
 from .database import Database, Settings
 from .database_types import TextLength
+from .detection import make_executor
+from .domains import DomainResolver
+from .media_cache import MediaCache, is_playlist
+from .postprocess import PostprocessScheduler
 from .queue import FragmentQueue, Postable, QueueKwargs
+from .queue_cache import QueueCache
+from .router import SiteRouter
 from .sites import SITES, Site
+from .spool import Spool, SpoolWriter, clean_spool_dir
+from .state import SiteState
+from .translation_cache import TranslationCache
 from .translator import (
     DONT,
+    BatchingTranslator,
+    CachingTranslator,
     DeeplTranslator,
     HybridTranslator,
     Language,
@@ -47,11 +57,13 @@ from .translator import (
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
+    from concurrent.futures import ThreadPoolExecutor
 
     from beattie.bot import BeattieBot
     from beattie.cogs.crosspost.fragment import Fragment
     from beattie.context import BContext
 
+    from .detection import Detectors
     from .flaresolverr import Config as FsC
 
     TranslatorType = Literal["libre", "deepl", "hybrid", "none"]
@@ -82,7 +94,7 @@ if TYPE_CHECKING:
 
 ConfigTarget = GuildMessageable | CategoryChannel
 
-QUEUE_CACHE_SIZE: int = 1 * GB
+TRANSLATOR_RETRY_DELAY: float = 5.0  # seconds, doubling after each failure
 
 
 def item_priority(item: Fragment):
@@ -103,19 +115,49 @@ def ensure(item: Any, name: str):
         raise KeyError(msg)
 
 
+def content_length(resp: httpx.Response) -> int | None:
+    """The length of the body, if known and not content-encoded"""
+    if resp.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    length = resp.headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
+
+def bot_size_limit(bot: BeattieBot) -> int:
+    """The largest file any of a bot's guilds accept.
+
+    Walking every guild is slow, so it's kept in bot.extra until the bot's guilds
+    change."""
+    if (limit := bot.extra.get("crosspost_size_limit")) is None:
+        limit = max(
+            (guild.filesize_limit for guild in bot.guilds),
+            default=DEFAULT_FILE_SIZE_LIMIT_BYTES,
+        )
+        bot.extra["crosspost_size_limit"] = limit
+    return limit
+
+
 class Crosspost(Cog):
     """Crossposts images from tweets and other social media"""
 
     bot: BeattieBot
 
     sites: list[Site]
+    router: SiteRouter
+    domains: DomainResolver
+    state: SiteState
+    translation_cache: TranslationCache
+    pp_scheduler: PostprocessScheduler
 
     fs_solver_url: str | None
     fs_proxy_url: str | None
     translator: Translator | None
+    translator_ready: bool
+    detectors: Detectors
+    detection_executor: ThreadPoolExecutor
     ongoing_tasks: dict[int, asyncio.Task[None]]
-    queue_cache: dict[tuple[str, ...], FragmentQueue]
-    cache_lock: asyncio.Lock
+    queue_cache: QueueCache
+    media_cache: MediaCache
     session: httpx.AsyncClient
 
     def __init__(self, bot: BeattieBot):
@@ -128,13 +170,45 @@ class Crosspost(Cog):
         else:
             self.ongoing_tasks = {}
             bot.extra["crosspost_ongoing_tasks"] = self.ongoing_tasks
-        if (queue_cache := bot.extra.get("crosspost_queue_cache")) is not None:
-            self.queue_cache = queue_cache
+        queue_cache = bot.extra.get("crosspost_queue_cache")
+        if type(queue_cache).__name__ == "QueueCache":  # for hot reloading
+            self.queue_cache = queue_cache  # type: ignore
         else:
-            self.queue_cache = {}
+            self.queue_cache = QueueCache()
             bot.extra["crosspost_queue_cache"] = self.queue_cache
-        if (session := bot.extra.get("crosspost_session")) is not None:
-            self.session = session
+        if (media_cache := bot.extra.get("crosspost_media_cache")) is not None:
+            self.media_cache = media_cache
+        else:
+            self.media_cache = MediaCache()
+            bot.extra["crosspost_media_cache"] = self.media_cache
+        if (state := bot.extra.get("crosspost_state")) is not None:
+            self.state = state
+        else:
+            self.state = SiteState(bot.pool)
+            bot.extra["crosspost_state"] = self.state
+        if (
+            translation_cache := bot.extra.get("crosspost_translation_cache")
+        ) is not None:
+            self.translation_cache = translation_cache
+        else:
+            self.translation_cache = TranslationCache(bot.pool)
+            bot.extra["crosspost_translation_cache"] = self.translation_cache
+        if (pp_scheduler := bot.extra.get("crosspost_pp_scheduler")) is not None:
+            self.pp_scheduler = pp_scheduler
+        else:
+            self.pp_scheduler = PostprocessScheduler()
+            bot.extra["crosspost_pp_scheduler"] = self.pp_scheduler
+        if (detectors := bot.extra.get("crosspost_detectors")) is not None:
+            self.detectors = detectors
+        else:
+            self.detectors = {}
+            bot.extra["crosspost_detectors"] = self.detectors
+        if (executor := bot.extra.get("crosspost_detection_executor")) is not None:
+            self.detection_executor = executor
+        else:
+            self.detection_executor = make_executor()
+            bot.extra["crosspost_detection_executor"] = self.detection_executor
+        self.session = bot.shared.http.get("crosspost")
 
         self.fs_solver_url = None
         self.fs_proxy_url = None
@@ -152,6 +226,7 @@ class Crosspost(Cog):
             self.fs_proxy_url = proxy_url
 
         self.translator = None
+        self.translator_ready = False
 
         try:
             with open("config/translator.toml") as fp:
@@ -224,17 +299,40 @@ class Crosspost(Cog):
             if bot.shared.debug and libre is not None:
                 self.translator = libre
 
-        self._tldextract = TLDExtract()
+            match self.translator:
+                case None:
+                    pass
+                case SelectiveTranslator():
+                    self.translator.inner = CachingTranslator(
+                        self,
+                        self.translator.inner,
+                        self.translation_cache,
+                    )
+                case translator:
+                    self.translator = CachingTranslator(
+                        self,
+                        translator,
+                        self.translation_cache,
+                    )
+            if self.translator is not None:
+                self.translator = BatchingTranslator(self, self.translator)
+
+        self.domains = DomainResolver()
         self.logger = logging.getLogger(__name__)
         self.sites = [cls(self) for cls in SITES]
-        self.cache_lock = asyncio.Lock()
+        self.router = SiteRouter(self.sites)
 
     async def cog_load(self):
-        if not hasattr(self, "session"):
-            self.session = httpx.AsyncClient(follow_redirects=True, timeout=None)
-            self.bot.extra["crosspost_session"] = self.session
-
         await self.db.async_init()
+        await self.state.async_init()
+        await self.translation_cache.async_init()
+
+        self.bot.shared.create_task(self.media_cache.load())
+        self.bot.shared.create_task(self.warm_translator())
+        self.bot.shared.create_task(asyncio.to_thread(self.domains.warm))
+        self.bot.shared.create_task(
+            asyncio.to_thread(clean_spool_dir, self.bot.uptime.timestamp()),
+        )
 
         for site in self.sites:
             try:
@@ -249,6 +347,27 @@ class Crosspost(Cog):
             except Exception:  # noqa: PERF203
                 self.logger.exception("Error unloading site %s", site.name)
 
+        if isinstance(translator := self.translator, BatchingTranslator):
+            translator.close()
+
+        await self.state.flush()
+
+    async def warm_translator(self):
+        if (translator := self.translator) is None:
+            return
+        delay = TRANSLATOR_RETRY_DELAY
+        while True:
+            try:
+                await translator.warm()
+            except Exception:
+                self.logger.exception("Failed to warm up translator")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60 * TRANSLATOR_RETRY_DELAY)
+            else:
+                break
+        self.translator_ready = True
+        self.logger.info("translator ready")
+
     def get(
         self,
         *urls: str,
@@ -271,26 +390,101 @@ class Crosspost(Cog):
             raise RuntimeError(msg)
         return FlareSolverr(self, self.fs_solver_url, self.fs_proxy_url)
 
-    async def tldextract(self, url: str) -> ExtractResult:
-        return await asyncio.to_thread(self._tldextract, url)
+    def max_size_limit(self) -> int:
+        """The largest file any destination could accept"""
+        return max(
+            (bot_size_limit(bot) for bot in self.bot.shared.bots),
+            default=DEFAULT_FILE_SIZE_LIMIT_BYTES,
+        )
 
     async def save(
         self,
         *img_urls: str,
         use_browser_ua: bool = True,
         headers: dict[str, str] = None,
-    ) -> tuple[bytes, str | None]:
+        max_size: int = None,
+    ) -> tuple[Spool, str | None]:
+        """Download a file, raising FileTooLargeError once it exceeds max_size"""
+        for url in img_urls:
+            if entry := await self.media_cache.get(url):
+                return entry
+
         headers = headers or {}
         filename = None
-        async with self.get(
-            *img_urls,
-            use_browser_ua=use_browser_ua,
-            headers=headers,
+        async with (
+            req := self.get(
+                *img_urls,
+                use_browser_ua=use_browser_ua,
+                headers=headers,
+                stream=True,
+            )
         ) as resp:
             if disp := resp.headers.get("Content-Disposition"):
                 _, params = aiohttp.multipart.parse_content_disposition(disp)
                 filename = params.get("filename")
-            return resp.content, filename
+
+            if (
+                max_size is not None
+                and (length := content_length(resp)) is not None
+                and length > max_size
+            ):
+                raise FileTooLargeError(length)
+
+            writer = SpoolWriter(max_size=max_size)
+            try:
+                async for chunk in resp.aiter_bytes():
+                    await writer.write(chunk)
+            except BaseException:
+                await writer.abort()
+                raise
+            spool = await writer.close()
+
+        url = req.urls[req.index]
+        if not is_playlist(url, resp.headers.get("Content-Type")):
+            self.bot.shared.create_task(self.media_cache.put(url, spool, filename))
+        return spool, filename
+
+    async def probe_size(
+        self,
+        url: str,
+        *,
+        use_browser_ua: bool = False,
+        headers: dict[str, str] = None,
+    ) -> int | None:
+        """Ask the server how large a file is without downloading it.
+
+        Tries a HEAD request, then a GET for a single byte. Returns None if the
+        server won't say."""
+        headers = headers or {}
+        try:
+            async with self.get(
+                url,
+                method="HEAD",
+                use_browser_ua=use_browser_ua,
+                headers=headers,
+            ) as resp:
+                if (size := content_length(resp)) is not None:
+                    return size
+        except (ResponseError, httpx.HTTPError):
+            pass
+
+        try:
+            async with self.get(
+                url,
+                use_browser_ua=use_browser_ua,
+                headers={**headers, "Range": "bytes=0-0"},
+                stream=True,
+            ) as resp:
+                if resp.status_code == 206:
+                    _, _, total = resp.headers.get("Content-Range", "").partition("/")
+                    if total.isdigit():
+                        return int(total)
+                else:
+                    return content_length(resp)
+        except (ResponseError, httpx.HTTPError):
+            pass
+
+        return None
 
     async def process_links(
         self,
@@ -337,14 +531,7 @@ class Crosspost(Cog):
 
             link = step.group(0)
 
-            matches: list[tuple[re.Match[str], Site]] = []
-            for site in self.sites:
-                if site.name in blacklist:
-                    continue
-                if m := site.pattern.search(link):
-                    matches.append((m, site))
-
-            for m, site in matches:
+            for m, site in self.router.route(link, blacklist):
                 name = site.name
                 ms, mt = step.span()
                 spoiler = any(ms < st and ss < mt for ss, st in sspans)
@@ -361,7 +548,7 @@ class Crosspost(Cog):
                 queue = self.queue_cache.get(key)
                 if queue and queue.handle_task.done() and queue.handle_task.exception():
                     queue = None
-                    self.queue_cache.pop(key, None)
+                    self.queue_cache.pop(key)
                 if queue:
                     if queue.fragments:
                         self.logger.info(
@@ -428,37 +615,31 @@ class Crosspost(Cog):
             except DownloadError as e:
                 queue = e.fragment.queue
                 key = (queue.site.name, *queue.args)
-                self.queue_cache.pop(key, None)
+                self.queue_cache.pop(key)
                 raise e.source from None
 
             if embedded and do_suppress:
                 ctx.bot.shared.create_task(ctx.message.edit(suppress=True))
                 do_suppress = False
 
-        ctx.bot.shared.create_task(self.try_evict())
-
-    async def try_evict(self):
-        if self.cache_lock.locked():
-            return
+        self.queue_cache.evict()
 
-        async with self.cache_lock:
-            await asyncio.to_thread(self.evict_cache)
+    @Cog.listener()
+    async def on_ready(self):
+        self.bot.extra.pop("crosspost_size_limit", None)
 
-    def evict_cache(self):
-        size = sum(map(getsizeof, self.queue_cache.values()))
-        if size <= QUEUE_CACHE_SIZE:
-            return
+    @Cog.listener()
+    async def on_guild_join(self, _: discord.Guild):
+        self.bot.extra.pop("crosspost_size_limit", None)
 
-        queues = sorted(
-            self.queue_cache.items(),
-            key=lambda kv: kv[1].last_used,
-            reverse=True,
-        )
+    @Cog.listener()
+    async def on_guild_remove(self, _: discord.Guild):
+        self.bot.extra.pop("crosspost_size_limit", None)
 
-        while queues and size > QUEUE_CACHE_SIZE:
-            key, queue = queues.pop()
-            size -= getsizeof(queue)
-            self.queue_cache.pop(key, None)
+    @Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if before.filesize_limit != after.filesize_limit:
+            self.bot.extra.pop("crosspost_size_limit", None)
 
     @Cog.listener()
     async def on_message(self, message: Message):
@@ -839,19 +1020,39 @@ translate text, or a language name or code to translate text into that language.
 
     @crosspost.command()
     async def stats(self, ctx: BContext):
-        queues = self.queue_cache.values()
-        memory = await asyncio.to_thread(sum, map(getsizeof, queues))
-        length = sum(len(queue.fragments) > 0 for queue in queues)
-        if stamp := min((queue.last_used for queue in queues), default=None):
+        metadata = self.queue_cache.size
+        files = self.queue_cache.file_size
+        length = self.queue_cache.posts
+        domains = self.domains.cache_info()
+        translations = self.translation_cache
+        pp = self.pp_scheduler
+        if queue := self.queue_cache.oldest():
+            stamp = queue.last_used
             oldest = format_dt(datetime.fromtimestamp(stamp), style="R")  # noqa: DTZ006
         else:
             oldest = "(none)"
 
         embed = (
             discord.Embed()
-            .add_field(name="Memory Used", value=display_bytes(memory))
+            .add_field(name="Memory Used", value=display_bytes(metadata + files))
+            .add_field(name="Metadata", value=display_bytes(metadata))
+            .add_field(name="Files", value=display_bytes(files))
             .add_field(name="Posts Cached", value=f"{length}")
             .add_field(name="Oldest Post", value=str(oldest))
+            .add_field(
+                name="Domain Lookups",
+                value=f"{domains.hits} hits, {domains.misses} misses",
+            )
+            .add_field(
+                name="Cached Translations",
+                value=f"{translations.hits} hits, {translations.misses} misses",
+            )
+            .add_field(
+                name="Postprocessing",
+                value=f"{pp.running}/{pp.workers} running, {pp.queued} queued "
+                f"(max {pp.max_queued})\n{pp.completed} done, "
+                f"{pp.timeouts} timed out, {pp.wait_time:.1f}s total wait",
+            )
         )
 
         await ctx.send(embed=embed)
@@ -867,24 +1068,20 @@ translate text, or a language name or code to translate text into that language.
         count = 0
 
         if target is not None:
-            matches = (
-                (m, site) for site in self.sites if (m := site.pattern.search(target))
-            )
-
-            for m, site in matches:
+            for m, site in self.router.route(target):
                 name = site.name
                 args = m.groups()
                 if not args:
                     args = (target,)
                 key = (name, *(a.strip() if a else "" for a in args))
-                if self.queue_cache.pop(key, None) is not None:
+                if self.queue_cache.pop(key) is not None:
                     count += 1
 
         if count == 0:
-            for key in list(self.queue_cache.keys()):
+            for key in list(self.queue_cache):
                 if target is None or key[0] == target:
                     count += 1
-                    self.queue_cache.pop(key, None)
+                    self.queue_cache.pop(key)
         await ctx.send(f"Evicted {count}.")
 
     async def subcommand_error(self, ctx: BContext, e: Exception):
@@ -928,7 +1125,7 @@ translate text, or a language name or code to translate text into that language.
             if match and match.group(0) in arg:
                 steps.append(match)
                 match = next(matches, None)
-            elif flag := await PostFlags().convert(ctx, arg):
+            elif "=" in arg and (flag := await PostFlags().convert(ctx, arg)):
                 steps.append(flag)
             elif m := URL_EXPR.match(f"https://{arg}"):
                 steps.append(m)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import lingua
+
+from beattie.utils.etc import URL_EXPR
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, MutableMapping, Sequence
+
+    Detectors = MutableMapping[frozenset[str], lingua.LanguageDetector]
+
+TRIVIAL_LENGTH = 16  # ASCII-only text shorter than this isn't worth detecting
+# languages detected with less confidence than this are left untranslated
+MIN_CONFIDENCE = 0.6
+# Chinese and Japanese share a script, so confidence tends to be split between them
+CONFIDENCE_BOOSTS = {"ja": 0.2, "zh": 0.2}
+
+
+def is_trivial(text: str) -> bool:
+    """Whether text has nothing to detect the language of"""
+    text = URL_EXPR.sub("", text).strip()
+    if not any(c.isalpha() for c in text):
+        return True
+    return text.isascii() and len(text) < TRIVIAL_LENGTH
+
+
+def most_confident(values: Sequence[lingua.ConfidenceValue]) -> str | None:
+    """The code of the language with the highest boosted confidence, if it's
+    confident enough"""
+    best = None
+    best_conf = MIN_CONFIDENCE
+    for value in values:
+        code = value.language.iso_code_639_1.name.lower()
+        conf = value.value + CONFIDENCE_BOOSTS.get(code, 0)
+        if conf >= best_conf:
+            best, best_conf = code, conf
+    return best
+
+
+def make_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(1, thread_name_prefix="lingua")
+
+
+class LanguageDetection:
+    """Detects the languages of texts locally with lingua, on a thread of its own.
+
+    Texts submitted in the same iteration of the event loop are detected together
+    with lingua's parallel API. Trivial texts are never sent to lingua and have no
+    language, and neither do texts whose language lingua isn't confident about.
+
+    Building a detector loads its language models, which takes a while, so it's
+    done on the executor by load. Built detectors are kept in detectors by their
+    languages, so they can be reused by other instances. The executor is shared
+    too, so instances can be made freely without starting threads."""
+
+    codes: frozenset[str]
+    detector: lingua.LanguageDetector | None
+    executor: ThreadPoolExecutor
+    _detectors: Detectors
+    _isos: list[lingua.IsoCode639_1]
+    _pending: dict[str, asyncio.Future[str | None]]
+
+    def __init__(
+        self,
+        codes: Iterable[str],
+        detectors: Detectors,
+        executor: ThreadPoolExecutor,
+    ):
+        isos = {
+            code: iso
+            for code in codes
+            if (iso := getattr(lingua.IsoCode639_1, code.upper(), None))
+        }
+        self.codes = frozenset(isos)
+        self._isos = list(isos.values())
+        self._detectors = detectors
+        self.detector = detectors.get(self.codes)
+        self.executor = executor
+        self._pending = {}
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        async with self._lock:
+            if self.detector is None:
+                self.detector = self._detectors.get(self.codes)
+            if self.detector is not None:
+                return
+            loop = asyncio.get_running_loop()
+            detector = await loop.run_in_executor(self.executor, self._build)
+            self.detector = self._detectors[self.codes] = detector
+
+    def _build(self) -> lingua.LanguageDetector:
+        return (
+            lingua.LanguageDetectorBuilder.from_iso_codes_639_1(*self._isos)
+            .with_preloaded_language_models()
+            .build()
+        )
+
+    async def detect(self, text: str) -> str | None:
+        """Returns the ISO 639-1 code of text's language, if it could be detected"""
+        if is_trivial(text):
+            return None
+        if self.detector is None:
+            await self.load()
+        loop = asyncio.get_running_loop()
+        if (fut := self._pending.get(text)) is None:
+            if not self._pending:
+                loop.call_soon(self._flush)
+            fut = self._pending[text] = loop.create_future()
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        pending = self._pending
+        self._pending = {}
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self.executor, self._detect_many, list(pending))
+
+        def resolve(fut: asyncio.Future[list[str | None]]):
+            if (exc := fut.exception()) is not None:
+                for waiter in pending.values():
+                    if not waiter.done():
+                        waiter.set_exception(exc)
+                return
+            for waiter, code in zip(pending.values(), fut.result(), strict=True):
+                if not waiter.done():
+                    waiter.set_result(code)
+
+        fut.add_done_callback(resolve)
+
+    def _detect_many(self, texts: Sequence[str]) -> list[str | None]:
+        assert self.detector is not None
+        if len(texts) == 1:
+            values = [self.detector.compute_language_confidence_values(texts[0])]
+        else:
+            values = self.detector.compute_language_confidence_values_in_parallel(
+                texts,
+            )
+        return [most_confident(vals) for vals in values]
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from tldextract import TLDExtract
+
+if TYPE_CHECKING:
+    from functools import _CacheInfo
+
+    from tldextract import ExtractResult
+
+
+class DomainResolver:
+    """Splits hostnames into subdomain, domain and public suffix.
+
+    Uses the public suffix list snapshot bundled with tldextract, so it never
+    touches the network or disk after warm is called. Results are cached by
+    hostname, so repeat hosts resolve without doing any parsing."""
+
+    def __init__(self, maxsize: int = 4096):
+        self._extract = TLDExtract(cache_dir=None, suffix_list_urls=())
+        self.resolve = lru_cache(maxsize=maxsize)(self._resolve)
+
+    def _resolve(self, host: str) -> ExtractResult:
+        return self._extract.extract_str(host)
+
+    def warm(self):
+        """Load the suffix list. Blocks, so call this from a thread."""
+        self._extract.extract_str("example.com")
+
+    def cache_info(self) -> _CacheInfo:
+        return self.resolve.cache_info()
@@ -10,3 +10,18 @@ class DownloadError(Exception):
     def __init__(self, source: Exception, fragment: Fragment):
         self.source = source
         self.fragment = fragment
+
+
+class FileTooLargeError(Exception):
+    def __init__(self, size: int):
+        self.size = size
+
+
+class TranslationQuotaError(Exception):
+    def __init__(self, backend: str):
+        self.backend = backend
+        super().__init__(backend)
+
+
+class TranslatorClosedError(Exception):
+    pass
@@ -59,6 +59,10 @@ if TYPE_CHECKING:
         solution: Solution
 
 
+# the solver doesn't respond until it's done, which may take minutes
+SOLVER_TIMEOUT = httpx.Timeout(None, connect=15)
+
+
 class FlareSolverr:
     cog: Crosspost
     solver: str
@@ -70,7 +74,7 @@ class FlareSolverr:
         self.cog = cog
         self.solver = solver
         self.proxy = proxy
-        self.client = httpx.AsyncClient(follow_redirects=True, timeout=None)
+        self.client = cog.bot.shared.http.get("flaresolverr")
         self.session = None
 
     async def __aenter__(self):
@@ -105,6 +109,7 @@ class FlareSolverr:
             self.solver,
             headers={"Content-Type": "application/json"},
             content=json.dumps(command),
+            timeout=SOLVER_TIMEOUT,
         )
         data: Response = resp.json()
         if data["status"] != "ok":
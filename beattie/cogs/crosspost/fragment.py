@@ -6,16 +6,18 @@ from dataclasses import dataclass
 from sys import getsizeof
 from typing import TYPE_CHECKING, Any, NamedTuple
 
-from discord.utils import escape_markdown
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES, escape_markdown
 
 from beattie.utils.etc import URL_EXPR, get_size_limit, replace_ext
 
 from .database_types import TextLength
-from .postprocess import magick_png_pp
+from .exceptions import FileTooLargeError
+from .postprocess import FIT_PPS, UNCACHED_PPS, magick_png_pp
+from .spool import Spool
 from .translator import DONT, Language
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable
+    from collections.abc import Awaitable, Callable
 
     from discord import Embed
 
@@ -30,6 +32,7 @@ FILENAME_EXPR = re.compile(rf"{FILE_CHAR}+\.{FILE_CHAR}+")
 
 class Fragment:
     queue: FragmentQueue
+    uncounted = ("queue",)  # attributes excluded from __sizeof__
 
     def __init__(self, queue: FragmentQueue):
         self.queue = queue
@@ -42,7 +45,7 @@ class Fragment:
         return super().__sizeof__() + sum(
             getsizeof(getattr(self, name))
             for name in getattr(self, "__annotations__", {})
-            if name != "queue"
+            if name not in self.uncounted
         )
 
 
@@ -51,15 +54,22 @@ class FileFragment(Fragment):
     headers: dict[str, str] | None
     use_browser_ua: bool
     filename: str
-    file_bytes: bytes
+    _file_data: Spool
     pp_filename: str | None
-    pp_bytes: bytes | None
+    _pp_data: Spool | None
+    oversize: int | None  # set instead of file_data when too large to upload
+    target_size: int | None  # size postprocessing aims for, if it can
+    pp_downscaled: bool  # whether postprocessing lowered quality to fit target_size
     dl_task: asyncio.Task[None] | None
+    download: Callable[[FileFragment], Awaitable[None]] | None
     postprocess: PP | None
     pp_extra: Any
     lock_filename: bool
     can_link: bool
 
+    # file data is accounted for separately by the queue cache's file tier
+    uncounted = ("queue", "_file_data", "_pp_data")
+
     def __init__(
         self,
         queue: FragmentQueue,
@@ -77,7 +87,7 @@ class FileFragment(Fragment):
         self.postprocess = postprocess
         self.pp_extra = pp_extra
         self.pp_filename = None
-        self.pp_bytes = None
+        self._pp_data = None
         self.headers = headers
         self.use_browser_ua = use_browser_ua
         self.lock_filename = lock_filename
@@ -103,28 +113,152 @@ class FileFragment(Fragment):
             self.postprocess = magick_png_pp
         self.filename = filename
 
-        self.file_bytes = b""
+        self._file_data = Spool()
+        self.oversize = None
+        self.target_size = None
+        self.pp_downscaled = False
         self.dl_task = None
+        self.download = None
+
+    @property
+    def file_data(self) -> Spool:
+        return self._file_data
+
+    @file_data.setter
+    def file_data(self, value: Spool):
+        delta = len(value) - len(self._file_data)
+        self._file_data = value
+        if (cache := self.queue.cache) is not None:
+            cache.resize_file(self, delta)
+
+    @property
+    def pp_data(self) -> Spool | None:
+        return self._pp_data
+
+    @pp_data.setter
+    def pp_data(self, value: Spool | None):
+        delta = len(value or ()) - len(self._pp_data or ())
+        self._pp_data = value
+        if (cache := self.queue.cache) is not None:
+            cache.resize_file(self, delta)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._file_data) + len(self._pp_data or ())
 
     def save(self) -> Awaitable[None]:
-        if self.dl_task is None:
-            self.dl_task = asyncio.Task(self._save())
-        return self.dl_task
+        if (task := self.dl_task) is None or task.cancelled():
+            self.dl_task = task = asyncio.Task(self._save())
+        return task
 
-    async def _save(self):
-        file_bytes, filename = await self.cog.save(
-            *self.urls,
-            headers=self.headers,
-            use_browser_ua=self.use_browser_ua,
-        )
+    def fit_to(self, limit: int):
+        """Have postprocessing aim for limit. It's redone if it was done for a larger
+        limit and its output doesn't fit, or for a smaller limit it was downscaled
+        to fit."""
+        target = self.target_size
+        done = (task := self.dl_task) is not None and task.done()
+        if target == limit or (
+            target is not None and target < limit and done and not self.pp_downscaled
+        ):
+            # nothing was given up for the smaller limit, so there's nothing to gain
+            return
+        self.target_size = limit
+        if (
+            target is not None
+            and done
+            and self.postprocess is not None
+            and self.postprocess.__name__ in FIT_PPS
+            and (pp_data := self.pp_data) is not None
+            and (len(pp_data) > limit if limit < target else self.pp_downscaled)
+        ):
+            self.dl_task = None
+            self.pp_data = None
+            self.pp_filename = None
+
+    async def _download(self):
+        if (download := self.download) is not None:
+            await download(self)
+            return
+
+        # postprocessing may shrink a file too large to upload, so only files sent
+        # as they are can be given up on early
+        max_size = None
+        if self.postprocess is None:
+            max_size = self.cog.max_size_limit()
+        try:
+            file_data, filename = await self.cog.save(
+                *self.urls,
+                headers=self.headers,
+                use_browser_ua=self.use_browser_ua,
+                max_size=max_size,
+            )
+        except FileTooLargeError as e:
+            self.oversize = e.size
+            return
 
         if not self.lock_filename and filename is not None:
             self.filename = filename
 
-        self.file_bytes = file_bytes
+        self.file_data = file_data
+
+    async def _save(self):
+        # the original is still here if only postprocessing is being redone
+        if not self.file_data:
+            await self._download()
+            if self.oversize is not None:
+                return
+
+        if (postprocess := self.postprocess) is not None:
+            key = None
+            if self.file_data and postprocess.__name__ not in UNCACHED_PPS:
+                digest = await self.file_data.adigest()
+                key = f"pp:{digest}:{postprocess.__name__}:{self.pp_extra!r}"
+                if postprocess.__name__ in FIT_PPS:
+                    key = f"{key}:{self.target_size}"
+
+            media_cache = self.cog.media_cache
+            self.pp_downscaled = False
+            if key is not None and (entry := await media_cache.get(key)):
+                self.pp_data = entry.data
+                self.pp_filename = entry.filename
+                # the cache doesn't say, so assume fitting cost something
+                self.pp_downscaled = (
+                    postprocess.__name__ in FIT_PPS and self.target_size is not None
+                )
+            else:
+                await postprocess(self)
+                if key is not None and (pp_data := self.pp_data) is not None:
+                    self.cog.bot.shared.create_task(
+                        media_cache.put(
+                            key,
+                            pp_data,
+                            self.pp_filename,
+                            immutable=True,
+                        ),
+                    )
+
+            # the postprocessed file will be used wherever it's sent,
+            # so there's no need to hold on to the original,
+            # unless it may be postprocessed again for a larger limit
+            pp_data = self.pp_data
+            if (
+                pp_data is not None
+                and len(pp_data) <= DEFAULT_FILE_SIZE_LIMIT_BYTES
+                and not self.pp_downscaled
+            ):
+                self.file_data = Spool()
+
+    def release(self):
+        """Drop downloaded files, to be downloaded again if needed."""
+        self.dl_task = None
+        self.file_data = Spool()
+        self.pp_data = None
+        self.pp_filename = None
+        self.pp_downscaled = False
 
-        if self.postprocess is not None:
-            await self.postprocess(self)
+    def touch(self):
+        if (cache := self.queue.cache) is not None:
+            cache.touch(self)
 
 
 class FileSpec(NamedTuple):
@@ -164,6 +298,17 @@ class FallbackFragment(Fragment):
 
     async def _determine_length(self, idx: int) -> int:
         candidate = self.candidates[idx]
+        # postprocessing can change the size, so those candidates are downloaded,
+        # as are cached ones, which costs less than asking for the size
+        if (
+            candidate.postprocess is None
+            and candidate.fragment is None
+            and candidate.url not in self.cog.media_cache
+        ):
+            size = await self.cog.probe_size(candidate.url, headers=self.headers)
+            if size is not None:
+                return size
+
         candidate.fragment = frag = FileFragment(
             self.queue,
             candidate.url,
@@ -173,18 +318,22 @@ class FallbackFragment(Fragment):
             pp_extra=candidate.pp_extra,
         )
         await frag.save()
-        if (pp_bytes := frag.pp_bytes) is not None:
-            length = len(pp_bytes)
+        if (oversize := frag.oversize) is not None:
+            length = oversize
+        elif (pp_data := frag.pp_data) is not None:
+            length = len(pp_data)
         else:
-            length = len(frag.file_bytes)
+            length = len(frag.file_data)
 
         return length
 
     async def determine_length(self, idx: int) -> int:
-        if (task := self.length_tasks.get(idx)) is None:
+        if (task := self.length_tasks.get(idx)) is None or task.cancelled():
             task = asyncio.create_task(self._determine_length(idx))
             self.length_tasks[idx] = task
-        return await task
+        # shared by every presentation of the queue, so one being cancelled mustn't
+        # cancel it for the rest
+        return await asyncio.shield(task)
 
     async def to_file(self, ctx: CrosspostContext) -> FileFragment:
         for idx, candidate in enumerate(self.candidates):
@@ -348,6 +497,10 @@ class TextFragment(Fragment):
         return self.format(trans)
 
     def translate(self, target: Language) -> Awaitable[str | None]:
+        if not self.cog.translator_ready:
+            # don't hold up the post waiting for the translator to start
+            return asyncio.Task(asyncio.sleep(0, None))
+
         if (
             (task := self.trans_tasks.get(target)) is None
             or task.done()
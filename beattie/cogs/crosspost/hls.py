@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import re
+from collections import deque
+from typing import TYPE_CHECKING, NamedTuple
+from urllib.parse import urljoin
+
+from .spool import SpoolWriter
+
+if TYPE_CHECKING:
+    from .cog import Crosspost
+    from .spool import Spool
+
+SEGMENT_CONCURRENCY = 6
+ATTRIBUTE_EXPR = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+# CODECS prefixes of H.264 and AAC, which can be copied into mp4 as is
+REMUX_CODECS = ("avc1", "avc3", "mp4a.40")
+
+
+def parse_attributes(line: str) -> dict[str, str]:
+    _, _, attrs = line.partition(":")
+    return {key: value.strip('"') for key, value in ATTRIBUTE_EXPR.findall(attrs)}
+
+
+class Variant(NamedTuple):
+    url: str
+    bandwidth: int
+    codecs: tuple[str, ...]
+    audio: str | None  # playlist of a separate audio rendition
+
+    @property
+    def remuxable(self) -> bool | None:
+        """Whether the streams can be copied into mp4 as is, if it's known"""
+        if not self.codecs:
+            return None
+        return all(codec.startswith(REMUX_CODECS) for codec in self.codecs)
+
+
+class MediaPlaylist(NamedTuple):
+    init: str | None
+    segments: list[str]
+    duration: float  # seconds
+
+
+class HLSStream(NamedTuple):
+    video: Spool
+    audio: Spool | None
+    duration: float
+    remuxable: bool | None
+    downscaled: bool  # whether a lesser variant was chosen to fit the budget
+
+
+def is_master(text: str) -> bool:
+    return "#EXT-X-STREAM-INF:" in text
+
+
+def parse_master(text: str, base: str) -> list[Variant]:
+    streams: list[tuple[dict[str, str], str]] = []
+    audio: dict[str, str] = {}
+    attrs = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MEDIA:"):
+            media = parse_attributes(line)
+            if (
+                media.get("TYPE") == "AUDIO"
+                and (uri := media.get("URI"))
+                and (media.get("DEFAULT") == "YES" or media["GROUP-ID"] not in audio)
+            ):
+                audio[media["GROUP-ID"]] = urljoin(base, uri)
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = parse_attributes(line)
+        elif line and not line.startswith("#") and attrs is not None:
+            streams.append((attrs, urljoin(base, line)))
+            attrs = None
+
+    return [
+        Variant(
+            url,
+            int(attrs.get("BANDWIDTH", 0)),
+            tuple(
+                c
+                for codec in attrs.get("CODECS", "").split(",")
+                if (c := codec.strip())
+            ),
+            audio.get(attrs.get("AUDIO", "")),
+        )
+        for attrs, url in streams
+    ]
+
+
+def parse_media(text: str, base: str) -> MediaPlaylist | None:
+    """None if the playlist is live, encrypted or split by byte range, which are
+    left to ffmpeg"""
+    init = None
+    segments = []
+    duration = 0.0
+    ended = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration += float(line[8:].partition(",")[0])
+        elif line.startswith("#EXT-X-MAP:"):
+            attrs = parse_attributes(line)
+            uri = urljoin(base, attrs["URI"])
+            if "BYTERANGE" in attrs or init not in (None, uri):
+                return None
+            init = uri
+        elif line.startswith("#EXT-X-KEY:"):
+            if parse_attributes(line).get("METHOD", "NONE") != "NONE":
+                return None
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            return None
+        elif line == "#EXT-X-ENDLIST":
+            ended = True
+        elif line and not line.startswith("#"):
+            segments.append(urljoin(base, line))
+
+    if not ended or not segments:
+        return None
+    return MediaPlaylist(init, segments, duration)
+
+
+async def fetch_media(
+    cog: Crosspost,
+    url: str,
+    headers: dict[str, str] | None,
+) -> MediaPlaylist | None:
+    async with cog.get(url, headers=headers) as resp:
+        return parse_media(resp.text, str(resp.url))
+
+
+async def download(
+    cog: Crosspost,
+    playlist: MediaPlaylist,
+    headers: dict[str, str] | None,
+    max_size: int | None,
+) -> Spool:
+    """Download a playlist's segments joined in order, several at a time, raising
+    FileTooLargeError once they exceed max_size.
+
+    Only a few segments are fetched ahead of the one being written, so a slow
+    segment doesn't leave the rest of the stream piling up in memory."""
+
+    async def fetch(url: str) -> bytes:
+        async with cog.get(url, headers=headers) as resp:
+            return resp.content
+
+    urls = iter(
+        [playlist.init, *playlist.segments] if playlist.init else playlist.segments,
+    )
+    pending = deque(
+        asyncio.create_task(fetch(url))
+        for url in itertools.islice(urls, SEGMENT_CONCURRENCY)
+    )
+    writer = SpoolWriter(max_size=max_size)
+    try:
+        while pending:
+            chunk = await pending.popleft()
+            if (url := next(urls, None)) is not None:
+                pending.append(asyncio.create_task(fetch(url)))
+            await writer.write(chunk)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await writer.abort()
+        raise
+    return await writer.close()
+
+
+async def choose_variant(
+    cog: Crosspost,
+    text: str,
+    url: str,
+    headers: dict[str, str] | None,
+    budget: float | None,
+) -> tuple[Variant, MediaPlaylist, bool] | None:
+    """The best variant in a master playlist estimated to fit in budget bytes,
+    preferring ones whose codecs can be remuxed, its media playlist, and whether
+    a better variant was passed over to fit"""
+    variants = sorted(parse_master(text, url), key=lambda v: v.bandwidth, reverse=True)
+    if not (variants := [v for v in variants if v.remuxable is not False] or variants):
+        return None
+    variant = variants[0]
+    playlist = await fetch_media(cog, variant.url, headers)
+    if playlist is not None and budget is not None:
+        # the duration is the same for every variant, so check the rest against it
+        fits = [v for v in variants if v.bandwidth * playlist.duration / 8 <= budget]
+        if (best := fits[0] if fits else variants[-1]) is not variant:
+            variant = best
+            playlist = await fetch_media(cog, variant.url, headers)
+    return None if playlist is None else (variant, playlist, variant is not variants[0])
+
+
+async def fetch_stream(
+    cog: Crosspost,
+    text: str,
+    url: str,
+    headers: dict[str, str] | None,
+    *,
+    budget: float | None,
+    max_size: int | None,
+) -> HLSStream | None:
+    """Download the stream described by the playlist text fetched from url, each
+    of its playlists limited to max_size bytes.
+
+    Returns None for streams that can't be downloaded here."""
+    if not is_master(text):
+        if (playlist := parse_media(text, url)) is None:
+            return None
+        video = await download(cog, playlist, headers, max_size)
+        return HLSStream(video, None, playlist.duration, None, downscaled=False)
+
+    if (chosen := await choose_variant(cog, text, url, headers, budget)) is None:
+        return None
+    variant, playlist, downscaled = chosen
+    if variant.audio is None:
+        video = await download(cog, playlist, headers, max_size)
+        return HLSStream(
+            video,
+            None,
+            playlist.duration,
+            variant.remuxable,
+            downscaled=downscaled,
+        )
+
+    if (audio_playlist := await fetch_media(cog, variant.audio, headers)) is None:
+        return None
+    video, audio = await asyncio.gather(
+        download(cog, playlist, headers, max_size),
+        download(cog, audio_playlist, headers, max_size),
+    )
+    return HLSStream(
+        video,
+        audio,
+        playlist.duration,
+        variant.remuxable,
+        downscaled=downscaled,
+    )
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+from beattie.utils.etc import DAY, GB, display_bytes
+
+from .spool import SPOOL_THRESHOLD, Spool, spool_path
+
+MEDIA_CACHE_DIR = Path("cache/crosspost/media")
+MEDIA_CACHE_SIZE: int = 4 * GB
+# content at a URL may change, so keys stop being served after this long,
+# unless they're derived from the content itself
+MEDIA_CACHE_TTL: float = DAY
+# playlists are rewritten as streams go on, and point at segments that expire
+PLAYLIST_TYPES = frozenset(
+    (
+        "application/vnd.apple.mpegurl",
+        "application/x-mpegurl",
+        "audio/mpegurl",
+        "audio/x-mpegurl",
+    ),
+)
+
+
+class CacheEntry(NamedTuple):
+    data: Spool
+    filename: str | None
+
+
+def key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def is_playlist(url: str, content_type: str | None) -> bool:
+    media_type = (content_type or "").partition(";")[0].strip().lower()
+    path = url.partition("?")[0].partition("#")[0]
+    return media_type in PLAYLIST_TYPES or path.lower().endswith((".m3u8", ".m3u"))
+
+
+def parse_key(text: str) -> tuple[str, float, str]:
+    """The digest, expiry time and filename in a key file.
+
+    Key files written before keys could expire are treated as expired."""
+    digest, _, rest = text.partition("\n")
+    expires, _, filename = rest.partition("\n")
+    try:
+        return digest, float(expires), filename
+    except ValueError:
+        return digest, 0, ""
+
+
+def link_or_copy(src: Path, dst: Path):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class MediaCache:
+    """Content-addressed on-disk cache for downloaded files.
+
+    Each file is stored once under the SHA-256 of its contents. Keys (such as URLs)
+    are small index files pointing at a blob, so the same file reached through
+    different keys is only stored once. Blobs are evicted least recently used first
+    once the cache exceeds its byte budget.
+
+    Keys expire after ttl seconds, unless they're put as immutable because they're
+    derived from the content they point at."""
+
+    root: Path
+    max_size: int
+    ttl: float
+    size: int
+    ready: bool
+    loading: bool
+    _blobs: OrderedDict[str, int]  # content digest -> size, oldest first
+    _keys: dict[str, float]  # key digest -> expiry time
+
+    def __init__(
+        self,
+        root: Path = MEDIA_CACHE_DIR,
+        max_size: int = MEDIA_CACHE_SIZE,
+        ttl: float = MEDIA_CACHE_TTL,
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.ready = False
+        self.loading = False
+        self._blobs = OrderedDict()
+        self._keys = {}
+        self.logger = logging.getLogger(__name__)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _key_path(self, kdigest: str) -> Path:
+        return self.root / "keys" / kdigest[:2] / kdigest
+
+    async def load(self):
+        if self.ready or self.loading:
+            return
+        self.loading = True
+        blobs, keys = await asyncio.to_thread(self._scan)
+        for digest, size in blobs:
+            self._blobs[digest] = size
+            self.size += size
+        self._keys.update(keys)
+        self.ready = True
+        self.loading = False
+        self.logger.info(
+            "loaded %d cached files (%s)",
+            len(self._blobs),
+            display_bytes(self.size),
+        )
+        await self.evict()
+
+    def _scan(self) -> tuple[list[tuple[str, int]], list[tuple[str, float]]]:
+        blobs: list[tuple[str, int, float]] = []
+        for path in (self.root / "blobs").glob("*/*"):
+            if path.suffix == ".tmp":
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            blobs.append((path.name, stat.st_size, stat.st_mtime))
+        blobs.sort(key=lambda blob: blob[2])
+        present = {digest for digest, _, _ in blobs}
+
+        keys = []
+        now = time.time()
+        for path in (self.root / "keys").glob("*/*"):
+            try:
+                digest, expiry, _ = parse_key(path.read_text())
+            except OSError:
+                continue
+            if digest in present and expiry > now:
+                keys.append((path.name, expiry))
+            else:
+                path.unlink(missing_ok=True)
+
+        return [(digest, size) for digest, size, _ in blobs], keys
+
+    def __contains__(self, key: str) -> bool:
+        """Whether key is cached, without reading it"""
+        return self.ready and self._keys.get(key_digest(key), 0) > time.time()
+
+    async def get(self, key: str) -> CacheEntry | None:
+        if not self.ready or (kdigest := key_digest(key)) not in self._keys:
+            return None
+
+        if self._keys[kdigest] <= time.time():
+            del self._keys[kdigest]
+            await asyncio.to_thread(self._key_path(kdigest).unlink, missing_ok=True)
+            return None
+
+        found = await asyncio.to_thread(self._read, kdigest)
+        if found is None:
+            self._keys.pop(kdigest, None)
+            return None
+
+        digest, entry = found
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+        return entry
+
+    def _read(self, kdigest: str) -> tuple[str, CacheEntry] | None:
+        key_path = self._key_path(kdigest)
+        try:
+            digest, _, filename = parse_key(key_path.read_text())
+            blob_path = self._blob_path(digest)
+            size = blob_path.stat().st_size
+            if size < SPOOL_THRESHOLD:
+                spool = Spool(blob_path.read_bytes(), digest=digest)
+            else:
+                # the spool gets its own link, so evicting the blob
+                # doesn't pull the file out from under an upload
+                path = spool_path()
+                link_or_copy(blob_path, path)
+                spool = Spool(path=path, size=size, digest=digest)
+        except OSError:
+            key_path.unlink(missing_ok=True)
+            return None
+        os.utime(blob_path)
+        return digest, CacheEntry(spool, filename or None)
+
+    async def put(
+        self,
+        key: str,
+        spool: Spool,
+        filename: str | None,
+        *,
+        immutable: bool = False,
+    ):
+        if not self.ready or not spool or len(spool) > self.max_size // 16:
+            return
+
+        kdigest = key_digest(key)
+        expiry = float("inf") if immutable else time.time() + self.ttl
+        digest = await asyncio.to_thread(
+            self._write,
+            kdigest,
+            spool,
+            filename,
+            expiry,
+        )
+        self._keys[kdigest] = expiry
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+        else:
+            self._blobs[digest] = len(spool)
+            self.size += len(spool)
+            await self.evict()
+
+    def _write(
+        self,
+        kdigest: str,
+        spool: Spool,
+        filename: str | None,
+        expiry: float,
+    ) -> str:
+        if (digest := spool.digest) is None:
+            if spool.path is None:
+                digest = hashlib.sha256(spool.read()).hexdigest()
+            else:
+                digest = file_digest(spool.path)
+        blob_path = self._blob_path(digest)
+        if blob_path.exists():
+            os.utime(blob_path)
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob_path.with_suffix(".tmp")
+            tmp.unlink(missing_ok=True)
+            if spool.path is None:
+                tmp.write_bytes(spool.read())
+            else:
+                link_or_copy(spool.path, tmp)
+            tmp.replace(blob_path)
+
+        key_path = self._key_path(kdigest)
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        key_path.write_text(f"{digest}\n{expiry!r}\n{filename or ''}")
+        return digest
+
+    async def evict(self):
+        evicted = []
+        while self._blobs and self.size > self.max_size:
+            digest, size = self._blobs.popitem(last=False)
+            self.size -= size
+            evicted.append(digest)
+
+        if evicted:
+            await asyncio.to_thread(self._unlink, evicted)
+
+    def _unlink(self, digests: list[str]):
+        for digest in digests:
+            self._blob_path(digest).unlink(missing_ok=True)
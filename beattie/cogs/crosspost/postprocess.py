@@ -1,82 +1,579 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import itertools
+import json
+import os
 import re
+import struct
 from asyncio import subprocess
-from io import BytesIO
-from pathlib import Path
-from tempfile import NamedTemporaryFile, TemporaryDirectory
-from typing import TYPE_CHECKING, Any, Literal
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Literal, NamedTuple
 from zipfile import ZipFile
 
-from beattie.utils.aioutils import aread, try_wait_for
-from beattie.utils.etc import replace_ext
+import httpx
+
+from beattie.utils.aioutils import gently_kill, try_wait_for
+from beattie.utils.etc import KB, replace_ext
+from beattie.utils.exceptions import ResponseError
+
+from .exceptions import FileTooLargeError
+from .hls import fetch_stream
+from .spool import Spool, SpoolWriter, spool_path
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Callable
+    from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+    from pathlib import Path
 
     from .fragment import FileFragment
 
     PP = Callable[[FileFragment], Awaitable[None]]
+    Feed = Callable[[asyncio.StreamWriter], Awaitable[None]]
+
+# postprocessors that read their input from somewhere other than file_data,
+# so their output can't be cached by the input's digest
+UNCACHED_PPS = frozenset(("ffmpeg_m3u8_to_mp4_pp",))
+
+# limits on downloading an HLS stream to copy, past which it's left to ffmpeg
+HLS_TIMEOUT: float = 120
+HLS_SIZE_FACTOR = 4  # of the target size
+
+# codecs, as ffprobe names them, that can be copied into mp4 as is
+COPYABLE_CODECS = frozenset(("h264", "aac"))
+
+# postprocessors that aim for frag.target_size
+FIT_PPS = frozenset(("ffmpeg_gif_pp", "ffmpeg_m3u8_to_mp4_pp"))
+FIT_ATTEMPTS = 2
+FIT_MARGIN = 0.9  # fraction of the target estimates aim for
+PROBE_TIMEOUT: float = 30
+GIF_BYTES_PER_PIXEL = 0.25  # initial guess, per pixel per frame
+GIF_SCALES = (1, 0.75, 0.5, 0.375, 0.25)
+GIF_FPS = (15, 10)
+VIDEO_HEIGHTS = (1080, 720, 480, 360)
+AUDIO_BITRATE = 128_000
+MIN_VIDEO_BITRATE = 100_000
+MIN_BITS_PER_PIXEL = 0.05  # per frame, below which it's worth lowering resolution
+
+# ms; browsers play gif frames with shorter delays much slower instead
+MIN_GIF_DELAY = 20
+
+PIPE_CHUNK = 64 * KB
+# mp4 is written to a file rather than a pipe, so its index can be moved to the
+# start once it's done, letting it start playing before it's fully loaded
+FASTSTART_MP4 = ["-movflags", "+faststart", "-f", "mp4"]
+
+# job priorities, lowest first
+IMAGE = 0
+ANIMATION = 1
+VIDEO = 2
+
+# seconds a job may run for, from when it starts rather than when it's queued
+PP_TIMEOUTS: dict[int, float] = {
+    IMAGE: 120,
+    ANIMATION: 120,
+    VIDEO: 300,
+}
+
+
+def default_workers() -> int:
+    # ffmpeg and magick use several threads each, so leave room for that
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(2, cpus // 2)
+
+
+class PostprocessScheduler:
+    """Limits how many postprocessing jobs run at once.
+
+    Jobs beyond the limit wait for a slot in priority order, smallest input first
+    within a priority, so a quick image conversion doesn't queue behind a burst of
+    video transcodes."""
+
+    workers: int
+    running: int
+    completed: int
+    timeouts: int
+    max_queued: int
+    wait_time: float
+    _heap: list[tuple[int, int, int, asyncio.Future[None]]]
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or default_workers()
+        self.running = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.max_queued = 0
+        self.wait_time = 0.0
+        self._heap = []
+        self._counter = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._heap)
+
+    @asynccontextmanager
+    async def slot(self, priority: int, size: int = 0) -> AsyncIterator[None]:
+        """Wait for and hold a slot to run a job in"""
+        await self._acquire(priority, size)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    async def pipe(
+        self,
+        *args: str | os.PathLike[str],
+        priority: int,
+        size: int = 0,
+        feed: Feed = None,
+        stderr: bool = False,
+        output: Path = None,
+    ) -> tuple[Spool | None, bytes]:
+        """Run a process in a slot of its own, feeding its stdin with feed and
+        collecting its stdout into a spool as it's written.
+
+        If output is given, the process is expected to write there instead, and
+        the file is adopted into the spool once the process is done. The spool is
+        None if the process failed or wrote nothing. Its stderr is only collected
+        if asked for."""
+        async with self.slot(priority, size):
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=subprocess.DEVNULL if feed is None else subprocess.PIPE,
+                stdout=subprocess.PIPE if output is None else subprocess.DEVNULL,
+                stderr=subprocess.PIPE if stderr else subprocess.DEVNULL,
+            )
+            writer = SpoolWriter()
+            try:
+                async with asyncio.timeout(PP_TIMEOUTS[priority]):
+                    _, _, err, code = await asyncio.gather(
+                        _feed_stdin(proc, feed),
+                        _drain_stdout(proc, writer),
+                        _read_stderr(proc),
+                        proc.wait(),
+                    )
+            except BaseException as e:
+                await writer.abort()
+                if proc.returncode is None:
+                    await gently_kill(proc, timeout=5)
+                if output is not None:
+                    await asyncio.to_thread(output.unlink, missing_ok=True)
+                if isinstance(e, TimeoutError):
+                    self.timeouts += 1
+                raise
+
+        if output is not None:
+            return await asyncio.to_thread(_adopt_output, output, code), err
+        if code != 0 or not writer.size:
+            await writer.abort()
+            return None, err
+        return await writer.close(), err
+
+    async def probe(
+        self,
+        src: str | os.PathLike[str],
+        data: bytes = None,
+        *,
+        priority: int,
+    ) -> MediaInfo | None:
+        """Probe a video in a slot of its own"""
+        async with self.slot(priority, len(data or b"")):
+            return await probe(src, data)
+
+    async def _acquire(self, priority: int, size: int):
+        if self.running < self.workers and not self._heap:
+            self.running += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        fut = loop.create_future()
+        entry = (priority, size, next(self._counter), fut)
+        heapq.heappush(self._heap, entry)
+        self.max_queued = max(self.max_queued, len(self._heap))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+            else:
+                # the slot was handed over just as we were cancelled
+                self._release()
+            raise
+        finally:
+            self.wait_time += loop.time() - start
+
+    def _release(self):
+        # hand the slot straight to the next job, so nothing can jump the queue
+        while self._heap:
+            *_, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.running -= 1
+
+
+async def _feed_stdin(proc: subprocess.Process, feed: Feed | None):
+    if (stdin := proc.stdin) is None or feed is None:
+        return
+    try:
+        await feed(stdin)
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # the process stopped reading, which it's free to do
+    finally:
+        stdin.close()
+
+
+async def _drain_stdout(proc: subprocess.Process, writer: SpoolWriter):
+    if proc.stdout is None:
+        return
+    while chunk := await proc.stdout.read(PIPE_CHUNK):
+        await writer.write(chunk)
+
+
+def _adopt_output(output: Path, code: int) -> Spool | None:
+    if code == 0 and output.exists() and output.stat().st_size:
+        return Spool.adopt(output)
+    output.unlink(missing_ok=True)
+    return None
+
+
+async def _read_stderr(proc: subprocess.Process) -> bytes:
+    if proc.stderr is None:
+        return b""
+    return await proc.stderr.read()
+
+
+def feed_spool(spool: Spool) -> Feed:
+    """Write a spool's contents to stdin, a chunk at a time if it's on disk"""
+
+    async def feed(stdin: asyncio.StreamWriter):
+        if spool.in_memory:
+            stdin.write(await spool.aread())
+            await stdin.drain()
+            return
+        fp = await asyncio.to_thread(spool.open)
+        try:
+            while chunk := await asyncio.to_thread(fp.read, PIPE_CHUNK):
+                stdin.write(chunk)
+                await stdin.drain()
+        finally:
+            fp.close()
+
+    return feed
+
+
+def moov_first(data: bytes) -> bool:
+    """Whether an MP4's metadata comes before its media, so it can be read from a
+    pipe"""
+    pos = 0
+    while pos + 8 <= len(data):
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1 and pos + 16 <= len(data):
+            (size,) = struct.unpack_from(">Q", data, pos + 8)
+        if size < 8:
+            return False
+        pos += size
+    return False
+
+
+# postprocessors must set pp_data and pp_filename.
+# they feed their input to stdin and collect output from stdout, so nothing is
+# written to disk unless it's too large to hold in memory, or is an mp4 that
+# should have its index at the start
+
+
+class MediaInfo(NamedTuple):
+    width: int
+    height: int
+    fps: float
+    duration: float  # seconds
+    codecs: frozenset[str]  # of every stream
+
+
+async def probe(src: str | os.PathLike[str], data: bytes = None) -> MediaInfo | None:
+    """Get the dimensions, frame rate and duration of a video's first video stream,
+    and the codecs of all its streams.
+
+    If data is given, it's piped in and src should be "pipe:0"."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,width,height,avg_frame_rate:format=duration",
+        "-of",
+        "json",
+        src,
+        stdin=subprocess.DEVNULL if data is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await try_wait_for(proc, data, timeout=PROBE_TIMEOUT)
+        data = json.loads(out)
+        streams = data["streams"]
+        if (
+            stream := next((s for s in streams if s["codec_type"] == "video"), None)
+        ) is None:
+            return None
+        # sizes are estimated per second, so a stream without a duration is no use
+        if (duration := float(data["format"]["duration"])) <= 0:
+            return None
+        num, _, den = stream["avg_frame_rate"].partition("/")
+        return MediaInfo(
+            int(stream["width"]),
+            int(stream["height"]),
+            float(num) / float(den or 1),
+            duration,
+            frozenset(s["codec_name"] for s in streams),
+        )
+    except (TimeoutError, ValueError, KeyError, ZeroDivisionError):
+        return None
+
+
+async def probe_source(spool: Spool) -> tuple[str | Path, bytes | None]:
+    """The arguments for probe to read a spool from wherever it is"""
+    if spool.in_memory:
+        return "pipe:0", await spool.aread()
+    return await spool.amaterialize(), None
+
+
+def gif_ladder(info: MediaInfo) -> list[tuple[int, float, float]]:
+    """Widths and frame rates to try, best first, with the pixels they'd output"""
+    rates = dict.fromkeys(min(info.fps, fps) for fps in (info.fps, *GIF_FPS))
+    ladder = []
+    for scale in GIF_SCALES:
+        width = max(2, round(info.width * scale) // 2 * 2)
+        height = info.height * width / info.width
+        ladder.extend(
+            (width, fps, width * height * fps * info.duration) for fps in rates
+        )
+    return ladder
 
 
-# postprocessors must set pp_bytes and pp_filename
+def gif_settings(info: MediaInfo, target: int, bpp: float) -> tuple[int, float, float]:
+    """Pick the first rung of the ladder whose output is estimated to fit in target
+    bytes, given bpp bytes per pixel"""
+    ladder = gif_ladder(info)
+    for width, fps, pixels in ladder:
+        if bpp * pixels <= target * FIT_MARGIN:
+            return width, fps, pixels
+    return ladder[-1]
 
 
 async def ffmpeg_gif_pp(frag: FileFragment):
-    with NamedTemporaryFile() as fp:
-        fp.write(frag.file_bytes)
-        fp.flush()
-        proc = await asyncio.create_subprocess_exec(
-            "ffmpeg",
-            "-f",
-            "mp4",
-            "-i",
-            fp.name,
-            "-filter_complex",
-            "[0:v]palettegen[p];[0:v][p]paletteuse",
-            "-f",
-            "gif",
-            "pipe:",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-        )
-
+    file_data = frag.file_data
+    feed = None
+    if file_data.in_memory and moov_first(data := await file_data.aread()):
+        infile: str | Path = "pipe:0"
+        feed = feed_spool(file_data)
+    else:
+        data = None
+        infile = await file_data.amaterialize()
+    target = frag.target_size
+    info = None
+    if target is not None:
+        info = await frag.cog.pp_scheduler.probe(infile, data, priority=ANIMATION)
+    bpp = GIF_BYTES_PER_PIXEL
+
+    # without a target or a way to estimate the size, make a full quality gif
+    for attempt in range(1 if target is None or info is None else FIT_ATTEMPTS):
+        graph = "split[a][b];[a]palettegen[p];[b][p]paletteuse"
+        pixels = None
+        downscaled = False
+        if target is not None and info is not None:
+            width, fps, pixels = gif_settings(info, target, bpp)
+            if downscaled := width != info.width or fps != info.fps:
+                graph = f"fps={fps:g},scale={width}:-2:flags=lanczos,{graph}"
         try:
-            stdout, _stderr = await try_wait_for(proc)
-        except asyncio.TimeoutError:
-            pass
-        else:
-            if stdout:
-                frag.pp_bytes = stdout
-                frag.pp_filename = replace_ext(frag.filename, "gif")
+            spool, _ = await frag.cog.pp_scheduler.pipe(
+                "ffmpeg",
+                "-f",
+                "mp4",
+                "-i",
+                infile,
+                "-filter_complex",
+                f"[0:v]{graph}",
+                "-f",
+                "gif",
+                "pipe:1",
+                priority=ANIMATION,
+                size=len(file_data),
+                feed=feed,
+            )
+        except TimeoutError:
+            return
+        if spool is None:
+            return
+        frag.pp_data = spool
+        frag.pp_filename = replace_ext(frag.filename, "gif")
+        frag.pp_downscaled = downscaled
+
+        if target is None or pixels is None or len(spool) <= target:
+            return
+        if attempt + 1 < FIT_ATTEMPTS:
+            # estimate again with what this attempt actually took
+            bpp = len(spool) / pixels
+
+
+def video_settings(info: MediaInfo, target: int) -> tuple[int, int]:
+    """Pick the video bitrate for output to fit in target bytes, and the tallest
+    height from the ladder that bitrate can sustain"""
+    bitrate = int(target * 8 * FIT_MARGIN / info.duration) - AUDIO_BITRATE
+    bitrate = max(bitrate, MIN_VIDEO_BITRATE)
+    for height in (info.height, *VIDEO_HEIGHTS):
+        if height > info.height:
+            continue
+        width = info.width * height / info.height
+        if bitrate >= MIN_BITS_PER_PIXEL * width * height * info.fps:
+            return bitrate, height
+    return bitrate, min(info.height, VIDEO_HEIGHTS[-1])
 
 
 async def ffmpeg_m3u8_to_mp4_pp(frag: FileFragment):
-    with NamedTemporaryFile() as fp:
-        proc = await asyncio.create_subprocess_exec(
-            "ffmpeg",
-            "-i",
-            frag.urls[0],
-            "-c:v",
-            "libx264",
-            "-c:a",
-            "aac",
-            "-f",
-            "mp4",
-            fp.name,
-            "-y",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-        )
+    """Repackage an HLS stream into mp4, copying its streams if they're H.264 and
+    AAC and re-encoding them otherwise, or if the copy is too large.
+
+    Segments are downloaded here, several at a time, and piped in. Streams that
+    can't be downloaded here are left for ffmpeg to fetch itself."""
+    target = frag.target_size
+    url = frag.urls[0]
+    text = (await frag.file_data.aread()).decode(errors="replace")
+    scheduler = frag.cog.pp_scheduler
+    budget = None if target is None else target * FIT_MARGIN
+    max_size = HLS_SIZE_FACTOR * (target or frag.cog.max_size_limit())
+    limited = False
+    try:
+        async with asyncio.timeout(HLS_TIMEOUT):
+            stream = await fetch_stream(
+                frag.cog,
+                text,
+                url,
+                frag.headers,
+                budget=budget,
+                max_size=max_size,
+            )
+    except (FileTooLargeError, TimeoutError):
+        # a stream too large to download in time is too large to copy as is
+        frag.cog.logger.info("HLS stream %s hit download limits", url)
+        stream = None
+        limited = True
+    except (httpx.HTTPError, ResponseError):
+        frag.cog.logger.warning("failed to download HLS stream %s", url, exc_info=True)
+        stream = None
+
+    feed = None
+    if stream is None:
+        inputs: list[str | Path] = ["-i", url]
+        info = await scheduler.probe(url, priority=VIDEO)
+        remuxable = not limited and info is not None and info.codecs <= COPYABLE_CODECS
+    else:
+        inputs = ["-i", "pipe:0"]
+        feed = feed_spool(stream.video)
+        if stream.audio is not None:
+            inputs += ["-i", await stream.audio.amaterialize()]
+        info = None
+        if stream.remuxable is None or target is not None:
+            src, data = await probe_source(stream.video)
+            info = await scheduler.probe(src, data, priority=VIDEO)
+        if info is not None:
+            info = info._replace(duration=stream.duration)
+        remuxable = stream.remuxable
+        if remuxable is None:
+            remuxable = info is not None and info.codecs <= COPYABLE_CODECS
+
+    filename = f"{frag.filename.rpartition(".")[0]}.mp4"
+    if remuxable:
+        path = spool_path(".mp4")
         try:
-            await try_wait_for(proc)
-        except asyncio.TimeoutError:
-            pass
-        else:
-            frag.pp_filename = f"{frag.filename.rpartition(".")[0]}.mp4"
-            fp.seek(0)
-            frag.pp_bytes = fp.read()
+            spool, _ = await frag.cog.pp_scheduler.pipe(
+                "ffmpeg",
+                *inputs,
+                "-c",
+                "copy",
+                *FASTSTART_MP4,
+                path,
+                priority=VIDEO,
+                feed=feed,
+                output=path,
+            )
+        except TimeoutError:
+            spool = None
+        if spool is not None:
+            frag.pp_filename = filename
+            frag.pp_data = spool
+            frag.pp_downscaled = stream is not None and stream.downscaled
+            if target is None or len(spool) <= target:
+                return
+
+    await encode_video(frag, inputs, feed, info, filename)
+
+
+async def encode_video(
+    frag: FileFragment,
+    inputs: list[str | Path],
+    feed: Feed | None,
+    info: MediaInfo | None,
+    filename: str,
+):
+    target = frag.target_size
+    scale = 1.0
+
+    for attempt in range(1 if target is None or info is None else FIT_ATTEMPTS):
+        limits = []
+        if target is not None and info is not None:
+            bitrate, height = video_settings(info, int(target * scale))
+            limits = [
+                "-vf",
+                f"scale=-2:{height}",
+                "-b:v",
+                str(bitrate),
+                "-maxrate",
+                str(bitrate),
+                "-bufsize",
+                str(bitrate * 2),
+                "-b:a",
+                str(AUDIO_BITRATE),
+            ]
+        path = spool_path(".mp4")
+        try:
+            spool, _ = await frag.cog.pp_scheduler.pipe(
+                "ffmpeg",
+                *inputs,
+                "-c:v",
+                "libx264",
+                *limits,
+                "-c:a",
+                "aac",
+                *FASTSTART_MP4,
+                path,
+                priority=VIDEO,
+                feed=feed,
+                output=path,
+            )
+        except TimeoutError:
+            return
+        if spool is None:
+            return
+        frag.pp_filename = filename
+        frag.pp_data = spool
+        frag.pp_downscaled = bool(limits)
+
+        if target is None or len(spool) <= target:
+            return
+        if attempt + 1 < FIT_ATTEMPTS:
+            scale *= target / len(spool)
 
 
 def magick_pp(to: str) -> PP:
@@ -85,25 +582,26 @@ def magick_pp(to: str) -> PP:
             ext = frag.pp_extra
         else:
             ext = frag.filename.rpartition(".")[2]
-        proc = await asyncio.create_subprocess_exec(
-            "magick",
-            "-quiet",
-            f"{ext}:-",
-            f"{to}:-",
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
+        file_data = frag.file_data
         try:
-            stdout, stderr = await try_wait_for(proc, frag.file_bytes)
-        except asyncio.TimeoutError:
-            pass
-        else:
-            if stderr:
-                raise RuntimeError(stderr.decode())
-            frag.pp_bytes = stdout
-            frag.pp_filename = f"{frag.filename.rpartition(".")[0]}.{to}"
+            spool, stderr = await frag.cog.pp_scheduler.pipe(
+                "magick",
+                "-quiet",
+                f"{ext}:-",
+                f"{to}:-",
+                priority=IMAGE,
+                size=len(file_data),
+                feed=feed_spool(file_data),
+                stderr=True,
+            )
+        except TimeoutError:
+            return
+        if stderr:
+            raise RuntimeError(stderr.decode())
+        if spool is None:
+            return
+        frag.pp_data = spool
+        frag.pp_filename = f"{frag.filename.rpartition(".")[0]}.{to}"
 
     inner.__name__ = f"magick_{to}_pp"
     return inner
@@ -113,11 +611,27 @@ magick_gif_pp = magick_pp("gif")
 magick_png_pp = magick_pp("png")
 
 
-def write_durations(tempdir: Path, res: dict[str, Any]):
-    with open(tempdir / "durations.txt", "w") as fp:
-        for frame in res["frames"]:
-            duration = int(frame["delay"]) / 1000
-            fp.write(f"file '{frame['file']}'\nduration {duration}\n")
+def frame_pts(delays: Sequence[int]) -> str:
+    """A setpts filter giving each frame the sum of the delays before it, for
+    frames read at 1000 fps so timestamps are in milliseconds"""
+    terms = "+".join(f"gte(N,{i})*{delay}" for i, delay in enumerate(delays[:-1], 1))
+    return f"setpts='{terms or 0}'"
+
+
+def feed_frames(zip_data: Spool, names: Sequence[str]) -> Feed:
+    """Write frames from a zip to stdin one after another"""
+
+    async def feed(stdin: asyncio.StreamWriter):
+        fp = await asyncio.to_thread(zip_data.open)
+        with ZipFile(fp) as zfp:
+            for name in names:
+                stdin.write(await asyncio.to_thread(zfp.read, name))
+                await stdin.drain()
+
+    return feed
+
+
+FRAME_CODECS = {"jpg": "mjpeg", "jpeg": "mjpeg", "png": "png", "gif": "gif"}
 
 
 def ugoira_pp(to: Literal["gif", "mp4"]) -> PP:
@@ -126,7 +640,12 @@ def ugoira_pp(to: Literal["gif", "mp4"]) -> PP:
         url = "https://app-api.pixiv.net/v1/ugoira/metadata"
         params = {"illust_id": illust_id}
         headers = frag.headers
-        async with frag.cog.get(url, params=params, headers=headers) as resp:
+        async with frag.cog.get(
+            url,
+            params=params,
+            headers=headers,
+            coalesce=True,
+        ) as resp:
             res = resp.json()["ugoira_metadata"]
 
         zip_url = res["zip_urls"]["medium"]
@@ -136,72 +655,57 @@ def ugoira_pp(to: Literal["gif", "mp4"]) -> PP:
 
         headers["referer"] = f"https://www.pixiv.net/en/artworks/{illust_id}"
 
-        zip_bytes, _ = await frag.cog.save(zip_url, headers=headers)
-        zfp = ZipFile(BytesIO(zip_bytes))
-        filename = f"{illust_id}.{to}"
-
-        with TemporaryDirectory() as td:
-            tempdir = Path(td)
-            zfp.extractall(tempdir)
-            await asyncio.to_thread(write_durations, tempdir, res)
-
-            match to:
-                case "gif":
-                    proc = await subprocess.create_subprocess_exec(
-                        "ffmpeg",
-                        "-i",
-                        f"{tempdir}/%06d.jpg",
-                        "-vf",
-                        "palettegen",
-                        f"{tempdir}/palette.png",
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                    )
-                    await proc.wait()
-
-                    proc = await subprocess.create_subprocess_exec(
-                        "ffmpeg",
-                        "-f",
-                        "concat",
-                        "-safe",
-                        "0",
-                        "-i",
-                        f"{tempdir}/durations.txt",
-                        "-i",
-                        f"{tempdir}/palette.png",
-                        "-lavfi",
-                        "paletteuse",
-                        "-f",
-                        "gif",
-                        "pipe:1",
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.DEVNULL,
-                    )
-                case "mp4":
-                    proc = await subprocess.create_subprocess_exec(
-                        "ffmpeg",
-                        "-f",
-                        "concat",
-                        "-safe",
-                        "0",
-                        "-i",
-                        f"{tempdir}/durations.txt",
-                        f"{tempdir}/{filename}",
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                    )
-
-            try:
-                stdout, _stderr = await try_wait_for(proc)
-            except asyncio.TimeoutError:
-                pass
-            else:
-                frag.pp_filename = filename
-                match to:
-                    case "gif":
-                        frag.pp_bytes = stdout
-                    case "mp4":
-                        frag.pp_bytes = await aread(f"{tempdir}/{filename}", "rb")
+        zip_data, _ = await frag.cog.save(zip_url, headers=headers)
+
+        frames = res["frames"]
+        delays = [int(frame["delay"]) for frame in frames]
+        names = [frame["file"] for frame in frames]
+        codec = FRAME_CODECS.get(names[0].rpartition(".")[2].lower(), "mjpeg")
+
+        match to:
+            case "gif":
+                delays = [max(delay, MIN_GIF_DELAY) for delay in delays]
+                output = [
+                    "-filter_complex",
+                    (
+                        f"[0:v]{frame_pts(delays)},split[a][b];"
+                        "[a]palettegen[p];[b][p]paletteuse"
+                    ),
+                    "-final_delay",
+                    str(round(delays[-1] / 10)),
+                    "-f",
+                    "gif",
+                ]
+            case "mp4":
+                output = ["-vf", frame_pts(delays), *FASTSTART_MP4]
+
+        # gifs have no index, so only mp4 needs to be written to a file
+        path = spool_path(".mp4") if to == "mp4" else None
+        try:
+            spool, _ = await frag.cog.pp_scheduler.pipe(
+                "ffmpeg",
+                "-f",
+                "image2pipe",
+                "-framerate",
+                "1000",
+                "-c:v",
+                codec,
+                "-i",
+                "pipe:0",
+                "-fps_mode",
+                "vfr",
+                *output,
+                "pipe:1" if path is None else path,
+                priority=VIDEO,
+                size=len(zip_data),
+                feed=feed_frames(zip_data, names),
+                output=path,
+            )
+        except TimeoutError:
+            return
+        if spool is not None:
+            frag.pp_filename = f"{illust_id}.{to}"
+            frag.pp_data = spool
 
     inner.__name__ = f"ugoira_{to}_pp"
     return inner
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import time
 from datetime import datetime
-from io import BytesIO
 from itertools import groupby
 from sys import getsizeof
 from typing import TYPE_CHECKING, Any, Self, TypedDict, overload
@@ -25,10 +25,13 @@ from .fragment import (
 )
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
+
     from .cog import Crosspost
     from .context import CrosspostContext
     from .database import Settings
     from .postprocess import PP
+    from .queue_cache import QueueCache
     from .sites import Site
 
 
@@ -55,6 +58,9 @@ class FragmentQueue:
     handle_task: asyncio.Task[Self]
     last_used: float  # timestamps
     wait_until: float
+    size: int
+    counted: bool  # whether the queue counts toward its cache's posts
+    cache: QueueCache | None
 
     def __init__(self, ctx: CrosspostContext, site: Site, link: str, *args: str):
         self.site = site
@@ -63,6 +69,9 @@ class FragmentQueue:
         self.author = None
         self.cog = ctx.cog
         self.fragments = []
+        self.size = 0
+        self.counted = False
+        self.cache = None
         self.handle_task = asyncio.create_task(self._handle(ctx))
         self.last_used = self.wait_until = time.time()
 
@@ -78,6 +87,21 @@ class FragmentQueue:
             + sum(map(getsizeof, self.fragments))
         )
 
+    def resize(self, delta: int):
+        self.size += delta
+        if (cache := self.cache) is not None:
+            cache.size += delta
+
+    def file_fragments(self) -> Iterator[FileFragment]:
+        for frag in self.fragments:
+            match frag:
+                case FileFragment():
+                    yield frag
+                case FallbackFragment():
+                    for candidate in frag.candidates:
+                        if candidate.fragment is not None:
+                            yield candidate.fragment
+
     async def _handle(self, ctx: CrosspostContext) -> Self:
         if (cooldown := self.site.cooldown) and (
             timeout := cooldown.update_rate_limit()
@@ -100,6 +124,13 @@ class FragmentQueue:
             await asyncio.sleep(timeout)
 
         await self.site.handler(ctx, self, *self.args)
+
+        self.resize(getsizeof(self) - self.size)
+        if self.fragments:
+            self.counted = True
+            if (cache := self.cache) is not None:
+                cache.posts += 1
+
         return self
 
     def push_file(
@@ -207,6 +238,7 @@ class FragmentQueue:
 
     def clear(self):
         self.fragments.clear()
+        self.resize(getsizeof(self) - self.size)
 
     async def produce(
         self,
@@ -297,22 +329,60 @@ class FragmentQueue:
         settings: Settings,
         force: bool,
     ) -> bool:
-        to_dl: list[FileFragment] = []
+        to_dl: list[int] = []  # indices of items that will be sent as files
         to_trans: list[TextFragment] = []
-        for idx, (item, spoiler) in enumerate(items):
-            if type(item).__name__ == "FallbackFragment":
-                fall_frag: FallbackFragment = item  # type: ignore
-                try:
-                    item = await fall_frag.to_file(ctx)
-                except Exception as e:
-                    raise DownloadError(e, fall_frag) from e
-                items[idx] = item, spoiler
-            if type(item).__name__ == "FileFragment":
-                to_dl.append(item)  # type: ignore
-            if type(item).__name__ == "TextFragment":
-                tfrag: TextFragment = item  # type: ignore
-                if not tfrag.skip_translate:
-                    to_trans.append(tfrag)
+        # fallbacks are resolved in the background, in order, so that sending can
+        # start as soon as the first ones are ready
+        resolving: dict[int, asyncio.Task[FileFragment]] = {}
+        resolve_sem = asyncio.Semaphore(self.site.resolve_limit)
+        prefetching: list[asyncio.Task[None]] = []
+        limit = get_size_limit(ctx)
+        prefetch_depth = self.site.prefetch_depth
+        if (parallelism := self.site.prefetch_parallelism) is None:
+            prefetch_sem = contextlib.nullcontext()
+        else:
+            prefetch_sem = asyncio.Semaphore(parallelism)
+
+        async def resolve(fall_frag: FallbackFragment) -> FileFragment:
+            async with resolve_sem:
+                return await fall_frag.to_file(ctx)
+
+        async def fetch(idx: int):
+            # errors are raised again when the file is sent
+            with contextlib.suppress(Exception):
+                if (task := resolving.get(idx)) is not None:
+                    frag = await task
+                else:
+                    frag = items[idx][0]  # type: ignore
+                frag.fit_to(limit)
+                async with prefetch_sem:
+                    # the download is shared with other presentations of the queue,
+                    # so cancelling this prefetch mustn't cancel it
+                    await asyncio.shield(frag.save())
+
+        def prefetch(count: int):
+            prefetching.extend(
+                asyncio.create_task(fetch(idx))
+                for idx in to_dl[len(prefetching) : count]
+            )
+
+        def cancel_background():
+            for task in [*resolving.values(), *prefetching]:
+                if not task.cancel() and not task.cancelled():
+                    task.exception()
+
+        for idx, (item, _spoiler) in enumerate(items):
+            match type(item).__name__:
+                case "FallbackFragment":
+                    fall_frag: FallbackFragment = item  # type: ignore
+                    resolving[idx] = asyncio.create_task(resolve(fall_frag))
+                    to_dl.append(idx)
+                case "FileFragment":
+                    to_dl.append(idx)
+                case "TextFragment":
+                    tfrag: TextFragment = item  # type: ignore
+                    if not tfrag.skip_translate:
+                        to_trans.append(tfrag)
 
         num_items = len(to_dl)
         if (
@@ -325,6 +395,7 @@ class FragmentQueue:
                 "`b>post pages=1-3,5,7,12-16`",
             )
         ):
+            cancel_background()
             return False
 
         lang = settings.language_or_default()
@@ -332,14 +403,13 @@ class FragmentQueue:
         for item in to_trans:
             item.translate(lang)
 
-        if self.site.concurrent:
-            for item in to_dl:
-                item.save()
+        # with a prefetch depth, files are downloaded a window ahead of sending
+        prefetch(len(to_dl) if prefetch_depth is None else prefetch_depth)
+        sent = 0
 
         embedded = False
 
         file_batch: list[File] = []
-        limit = get_size_limit(ctx)
         text_fragments: list[TextFragment] = []
 
         async def send_files():
@@ -378,8 +448,47 @@ class FragmentQueue:
 
             text_fragments.clear()
 
+        async def send_file(frag: FileFragment, spoiler: bool):  # noqa: FBT001
+            nonlocal embedded
+            try:
+                frag.fit_to(limit)
+                await asyncio.shield(frag.save())
+            except Exception as e:
+                raise DownloadError(e, frag) from e
+            frag.touch()
+            file_data = frag.file_data
+            filename = frag.filename
+            if (pp_data := frag.pp_data) is not None and (
+                len(pp_data) <= limit or not file_data
+            ):
+                file_data = pp_data
+                filename = frag.pp_filename
+            if (oversize := frag.oversize) is not None:
+                size = oversize
+            elif not file_data:
+                msg = "frag.save failed to set file_data"
+                raise RuntimeError(msg)
+            else:
+                size = len(file_data)
+            if size > limit:
+                await send_files()
+                if frag.can_link:
+                    url = frag.urls[0]
+                    if spoiler:
+                        url = f"|| {url} ||"
+                    await ctx.send(url)
+                    embedded = True
+                else:
+                    await ctx.send(
+                        f"File too large to upload ({display_bytes(size)}).",
+                    )
+                return
+            if len(file_batch) == 10:
+                await send_files()
+            file_batch.append(File(file_data.open(), filename, spoiler=spoiler))
+
         try:
-            for item, spoiler in items:
+            for idx, (item, spoiler) in enumerate(items):
                 match type(item).__name__:
                     case "TextFragment":
                         tfrag: TextFragment = item  # type: ignore
@@ -393,47 +502,27 @@ class FragmentQueue:
                         await send_text()
                         efrag: EmbedFragment = item  # type: ignore
                         await ctx.send(embed=efrag.embed)
-                    case "FileFragment":
+                    case "FallbackFragment":
                         await send_text()
-                        frag: FileFragment = item  # type: ignore
+                        if prefetch_depth is not None:
+                            sent += 1
+                            prefetch(sent + prefetch_depth)
                         try:
-                            if to_file := getattr(frag, "to_file", None):
-                                frag = await to_file(ctx)
-                            await frag.save()
+                            frag = await resolving[idx]
                         except Exception as e:
-                            raise DownloadError(e, frag) from e
-                        file_bytes = frag.file_bytes
-                        filename = frag.filename
-                        if not file_bytes:
-                            msg = "frag.save failed to set file_bytes"
-                            raise RuntimeError(msg)
-                        if frag.pp_bytes is not None and len(frag.pp_bytes) <= limit:
-                            file_bytes = frag.pp_bytes
-                            filename = frag.pp_filename
-                        size = len(file_bytes)
-                        if size > limit:
-                            await send_files()
-                            if frag.can_link:
-                                url = frag.urls[0]
-                                if spoiler:
-                                    url = f"|| {url} ||"
-                                await ctx.send(url)
-                                embedded = True
-                            else:
-                                await ctx.send(
-                                    "File too large to upload "
-                                    f"({display_bytes(size)}).",
-                                )
-                            continue
-                        if len(file_batch) == 10:
-                            await send_files()
-                        file_batch.append(
-                            File(BytesIO(file_bytes), filename, spoiler=spoiler),
-                        )
+                            raise DownloadError(e, item) from e
+                        await send_file(frag, spoiler)
+                    case "FileFragment":
+                        await send_text()
+                        if prefetch_depth is not None:
+                            sent += 1
+                            prefetch(sent + prefetch_depth)
+                        await send_file(item, spoiler)  # type: ignore
                     case _:
                         msg = f"unexpected item of type {type(item).__name__}"
                         raise RuntimeError(msg)
         finally:
+            cancel_background()
             await send_files()
             await send_text()
 
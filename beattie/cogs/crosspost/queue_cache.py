@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from beattie.utils.etc import GB
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from .fragment import FileFragment
+    from .queue import FragmentQueue
+
+    Key = tuple[str, ...]
+
+
+QUEUE_CACHE_SIZE: int = 1 * GB
+METADATA_CACHE_SIZE: int = QUEUE_CACHE_SIZE // 4
+FILE_CACHE_SIZE: int = QUEUE_CACHE_SIZE - METADATA_CACHE_SIZE
+
+
+class QueueCache:
+    """Least recently used mapping of post keys to FragmentQueues.
+
+    The cache has two tiers with separate budgets. The metadata tier holds the
+    queues themselves: their fragments, URLs, text and translations. The file tier
+    holds the downloaded bytes of FileFragments belonging to cached queues, and is
+    emptied first, so a post whose files were dropped can be served again without
+    rerunning its site handler.
+
+    Queues and fragments report changes in their size as they happen, so the
+    cache keeps running totals and never walks its contents to check its size."""
+
+    max_size: int
+    max_file_size: int
+    size: int
+    file_size: int
+    posts: int
+    _queues: OrderedDict[Key, FragmentQueue]
+    _files: OrderedDict[FileFragment, None]
+
+    def __init__(
+        self,
+        max_size: int = METADATA_CACHE_SIZE,
+        max_file_size: int = FILE_CACHE_SIZE,
+    ):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.size = 0
+        self.file_size = 0
+        self.posts = 0
+        self._queues = OrderedDict()
+        self._files = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._queues
+
+    def __iter__(self) -> Iterator[Key]:
+        return iter(self._queues)
+
+    def __setitem__(self, key: Key, queue: FragmentQueue):
+        self.pop(key)
+        self._queues[key] = queue
+        queue.cache = self
+        self.size += queue.size
+        if queue.counted:
+            self.posts += 1
+        for frag in queue.file_fragments():
+            self.resize_file(frag, frag.nbytes)
+
+    def get(self, key: Key) -> FragmentQueue | None:
+        if (queue := self._queues.get(key)) is not None:
+            self._queues.move_to_end(key)
+        return queue
+
+    def pop(self, key: Key) -> FragmentQueue | None:
+        if (queue := self._queues.pop(key, None)) is not None:
+            self._forget(queue)
+        return queue
+
+    def _forget(self, queue: FragmentQueue):
+        for frag in queue.file_fragments():
+            if frag in self._files:
+                del self._files[frag]
+                self.file_size -= frag.nbytes
+        queue.cache = None
+        self.size -= queue.size
+        if queue.counted:
+            self.posts -= 1
+
+    def resize_file(self, frag: FileFragment, delta: int):
+        self.file_size += delta
+        if frag.nbytes:
+            self._files[frag] = None
+            self._files.move_to_end(frag)
+        else:
+            self._files.pop(frag, None)
+
+    def touch(self, frag: FileFragment):
+        if frag in self._files:
+            self._files.move_to_end(frag)
+
+    def oldest(self) -> FragmentQueue | None:
+        return next(iter(self._queues.values()), None)
+
+    def evict(self) -> int:
+        for _ in range(len(self._files)):
+            if self.file_size <= self.max_file_size:
+                break
+            frag, _ = self._files.popitem(last=False)
+            if (task := frag.dl_task) is not None and not task.done():
+                self._files[frag] = None
+                continue
+            frag.release()
+
+        count = 0
+        while self._queues and self.size > self.max_size:
+            _, queue = self._queues.popitem(last=False)
+            self._forget(queue)
+            count += 1
+        return count
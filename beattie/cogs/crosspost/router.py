@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import re
+    from collections.abc import Collection, Iterable
+
+    from .sites import Site
+
+
+def link_host(link: str) -> str:
+    try:
+        return urlsplit(link).hostname or ""
+    except ValueError:
+        return ""
+
+
+class SiteRouter:
+    """Finds the sites that can handle a link by looking up its host.
+
+    Sites list the domains they handle in Site.hosts, each of which also covers
+    its subdomains. Only the patterns of the sites registered for a link's host are
+    run. Links to hosts no site claims go to the fallback sites instead."""
+
+    _hosts: dict[str, list[Site]]
+    _fallback: list[Site]
+
+    def __init__(self, sites: Iterable[Site]):
+        self._hosts = {}
+        self._fallback = []
+        for site in sites:
+            if site.fallback:
+                self._fallback.append(site)
+            for host in site.hosts:
+                self._hosts.setdefault(host.lower(), []).append(site)
+
+    def candidates(self, host: str) -> list[Site]:
+        labels = host.lower().split(".")
+        for i in range(len(labels)):
+            if (sites := self._hosts.get(".".join(labels[i:]))) is not None:
+                return sites
+        return self._fallback
+
+    def route(
+        self,
+        link: str,
+        blacklist: Collection[str] = (),
+    ) -> list[tuple[re.Match[str], Site]]:
+        return [
+            (m, site)
+            for site in self.candidates(link_host(link))
+            if site.name not in blacklist and (m := site.pattern.search(link))
+        ]
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import re
+from itertools import product
 from typing import TYPE_CHECKING, Literal, NotRequired, TypedDict
 
+import httpx
+
 from discord.utils import find
 
+from beattie.utils.aioutils import AsyncTTLCache
+from beattie.utils.etc import HOUR
 from beattie.utils.exceptions import ResponseError
 
 from .site import Site
@@ -107,12 +114,51 @@ if TYPE_CHECKING:
         uri: str
         value: Post
 
+    class Author(TypedDict):
+        did: str
+        handle: str
+
+    ViewRecord = TypedDict(
+        "ViewRecord",
+        {
+            "$type": str,
+            "uri": str,
+            "author": Author,
+            "value": Post,
+        },
+    )
+
+    RecordView = TypedDict(
+        "RecordView",
+        {
+            "$type": str,
+            "record": ViewRecord,
+        },
+    )
+
+    class PostView(TypedDict):
+        uri: str
+        author: Author
+        record: Post
+        embed: NotRequired[RecordView]
+
+    class PostsResponse(TypedDict):
+        posts: list[PostView]
+
+    # post, quoted author's handle, quoted post
+    Fetched = tuple[PostResponse, str | None, PostResponse | None]
+
 
 POST_FMT = (
     "{}/xrpc/com.atproto.repo.getRecord?repo={}&collection=app.bsky.feed.post&rkey={}"
 )
 PROFILE_FMT = "{}/xrpc/com.atproto.repo.describeRepo?repo={}"
 HANDLE_FMT = "{}/xrpc/com.atproto.identity.resolveHandle?handle={}"
+APPVIEW = "https://public.api.bsky.app"
+RECORD_VIEW = "app.bsky.embed.record#view"
+VIEW_RECORD = "app.bsky.embed.record#viewRecord"
+# the AppView is a shortcut, so it's given up on for the PDS if it's slow
+APPVIEW_TIMEOUT: float = 10
 
 
 class Bluesky(Site):
@@ -121,6 +167,32 @@ class Bluesky(Site):
         r"(?:https://fed.brid.gy/r/)?https?://(?:(?:c|[fv]x)?"
         r"[bx]s[ky]yx?\.app|deer\.social)/profile/([^/]+)/post/([^\s/]+)",
     )
+    hosts = (
+        *(
+            f"{prefix}{b}{sky}{x}.app"
+            for prefix, b, sky, x in product(
+                ["", "c", "fx", "vx"],
+                "bx",
+                ["sky", "syy"],
+                ["", "x"],
+            )
+        ),
+        "deer.social",
+        "fed.brid.gy",
+    )
+    # "appview" fetches a post with its quote in one request, falling back to "pds"
+    method: Literal["appview", "pds"] = "appview"
+
+    dids: AsyncTTLCache[str, str]
+    pdses: AsyncTTLCache[str, str]
+    handles: AsyncTTLCache[str, str]
+
+    def __init__(self, cog: Crosspost):
+        super().__init__(cog)
+        self.logger = logging.getLogger(__name__)
+        self.dids = AsyncTTLCache(self._get_did, ttl=HOUR)
+        self.pdses = AsyncTTLCache(self._get_pds, ttl=6 * HOUR)
+        self.handles = AsyncTTLCache(self._get_handle, ttl=HOUR)
 
     async def handler(
         self,
@@ -129,18 +201,21 @@ class Bluesky(Site):
         repo: str,
         rkey: str,
     ):
-        if repo.startswith("did:"):
-            did = repo
-            pds = await self.get_pds(did)
-        elif did := await self.get_did(repo):
-            pds = await self.get_pds(did)
-        else:
-            did = repo
-            pds = "https://bsky.social"
-
-        xrpc_url = POST_FMT.format(pds, repo, rkey)
-        async with self.cog.get(xrpc_url) as resp:
-            data: PostResponse = resp.json()
+        fetched = None
+        if self.method == "appview":
+            try:
+                fetched = await self.fetch_appview(repo, rkey)
+            except (
+                ResponseError,
+                httpx.TransportError,
+                TimeoutError,
+                ValueError,
+                KeyError,
+            ) as e:
+                self.logger.info("appview failed for %s/%s (%r)", repo, rkey, e)
+        if fetched is None:
+            fetched = await self.fetch_pds(repo, rkey)
+        data, qname, qdata = fetched
 
         post = data["value"]
         text = post["text"] or None
@@ -150,29 +225,17 @@ class Bluesky(Site):
             return
 
         qtext = None
-        qname = None
         if embed["$type"] == "app.bsky.embed.record":
-            _, _, qdid, _, qrkey = embed["record"]["uri"].split("/")
-
-            qpds = await self.get_pds(qdid)
-
-            xrpc_url = POST_FMT.format(qpds, qdid, qrkey)
-            async with self.cog.get(xrpc_url) as resp:
-                data: PostResponse = resp.json()
-
+            # without its quote, the post has nothing to crosspost
+            if qdata is None:
+                return
+            data = qdata
             post = data["value"]
             qtext = post["text"]
             embed = post.get("embed")
             if embed is None:
                 return
 
-            url = PROFILE_FMT.format(qpds, qdid)
-            if not url.startswith("http"):
-                url = f"https://{url}"
-            async with self.cog.get(url) as resp:
-                pdata: ProfileResponse = resp.json()
-            qname = pdata["handle"]
-
         images = []
         video = None
         match embed["$type"]:
@@ -194,11 +257,11 @@ class Bluesky(Site):
         did = data["uri"].removeprefix("at://").partition("/")[0]
 
         queue.author = repo
-        queue.link = f"{pds}/profile/{repo}/post/{rkey}"
+        queue.link = f"https://bsky.app/profile/{repo}/post/{rkey}"
 
         if video:
             cid = video["ref"]["$link"]
-            pds = await self.get_pds(did)
+            pds = await self.pdses.get(did)
             url = f"{pds}/xrpc/com.atproto.sync.getBlob?did={did}&cid={cid}"
             filename = f"{cid}.mp4"
             queue.push_file(
@@ -227,7 +290,79 @@ class Bluesky(Site):
                 )
                 queue.push_text(text)
 
-    async def get_pds(self, did: str) -> str:
+    async def fetch_appview(self, repo: str, rkey: str) -> Fetched | None:
+        """Fetch a post and the post it quotes in one request to the AppView.
+
+        Returns None if the AppView doesn't have the post, or can't show the post
+        it quotes, which may be blocked or detached there but not on its PDS."""
+        uri = f"at://{repo}/app.bsky.feed.post/{rkey}"
+        url = f"{APPVIEW}/xrpc/app.bsky.feed.getPosts"
+        async with (
+            asyncio.timeout(APPVIEW_TIMEOUT),
+            self.cog.get(url, params={"uris": uri}) as resp,
+        ):
+            data: PostsResponse = resp.json()
+
+        if not (posts := data["posts"]):
+            return None
+        view = posts[0]
+
+        qname = None
+        qdata = None
+        if (embed := view.get("embed")) and embed["$type"] == RECORD_VIEW:
+            record = embed["record"]
+            if record["$type"] != VIEW_RECORD:
+                return None
+            qname = record["author"]["handle"]
+            qdata = record
+
+        return {"uri": view["uri"], "value": view["record"]}, qname, qdata
+
+    async def fetch_pds(self, repo: str, rkey: str) -> Fetched:
+        """Fetch a post, and the post it quotes, from their authors' PDSes"""
+        if repo.startswith("did:"):
+            pds = await self.pdses.get(repo)
+        else:
+            # failures aren't cached, so a transient one is retried next time
+            try:
+                did = await self.dids.get(repo)
+            except ResponseError:
+                pds = "https://bsky.social"
+            else:
+                pds = await self.pdses.get(did)
+
+        data = await self.get_post(pds, repo, rkey)
+
+        qname = None
+        qdata = None
+        embed = data["value"].get("embed")
+        if embed is not None and embed["$type"] == "app.bsky.embed.record":
+            _, _, qdid, _, qrkey = embed["record"]["uri"].split("/")
+            qpds = await self.pdses.get(qdid)
+            try:
+                qdata, qname = await asyncio.gather(
+                    self.get_post(qpds, qdid, qrkey),
+                    self.handles.get(qdid),
+                )
+            except ResponseError:
+                # the quoted post has been deleted, so the post is left without it
+                qdata = qname = None
+
+        return data, qname, qdata
+
+    async def get_post(self, pds: str, repo: str, rkey: str) -> PostResponse:
+        async with self.cog.get(POST_FMT.format(pds, repo, rkey)) as resp:
+            return resp.json()
+
+    async def _get_handle(self, did: str) -> str:
+        url = PROFILE_FMT.format(await self.pdses.get(did), did)
+        if not url.startswith("http"):
+            url = f"https://{url}"
+        async with self.cog.get(url) as resp:
+            data: ProfileResponse = resp.json()
+        return data["handle"]
+
+    async def _get_pds(self, did: str) -> str:
         async with self.cog.get(f"https://plc.directory/{did}") as resp:
             info: PlcDirectory = resp.json()
         service = find(
@@ -240,12 +375,8 @@ class Bluesky(Site):
             pds = "https://bsky.social"
         return pds
 
-    async def get_did(self, repo: str) -> str | None:
-        url = HANDLE_FMT.format("https://public.api.bsky.app", repo)
-        try:
-            async with self.cog.get(url) as resp:
-                data: HandleResponse = resp.json()
-        except ResponseError:
-            return None
-        else:
-            return data["did"]
+    async def _get_did(self, repo: str) -> str:
+        url = HANDLE_FMT.format(APPVIEW, repo)
+        async with self.cog.get(url) as resp:
+            data: HandleResponse = resp.json()
+        return data["did"]
@@ -30,6 +30,7 @@ if TYPE_CHECKING:
 class Danbooru(Site):
     name = "danbooru"
     pattern = re.compile(r"https?://danbooru\.donmai\.us/posts/(\d+)")
+    hosts = ("danbooru.donmai.us",)
 
     headers: dict[str, str]
 
@@ -39,6 +39,7 @@ class E621(Site):
     pattern = re.compile(
         r"https?://(?:www\.)?e621\.net/p(?:ost(?:s|/show))?/([0-9a-v]+)",
     )
+    hosts = ("e621.net",)
 
     headers: dict[str, str]
 
@@ -27,6 +27,7 @@ if TYPE_CHECKING:
 class Exhentai(Site):
     name = "exhentai"
     pattern = re.compile(r"https?://e[x-]hentai\.org/g/(\d+)/(\w+)")
+    hosts = ("exhentai.org", "e-hentai.org")
 
     async def handler(
         self,
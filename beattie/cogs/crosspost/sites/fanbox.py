@@ -57,6 +57,7 @@ class Fanbox(Site):
     pattern = re.compile(
         r"https://(?:(?:www\.)?fanbox\.cc/@)?([\w-]+)(?:\.fanbox\.cc)?/posts/(\d+)",
     )
+    hosts = ("fanbox.cc",)
 
     async def on_invoke(
         self,
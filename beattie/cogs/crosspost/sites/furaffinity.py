@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import re
+from itertools import product
 from typing import TYPE_CHECKING
 
 from lxml import html
@@ -25,6 +26,10 @@ class FurAffinity(Site):
     pattern = re.compile(
         r"https?://(?:www\.)?(?:[fv]?x)?f[ux]raffinity\.net/view/(\d+)",
     )
+    hosts = tuple(
+        f"{prefix}f{x}raffinity.net"
+        for prefix, x in product(["", "x", "fx", "vx"], "ux")
+    )
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, sub_id: str):
         link = f"https://www.fxraffinity.net/view/{sub_id}?full"
@@ -30,6 +30,7 @@ GELBOORU_API_URL = "https://gelbooru.com/index.php"
 class Gelbooru(Site):
     name = "gelbooru"
     pattern = re.compile(r"https?://gelbooru\.com/index\.php\?(?:\w+=[^>&\s]+&?){2,}")
+    hosts = ("gelbooru.com",)
 
     gelbooru_params: dict[str, str]
 
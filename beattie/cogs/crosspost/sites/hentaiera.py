@@ -22,7 +22,16 @@ class HentaiEra(Site):
         r"(?:imhentai\.xxx|(?:hentaienvy|hentaiera|hentaifox|hentairox|hentaizap)\.com)"
         r"/(?:gallery|view)/\d+",
     )
-    concurrent = False
+    hosts = (
+        "imhentai.xxx",
+        "hentaienvy.com",
+        "hentaiera.com",
+        "hentaifox.com",
+        "hentairox.com",
+        "hentaizap.com",
+    )
+    prefetch_depth = 10
+    prefetch_parallelism = 2
 
     async def handler(
         self,
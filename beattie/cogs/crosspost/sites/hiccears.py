@@ -4,7 +4,6 @@ import logging
 import re
 from typing import TYPE_CHECKING
 
-import toml
 from lxml import html
 
 from beattie.utils.aioutils import aload
@@ -12,6 +11,8 @@ from beattie.utils.aioutils import aload
 from .site import Site
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     import httpx
 
     from ..cog import Crosspost
@@ -37,15 +38,34 @@ class Hiccears(Site):
         r"https?://(?:www\.)?hiccears\.com/(?:[\w-]+/)?"
         r"(?:contents/[\w-]+|file/[\w-]+/[\w-]+/preview)",
     )
+    hosts = ("hiccears.com",)
 
     headers: dict[str, str]
+    unsubscribe: Callable[[], None] | None
 
     def __init__(self, cog: Crosspost):
         super().__init__(cog)
         self.logger = logging.getLogger(__name__)
+        self.unsubscribe = None
 
     async def load(self):
         self.headers = await aload("config/crosspost/hiccears.toml")
+        state = self.cog.state
+        # the cookie used to be written back to the config, and is now site state
+        if cookie := self.headers.get("Cookie"):
+            state.seed(self.name, {"cookie": cookie})
+        if cookie := state.get(self.name, "cookie"):
+            self.headers["Cookie"] = cookie
+        self.unsubscribe = state.subscribe(self.name, self.on_state_change)
+
+    async def unload(self):
+        if self.unsubscribe is not None:
+            self.unsubscribe()
+            self.unsubscribe = None
+
+    def on_state_change(self, key: str, value: str | None):
+        if key == "cookie" and value:
+            self.headers["Cookie"] = value
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, link: str):
         async with self.cog.get(
@@ -117,7 +137,4 @@ class Hiccears(Site):
                 self.headers["Cookie"],
             )
 
-            self.headers["Cookie"] = cookie
-
-            with open("config/crosspost/hiccears.toml", "w") as fp:
-                toml.dump(self.headers, fp)
+            self.cog.state.set(self.name, "cookie", cookie)
@@ -33,7 +33,9 @@ class Hitomi(Site):
     pattern = re.compile(
         r"https?://(?:www\.)?hitomi\.la/(?:[^/]+)/(?:.+-)?(\d+)(?:\.html)?",
     )
-    concurrent = False
+    hosts = ("hitomi.la",)
+    prefetch_depth = 10
+    prefetch_parallelism = 2
 
     async def load(self) -> None:
         async with self.cog.get(GG_JS) as resp:
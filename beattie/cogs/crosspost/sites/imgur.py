@@ -36,6 +36,7 @@ class Imgur(Site):
     pattern = re.compile(
         r"https?://(?:www\.)?imgur\.com/(?:(a|gallery)/)?(?:(?:\w+)-)*(\w+)",
     )
+    hosts = ("imgur.com",)
 
     headers: dict[str, str]
 
@@ -39,6 +39,7 @@ class Inkbunny(Site):
         r"https?://(?:www\.)?inkbunny\.net/"
         r"(?:s/|submissionview\.php\?id=)(\d+)(?:-p\d+-)?(?:#.*)?",
     )
+    hosts = ("inkbunny.net",)
 
     sid: str
     login: dict[str, str]
@@ -20,6 +20,7 @@ if TYPE_CHECKING:
 class Itaku(Site):
     name = "itaku"
     pattern = re.compile(r"https?://itaku\.ee/images/(\d+)")
+    hosts = ("itaku.ee",)
 
     async def handler(
         self,
@@ -21,6 +21,7 @@ LOFTER_TEXT_SELECTOR = (
 class Lofter(Site):
     name = "lofter"
     pattern = re.compile(r"https?://[\w-]+\.lofter\.com/post/\w+")
+    hosts = ("lofter.com",)
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, link: str):
         async with self.cog.get(link, use_browser_ua=True) as resp:
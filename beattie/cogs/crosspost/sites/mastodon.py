@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
 import logging
 import re
+import time
 import urllib.parse as urlparse
 from typing import TYPE_CHECKING, Any, TypedDict
 
@@ -10,10 +13,11 @@ import httpx
 import toml
 from lxml import html
 
-from beattie.utils.aioutils import adump
+from beattie.utils.etc import DAY
 from beattie.utils.exceptions import ResponseError
 
 from ..postprocess import ffmpeg_gif_pp
+from ..router import link_host
 from .site import Site
 
 if TYPE_CHECKING:
@@ -36,6 +40,10 @@ if TYPE_CHECKING:
     class NodeInfo(TypedDict):
         software: Software
 
+    class Detection(TypedDict):
+        software: str | None  # None if not activitypub
+        checked: float
+
     class MastodonAccount(TypedDict):
         url: str
 
@@ -94,16 +102,21 @@ MASTO_API_FMT = "https://{}/api/v1/statuses/{}"
 PEERTUBE_API_FMT = "https://{}/api/v1/videos/{}"
 MISSKEY_API_FMT = "https://{}/api/notes/show"
 CONFIG = "config/crosspost/mastodon.toml"
+# detections are redone after this long. positive ones are refreshed in the
+# background while the old result keeps being used, negative ones before use
+POSITIVE_TTL = 7 * DAY
+NEGATIVE_TTL = 1 * DAY
 
 
 class Mastodon(Site):
     name = "mastodon"
     pattern = re.compile(r"(https?://([^\s/]+)/(?:\S+/)+([\w-]+))(?:[\s>/)]|$)")
+    fallback = True
 
     auth: dict[str, dict[str, str]]
-    whitelist: dict[str, str]
-    blacklist: set[str]
+    seed: dict[str, Detection]
     dispatch: dict[str, Handler]
+    probes: dict[str, asyncio.Task[str | None]]
 
     def __init__(self, cog: Crosspost):
         super().__init__(cog)
@@ -114,10 +127,21 @@ class Mastodon(Site):
         except FileNotFoundError:
             data = {}
 
-        self.whitelist = data.pop("whitelist", {})
-        self.blacklist = set(data.pop("blacklist", []))
+        # detections used to be kept in the config, and are moved to site state
+        now = time.time()
+        self.seed = {
+            **{
+                domain: {"software": None, "checked": now}
+                for domain in data.pop("blacklist", [])
+            },
+            **{
+                domain: {"software": software, "checked": now}
+                for domain, software in data.pop("whitelist", {}).items()
+            },
+        }
         self.rewrite = data.pop("rewrite", {})
         self.auth = data
+        self.probes = {}
 
         pre = "do_"
         self.dispatch = {
@@ -131,6 +155,12 @@ class Mastodon(Site):
         self.dispatch["akkoma"] = self.do_mastodon
         self.dispatch["bridgy-fed"] = self.do_nothing
 
+    async def load(self):
+        self.cog.state.seed(self.name, self.seed)
+
+    def detection(self, domain: str) -> Detection | None:
+        return self.cog.state.get(self.name, domain)
+
     async def sniff(self, domain: str) -> str:
         async with self.cog.get(
             f"https://{domain}/.well-known/nodeinfo",
@@ -144,37 +174,63 @@ class Mastodon(Site):
 
         return data["software"]["name"]
 
-    async def determine(self, domain: str) -> str | None:
+    async def software(self, domain: str) -> str | None:
+        """The activitypub software domain runs, or None if it doesn't"""
+        if (detection := self.detection(domain)) is None:
+            return await asyncio.shield(self.determine(domain))
+
+        software = detection["software"]
+        age = time.time() - detection["checked"]
+        if software is None:
+            if age > NEGATIVE_TTL:
+                return await asyncio.shield(self.determine(domain))
+        elif age > POSITIVE_TTL:
+            # nothing awaits the refresh, so it's kept in probes until it's done
+            # and its failure is logged here
+            task = self.determine(domain)
+            task.add_done_callback(functools.partial(self._refreshed, domain))
+        return software
+
+    def _refreshed(self, domain: str, task: asyncio.Task[str | None]):
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            self.logger.error(
+                "failed to refresh detection of %s",
+                domain,
+                exc_info=exc,
+            )
+
+    def determine(self, domain: str) -> asyncio.Task[str | None]:
+        """Detect domain's software, sharing one probe between concurrent callers"""
+        if (task := self.probes.get(domain)) is None:
+            task = asyncio.create_task(self._determine(domain))
+            self.probes[domain] = task
+            task.add_done_callback(lambda _: self.probes.pop(domain, None))
+        return task
+
+    async def _determine(self, domain: str) -> str | None:
         try:
             software = await self.sniff(domain)
-        except (
-            ResponseError,
-            json.JSONDecodeError,
-            IndexError,
-            httpx.ConnectError,
-        ):
+        except (httpx.TransportError, ResponseError) as e:
+            transient = not isinstance(e, ResponseError) or (
+                e.code is not None and (e.code >= 500 or e.code == 429)
+            )
+            previous = self.detection(domain)
+            if transient and previous is not None and previous["software"]:
+                # don't lose a known instance to it being down for a while
+                self.logger.info("failed to reach %s (%s)", domain, e)
+                return previous["software"]
+            software = None
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
             software = None
 
         if software:
             self.logger.info("detected %s as activitypub (%s)", domain, software)
-            try:
-                self.blacklist.remove(domain)
-            except KeyError:
-                pass
-            self.whitelist[domain] = software
         else:
             self.logger.info("failed to detect %s as activitypub", domain)
-            self.whitelist.pop(domain, None)
-            self.blacklist.add(domain)
-
-        data = {
-            **self.auth,
-            "whitelist": self.whitelist,
-            "blacklist": self.blacklist,
-            "rewrite": self.rewrite,
-        }
+            software = None
 
-        await adump(CONFIG, data)
+        detection: Detection = {"software": software, "checked": time.time()}
+        self.cog.state.set(self.name, domain, detection)
 
         return software
 
@@ -186,17 +242,13 @@ class Mastodon(Site):
         site: str,
         post_id: str,
     ):
-        info = await self.cog.tldextract(link)
+        info = self.cog.domains.resolve(link_host(link))
         domain = f"{info.domain}.{info.suffix}"
         if sub := info.subdomain:
             domain = f"{sub}.{domain}"
-        if domain in self.blacklist:
-            return
         if rewrite := self.rewrite.get(domain):
             domain = site = rewrite
-        if (software := self.whitelist.get(domain)) is None and (
-            software := await self.determine(domain)
-        ) is None:
+        if (software := await self.software(domain)) is None:
             return
 
         if (handler := self.dispatch.get(software)) is None:
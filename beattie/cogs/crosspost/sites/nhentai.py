@@ -35,6 +35,7 @@ API_FMT = "https://nhentai.net/api/v2/{}"
 class Nhentai(Site):
     name = "nhentai"
     pattern = re.compile(r"https?://(?:www\.)?nhentai\.net/g/(\d+)")
+    hosts = ("nhentai.net",)
     image_servers: list[str]
 
     def __init__(self, cog: Crosspost):
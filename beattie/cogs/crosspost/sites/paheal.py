@@ -19,6 +19,7 @@ SOURCE_SELECTOR = ".//tr[@data-row='Source Link']/td//a"
 class Paheal(Site):
     name = "paheal"
     pattern = re.compile(r"https?://rule34\.paheal\.net/post/view/(\d+)")
+    hosts = ("rule34.paheal.net",)
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, post: str):
         link = f"https://rule34.paheal.net/post/view/{post}"
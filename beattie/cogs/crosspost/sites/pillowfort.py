@@ -23,6 +23,7 @@ OG_TITLE = og("title")
 class Pillowfort(Site):
     name = "pillowfort"
     pattern = re.compile(r"https?://(?:www\.)?pillowfort\.social/posts/\d+")
+    hosts = ("pillowfort.social",)
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, link: str):
         async with self.cog.get(link, use_browser_ua=True) as resp:
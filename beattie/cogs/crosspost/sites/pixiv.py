@@ -14,7 +14,7 @@ from lxml import html
 from discord.ext.commands import Cooldown
 
 from beattie.cogs.crosspost.fragment import FileSpec
-from beattie.utils.aioutils import adump, aload
+from beattie.utils.aioutils import aload
 
 from ..database_types import TextLength
 from ..postprocess import ugoira_gif_pp, ugoira_mp4_pp
@@ -65,6 +65,7 @@ class Pixiv(Site):
         r"https?://(?:www\.)?ph?ixiv\.net/(?:(?:en/)?artworks/|"
         r"member_illust\.php\?(?:\w+=\w+&?)*illust_id=|i/)(\d+)",
     )
+    hosts = ("pixiv.net", "phixiv.net")
     headers: dict[str, str]
     cooldown = Cooldown(10, 60)
 
@@ -79,6 +80,11 @@ class Pixiv(Site):
         self.logger = logging.getLogger(__name__)
 
     async def load(self):
+        # the refresh token used to be written back to the config,
+        # and is now site state
+        login: Config = await aload(CONFIG)  # pyright: ignore[reportAssignmentType]
+        self.cog.state.seed(self.name, {"refresh_token": login["refresh_token"]})
+
         if self.cog.bot.extra.get("pixiv_login_task") is None:
             self.cog.bot.extra["pixiv_login_task"] = asyncio.create_task(
                 self.login_loop(),
@@ -92,8 +98,6 @@ class Pixiv(Site):
     async def login_loop(self):
         url = "https://oauth.secure.pixiv.net/auth/token"
         while True:
-            login: Config = await aload(CONFIG)  # pyright: ignore[reportAssignmentType]
-
             data = {
                 "get_secure_url": 1,
                 "client_id": "MOBrBDS8blbauoSck0ZfDbtuzpyT",
@@ -101,7 +105,7 @@ class Pixiv(Site):
             }
 
             data["grant_type"] = "refresh_token"
-            data["refresh_token"] = login["refresh_token"]
+            data["refresh_token"] = self.cog.state.get(self.name, "refresh_token")
 
             hash_secret = (
                 "28c1fdd170a5204386cb1313c7077b34f83e4aaf4aa829ce78c231e05b0bae2c"
@@ -132,9 +136,7 @@ class Pixiv(Site):
                     break
 
             self.headers["Authorization"] = f'Bearer {res["access_token"]}'
-            login["refresh_token"] = res["refresh_token"]
-
-            await adump(CONFIG, login)  # pyright: ignore[reportArgumentType]
+            self.cog.state.set(self.name, "refresh_token", res["refresh_token"])
             await asyncio.sleep(res["expires_in"])
 
     async def handler(
@@ -2,14 +2,15 @@ from __future__ import annotations
 
 import asyncio
 import re
+from functools import partial
 from typing import TYPE_CHECKING, TypedDict
 
-import httpx
 import toml
 from lxml import html
 
 import discord
 
+from ..spool import Spool
 from .site import Site
 
 if TYPE_CHECKING:
@@ -29,7 +30,9 @@ POIPIKU_URL_GROUPS = re.compile(r"https?://poipiku\.com/(\d+)/(\d+)\.html")
 class Poipiku(Site):
     name = "poipiku"
     pattern = re.compile(r"https?://poipiku\.com/\d+/\d+\.html")
-    concurrent = False
+    hosts = ("poipiku.com",)
+    prefetch_depth = 10
+    prefetch_parallelism = 2
 
     headers: dict[str, str]
 
@@ -37,7 +40,7 @@ class Poipiku(Site):
         super().__init__(cog)
         with open("config/headers.toml") as fp:
             headers = toml.load(fp)
-        self.session = httpx.AsyncClient(follow_redirects=True, timeout=None)
+        self.session = cog.bot.shared.http.get("poipiku")
         cookies = self.session.cookies
         with open("config/crosspost/poipiku.toml") as fp:
             data = toml.load(fp)
@@ -168,9 +171,9 @@ class Poipiku(Site):
         if not link.startswith("https:"):
             link = f"https:{link}"
         frag = queue.push_file(link)
-        frag.dl_task = asyncio.create_task(self.save(frag, referer))
+        frag.download = partial(self.save, referer=referer)
 
-    async def save(self, frag: FileFragment, referer: str):
+    async def save(self, frag: FileFragment, *, referer: str):
         wait = 1
         while True:
             resp = await self.session.get(frag.urls[0], headers={"Referer": referer})
@@ -181,4 +184,4 @@ class Poipiku(Site):
             await asyncio.sleep(wait)
             wait *= 2
 
-        frag.file_bytes = resp.content
+        frag.file_data = Spool(resp.content)
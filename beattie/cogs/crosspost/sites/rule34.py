@@ -26,6 +26,7 @@ API_URL = "https://rule34.xxx/index.php"
 class Rule34(Site):
     name = "r34"
     pattern = re.compile(r"https?://rule34\.xxx/index\.php\?(?:\w+=[^&]+&?){2,}")
+    hosts = ("rule34.xxx",)
     auth: Config
 
     def __init__(self, cog: Crosspost):
@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     import re
+    from collections.abc import Collection
 
     from discord.ext.commands import Cooldown
 
@@ -17,8 +18,13 @@ class Site(ABC):
     cog: Crosspost
     name: str
     pattern: re.Pattern[str]
+    hosts: Collection[str] = ()  # domains handled, including their subdomains
+    fallback: bool = False  # handles links to hosts no site claims
     cooldown: Cooldown | None = None
-    concurrent: bool = True
+    resolve_limit: int = 4  # FallbackFragments resolved at once
+    # files downloaded ahead of the one being sent, or None to download all at once
+    prefetch_depth: int | None = None
+    prefetch_parallelism: int | None = None  # None for unlimited
 
     def __init__(self, cog: Crosspost):
         self.cog = cog
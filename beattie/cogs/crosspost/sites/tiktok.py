@@ -4,6 +4,7 @@ import base64
 import re
 import urllib.parse as urlparse
 from html import unescape as html_unescape
+from itertools import product
 from typing import TYPE_CHECKING, TypedDict
 
 from lxml import etree
@@ -34,6 +35,9 @@ class Tiktok(Site):
     pattern = re.compile(
         r"https?://(?:\w+\.)*(?:vx|kk)?t[in]ktok\.com/(?:@[\w\.]+/video/|t/)?[\w\-]+",
     )
+    hosts = tuple(
+        f"{prefix}t{i}ktok.com" for prefix, i in product(["", "vx", "kk"], "in")
+    )
     API_URL = "https://offload.tnktok.com/api/v1/statuses"
 
     async def handler(
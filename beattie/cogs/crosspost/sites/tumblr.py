@@ -50,6 +50,7 @@ class Tumblr(Site):
         r"https?://(?:(?:www\.)?tumb(?:lr|ex)\.com/)?"
         r"([\w-]+)(?:/|\.tumblr(?:\.com)?/post/)(\d+)",
     )
+    hosts = ("tumblr.com", "tumblr", "tumbex.com")
 
     @staticmethod
     def embeddable(block: ContentBlock) -> bool:
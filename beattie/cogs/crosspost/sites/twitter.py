@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import re
 from html import unescape as html_unescape
+from itertools import product
+from string import ascii_lowercase, digits
 from typing import TYPE_CHECKING, Any, Literal
 
 from ..postprocess import ffmpeg_gif_pp
@@ -24,6 +26,36 @@ class Twitter(Site):
         r"girlcock|stupidpenis|skibidi|cunny|mpreg|peepeepoopoodumdumtwitter)?x"
         r"(?:cancel)?)(?:vx)?\.(?:com|org)/[^\s/]+/status/(\d+)",
     )
+    hosts = (
+        *(
+            f"{prefix}tw{i}tter{vx}.{tld}"
+            for prefix, i, vx, tld in product(
+                ["", "zz", *(f"{c}x" for c in ascii_lowercase + digits + "-")],
+                "ix",
+                ["", "vx"],
+                ["com", "org"],
+            )
+        ),
+        *(
+            f"{prefix}x{cancel}{vx}.{tld}"
+            for prefix, cancel, vx, tld in product(
+                [
+                    "",
+                    "fixup",
+                    "fixv",
+                    "girlcock",
+                    "stupidpenis",
+                    "skibidi",
+                    "cunny",
+                    "mpreg",
+                    "peepeepoopoodumdumtwitter",
+                ],
+                ["", "cancel"],
+                ["", "vx"],
+                ["com", "org"],
+            )
+        ),
+    )
 
     method: Method = "fxtwitter"
 
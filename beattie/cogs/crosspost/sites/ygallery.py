@@ -24,6 +24,7 @@ AUTHOR_SELECTOR = "//div[contains(@class, 'subheader')]/span/a"
 class YGallery(Site):
     name = "ygal"
     pattern = re.compile(r"https?://(?:(?:old|www)\.)?y-gallery\.net/view/(\d+)")
+    hosts = ("y-gallery.net",)
 
     headers: dict[str, str]
 
@@ -24,6 +24,7 @@ class YTCommunity(Site):
         r"https?://(?:www\.)?youtube\.com/"
         r"(?:post/|channel/[^/]+/community\?lb=)([\w-]+)",
     )
+    hosts = ("youtube.com",)
 
     async def handler(self, _ctx: CrosspostContext, queue: FragmentQueue, post_id: str):
         link = f"https://youtube.com/post/{post_id}"
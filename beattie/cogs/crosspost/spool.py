@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import uuid
+import weakref
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from beattie.utils.etc import MB
+
+from .exceptions import FileTooLargeError
+
+if TYPE_CHECKING:
+    from typing import Self
+
+SPOOL_DIR = Path("cache/crosspost/spool")
+SPOOL_THRESHOLD: int = 4 * MB
+
+
+def spool_path(suffix: str = "") -> Path:
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    return SPOOL_DIR / f"{uuid.uuid4().hex}{suffix}"
+
+
+def clean_spool_dir(cutoff: float):
+    """Remove spool files last modified before cutoff, left behind by a previous
+    process"""
+    for path in SPOOL_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class Spool:
+    """The contents of a file, held in memory if small and on disk otherwise.
+
+    A spool's contents don't change once it's created. Each call to open returns
+    an independent handle, so the same spool can be read by several uploads or
+    subprocesses at once. A spool's file is deleted when the spool is collected."""
+
+    __slots__ = ("__weakref__", "_data", "_finalizer", "digest", "path", "size")
+
+    _data: bytes | None
+    path: Path | None
+    size: int
+    digest: str | None
+
+    def __init__(
+        self,
+        data: bytes = b"",
+        *,
+        path: Path = None,
+        size: int = None,
+        digest: str = None,
+    ):
+        self.digest = digest
+        self._finalizer = None
+        if path is None:
+            self._data = data
+            self.path = None
+            self.size = len(data)
+        else:
+            self._data = None
+            self._own(path)
+            self.size = path.stat().st_size if size is None else size
+
+    def _own(self, path: Path):
+        self.path = path
+        self._finalizer = weakref.finalize(self, path.unlink, missing_ok=True)
+
+    @classmethod
+    def adopt(cls, path: Path, *, threshold: int = SPOOL_THRESHOLD) -> Self:
+        """Take ownership of a file, reading it into memory if it's small"""
+        if path.stat().st_size < threshold:
+            data = path.read_bytes()
+            path.unlink()
+            return cls(data)
+        return cls(path=path)
+
+    @classmethod
+    async def aadopt(cls, path: Path, *, threshold: int = SPOOL_THRESHOLD) -> Self:
+        return await asyncio.to_thread(cls.adopt, path, threshold=threshold)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    def open(self) -> BinaryIO:
+        if self._data is not None:
+            return BytesIO(self._data)
+        assert self.path is not None
+        return open(self.path, "rb")
+
+    def read(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        assert self.path is not None
+        return self.path.read_bytes()
+
+    async def aread(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        return await asyncio.to_thread(self.read)
+
+    def _hash(self) -> str:
+        if self._data is not None:
+            return hashlib.sha256(self._data).hexdigest()
+        with self.open() as fp:
+            return hashlib.file_digest(fp, "sha256").hexdigest()
+
+    async def adigest(self) -> str:
+        """The SHA-256 of the contents, computed if it isn't known yet"""
+        if (digest := self.digest) is None:
+            if self.in_memory and self.size < SPOOL_THRESHOLD:
+                digest = self._hash()
+            else:
+                digest = await asyncio.to_thread(self._hash)
+            self.digest = digest
+        return digest
+
+    def materialize(self) -> Path:
+        """Move the contents to disk if they aren't already, returning the path"""
+        if self._data is not None:
+            path = spool_path()
+            path.write_bytes(self._data)
+            self._own(path)
+            self._data = None
+        assert self.path is not None
+        return self.path
+
+    async def amaterialize(self) -> Path:
+        if self.path is not None:
+            return self.path
+        return await asyncio.to_thread(self.materialize)
+
+
+class SpoolWriter:
+    """Builds a Spool from chunks, moving to disk once past the threshold.
+
+    Raises FileTooLargeError once more than max_size bytes have been written."""
+
+    threshold: int
+    max_size: int | None
+    size: int
+    _chunks: list[bytes]
+    _fp: BinaryIO | None
+    _path: Path | None
+
+    def __init__(self, threshold: int = SPOOL_THRESHOLD, max_size: int = None):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.size = 0
+        self._chunks = []
+        self._fp = None
+        self._path = None
+        self._hash = hashlib.sha256()
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLargeError(self.size)
+        self._hash.update(chunk)
+        if self._fp is None and self.size > self.threshold:
+            self._path = path = spool_path()
+            self._fp = fp = await asyncio.to_thread(open, path, "wb")
+            await asyncio.to_thread(fp.writelines, self._chunks)
+            self._chunks.clear()
+        if self._fp is None:
+            self._chunks.append(chunk)
+        else:
+            await asyncio.to_thread(self._fp.write, chunk)
+
+    async def close(self) -> Spool:
+        digest = self._hash.hexdigest()
+        if (fp := self._fp) is None:
+            return Spool(b"".join(self._chunks), digest=digest)
+        await asyncio.to_thread(fp.close)
+        assert self._path is not None
+        return Spool(path=self._path, size=self.size, digest=digest)
+
+    async def abort(self):
+        self._chunks.clear()
+        if (fp := self._fp) is not None:
+            await asyncio.to_thread(fp.close)
+        if (path := self._path) is not None:
+            path.unlink(missing_ok=True)
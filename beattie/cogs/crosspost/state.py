@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    import asyncpg
+
+    Listener = Callable[[str, Any], None]
+
+
+STATE_FLUSH_DELAY: float = 5.0
+
+
+class _Deleted:
+    pass
+
+
+DELETED = _Deleted()
+
+
+class SiteState:
+    """Persistent key-value state for sites, stored in the crosspoststate table.
+
+    Everything is loaded into memory at startup, so reads never wait on the
+    database. Writes update memory right away. They are written to the database
+    in one batch after a short delay, so a burst of updates costs a single round
+    trip. Values must be JSON serializable.
+
+    Listeners subscribed to a site are called with the key and new value (None if
+    deleted) whenever that site's state changes."""
+
+    pool: asyncpg.Pool
+    delay: float
+    ready: bool
+    _data: dict[str, dict[str, Any]]
+    _dirty: dict[tuple[str, str], Any]
+    _listeners: dict[str, list[Listener]]
+    _flush_task: asyncio.Task[None] | None
+
+    def __init__(self, pool: asyncpg.Pool, delay: float = STATE_FLUSH_DELAY):
+        self.pool = pool
+        self.delay = delay
+        self.ready = False
+        self._data = {}
+        self._dirty = {}
+        self._listeners = {}
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    async def async_init(self):
+        async with self._lock:
+            if self.ready:
+                return
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS public.crosspoststate (
+                        site text NOT NULL,
+                        key text NOT NULL,
+                        value jsonb NOT NULL,
+                        PRIMARY KEY(site, key)
+                    );
+                    """,
+                )
+                rows = await conn.fetch("SELECT site, key, value FROM crosspoststate")
+
+            for row in rows:
+                site_data = self._data.setdefault(row["site"], {})
+                site_data[row["key"]] = json.loads(row["value"])
+            self.ready = True
+
+    def get(self, site: str, key: str, default: Any = None) -> Any:
+        return self._data.get(site, {}).get(key, default)
+
+    def items(self, site: str) -> dict[str, Any]:
+        return dict(self._data.get(site, {}))
+
+    def set(self, site: str, key: str, value: Any):
+        self._data.setdefault(site, {})[key] = value
+        self._changed(site, key, value)
+
+    def delete(self, site: str, key: str):
+        if self._data.get(site, {}).pop(key, DELETED) is not DELETED:
+            self._changed(site, key, DELETED)
+
+    def seed(self, site: str, values: Mapping[str, Any]):
+        """Set any of the given keys that aren't set yet"""
+        site_data = self._data.get(site, {})
+        for key, value in values.items():
+            if key not in site_data:
+                self.set(site, key, value)
+
+    def subscribe(self, site: str, listener: Listener) -> Callable[[], None]:
+        """Call listener on changes to site's state. Returns an unsubscriber."""
+        listeners = self._listeners.setdefault(site, [])
+        listeners.append(listener)
+        return lambda: listeners.remove(listener)
+
+    def _changed(self, site: str, key: str, value: Any):
+        self._dirty[site, key] = value
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        for listener in self._listeners.get(site, []):
+            try:
+                listener(key, None if value is DELETED else value)
+            except Exception:
+                self.logger.exception("error in state listener for %s", site)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._flush_task = None
+        try:
+            await self._write()
+        except Exception:
+            self.logger.exception("failed to write site state")
+
+    async def flush(self):
+        """Write pending changes now"""
+        if (task := self._flush_task) is not None:
+            self._flush_task = None
+            task.cancel()
+        await self._write()
+
+    async def _write(self):
+        async with self._lock:
+            await self._write_inner()
+
+    async def _write_inner(self):
+        dirty = self._dirty
+        if not dirty:
+            return
+        self._dirty = {}
+
+        upserts = []
+        deletes = []
+        for (site, key), value in dirty.items():
+            if value is DELETED:
+                deletes.append((site, key))
+            else:
+                upserts.append((site, key, json.dumps(value)))
+
+        try:
+            async with self.pool.acquire() as conn, conn.transaction():
+                if upserts:
+                    await conn.executemany(
+                        """
+                        INSERT INTO crosspoststate(site, key, value)
+                        VALUES($1, $2, $3::jsonb)
+                        ON CONFLICT (site, key) DO UPDATE
+                        SET value = EXCLUDED.value
+                        """,
+                        upserts,
+                    )
+                if deletes:
+                    await conn.executemany(
+                        "DELETE FROM crosspoststate WHERE site = $1 AND key = $2",
+                        deletes,
+                    )
+        except Exception:
+            # keep the changes to retry with the next write, unless superseded
+            self._dirty = {**dirty, **self._dirty}
+            raise
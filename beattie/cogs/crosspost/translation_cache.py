@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import unicodedata
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Mapping
+
+    import asyncpg
+
+
+TRANSLATION_TTL = timedelta(days=90)
+
+
+def segment_key(text: str, source: str, target: str, backend: str) -> bytes:
+    text = unicodedata.normalize("NFC", text).strip()
+    return hashlib.sha256(f"{backend}\0{source}\0{target}\0{text}".encode()).digest()
+
+
+class TranslationCache:
+    """Translations of text segments, stored in the crossposttranslation table.
+
+    Segments are keyed by segment_key, so the same text translated with the same
+    languages and backend is only sent to the backend once. Looking a segment up
+    marks it as used, and segments unused for longer than ttl are removed when the
+    cache is initialized."""
+
+    pool: asyncpg.Pool
+    ttl: timedelta
+    ready: bool
+    hits: int
+    misses: int
+
+    def __init__(self, pool: asyncpg.Pool, ttl: timedelta = TRANSLATION_TTL):
+        self.pool = pool
+        self.ttl = ttl
+        self.ready = False
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+    async def async_init(self):
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS public.crossposttranslation (
+                    key bytea NOT NULL PRIMARY KEY,
+                    translation text NOT NULL,
+                    last_used timestamptz NOT NULL DEFAULT now()
+                );
+
+                CREATE INDEX IF NOT EXISTS crossposttranslation_idx_last_used
+                ON crossposttranslation (last_used);
+                """,
+            )
+            result = await conn.execute(
+                "DELETE FROM crossposttranslation WHERE last_used < now() - $1",
+                self.ttl,
+            )
+        self.logger.info("pruned unused translations: %s", result)
+        self.ready = True
+
+    async def get_many(self, keys: Collection[bytes]) -> dict[bytes, str]:
+        if not self.ready or not keys:
+            return {}
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE crossposttranslation SET last_used = now()
+                WHERE key = ANY($1::bytea[])
+                RETURNING key, translation
+                """,
+                list(keys),
+            )
+        self.hits += len(rows)
+        self.misses += len(keys) - len(rows)
+        return {row["key"]: row["translation"] for row in rows}
+
+    async def put_many(self, translations: Mapping[bytes, str]):
+        if not self.ready or not translations:
+            return
+        async with self.pool.acquire() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO crossposttranslation(key, translation)
+                VALUES($1, $2)
+                ON CONFLICT (key) DO UPDATE
+                SET translation = EXCLUDED.translation, last_used = now()
+                """,
+                list(translations.items()),
+            )
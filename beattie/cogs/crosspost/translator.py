@@ -7,14 +7,18 @@ from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, NamedTuple
 
 import Levenshtein
-import lingua
 
 from beattie.utils.exceptions import ResponseError
 
+from .detection import LanguageDetection
+from .exceptions import TranslationQuotaError, TranslatorClosedError
+from .translation_cache import segment_key
+
 if TYPE_CHECKING:
-    from collections.abc import Mapping
+    from collections.abc import Awaitable, Mapping, Sequence
 
     from .cog import Crosspost
+    from .translation_cache import TranslationCache
 
 
 class Language(NamedTuple):
@@ -22,6 +26,9 @@ class Language(NamedTuple):
     name: str
 
 
+BATCH_WINDOW: float = 0.05  # seconds to wait for more texts before sending a batch
+BATCH_SIZE = 50  # the most texts deepl accepts in one request
+
 DONT = Language("xx", "Don't")
 UNKNOWN = Language("zz", "Unknown")
 ENGLISH = Language("en", "English (default)")
@@ -29,6 +36,7 @@ ENGLISH = Language("en", "English (default)")
 
 class Translator(ABC):
     cog: Crosspost
+    name: str
     api_url: str
     _lang_task: asyncio.Task[Mapping[str, Language]] | None
 
@@ -42,32 +50,57 @@ class Translator(ABC):
     @abstractmethod
     async def languages(self) -> Mapping[str, Language]: ...
 
+    async def warm(self):
+        """Do the setup for translating ahead of time, so it doesn't hold up the
+        first translation"""
+        await self.languages()
+
     @abstractmethod
     async def detect(self, text: str) -> Language: ...
 
     @abstractmethod
     async def translate(self, text: str, source: str, target: str) -> str: ...
 
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        """Translate several texts, in one request where the backend allows"""
+        return list(
+            await asyncio.gather(
+                *(self.translate(text, source, target) for text in texts),
+            ),
+        )
+
 
 class HybridTranslator(Translator):
+    name = "hybrid"
     libre: LibreTranslator
     deepl: DeeplTranslator
-    detector: lingua.LanguageDetector
+    detection: LanguageDetection
 
     def __init__(self, cog: Crosspost, libre: LibreTranslator, deepl: DeeplTranslator):
         super().__init__(cog, "", "")
         self.libre = libre
         self.deepl = deepl
 
+    async def warm(self):
+        await self.languages()
+        await self.detection.load()
+
     async def _languages(self) -> Mapping[str, Language]:
 
         deepl_langs = await self.deepl.languages()
         libre_langs = await self.libre.languages()
         shared = set(deepl_langs) & set(libre_langs) - {"xx", "zz"}
 
-        self.detector = lingua.LanguageDetectorBuilder.from_iso_codes_639_1(
-            *(getattr(lingua.IsoCode639_1, code.upper()) for code in shared),
-        ).build()
+        self.detection = LanguageDetection(
+            shared,
+            self.cog.detectors,
+            self.cog.detection_executor,
+        )
 
         return {
             "xx": DONT,
@@ -76,15 +109,19 @@ class HybridTranslator(Translator):
         }
 
     def languages(self) -> asyncio.Task[Mapping[str, Language]]:
-        if self._lang_task is None:
-            self._lang_task = asyncio.Task(self._languages())
-        return self._lang_task
+        if (
+            (task := self._lang_task) is None
+            or task.done()
+            and (task.cancelled() or task.exception())
+        ):
+            task = self._lang_task = asyncio.Task(self._languages())
+        return task
 
     async def detect(self, text: str) -> Language:
         langs = await self.languages()
 
-        if lang := await asyncio.to_thread(self.detector.detect_language_of, text):
-            return langs[lang.iso_code_639_1.name.lower()]
+        if code := await self.detection.detect(text):
+            return langs[code]
         return DONT
 
     async def translate(self, text: str, source: str, target: str) -> str:
@@ -94,11 +131,15 @@ class HybridTranslator(Translator):
         if source == DONT or source not in langs:
             return text
         if source in ("ja", "zh", "ko"):
-            trans = await self.deepl.translate(text, source, target)
-            if trans.casefold() == "home":
-                return text
-            if Levenshtein.ratio(trans, text, processor=str.casefold) < 0.75:
-                return trans
+            try:
+                trans = await self.deepl.translate(text, source, target)
+            except TranslationQuotaError:
+                pass
+            else:
+                if trans.casefold() == "home":
+                    return text
+                if Levenshtein.ratio(trans, text, processor=str.casefold) < 0.75:
+                    return trans
 
         trans = await self.libre.translate(text, source, target)
 
@@ -107,10 +148,48 @@ class HybridTranslator(Translator):
 
         return text
 
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        langs = await self.languages()
+        if source == "zz":
+            return await super().translate_many(texts, source, target)
+        if source == DONT or source not in langs:
+            return list(texts)
+
+        results: list[str | None] = [None] * len(texts)
+        if source in ("ja", "zh", "ko"):
+            try:
+                out = await self.deepl.translate_many(texts, source, target)
+            except TranslationQuotaError:
+                pass
+            else:
+                for idx, (text, trans) in enumerate(zip(texts, out, strict=True)):
+                    if trans.casefold() == "home":
+                        results[idx] = text
+                    elif Levenshtein.ratio(trans, text, processor=str.casefold) < 0.75:
+                        results[idx] = trans
+
+        if pending := [idx for idx, result in enumerate(results) if result is None]:
+            out = await self.libre.translate_many(
+                [texts[idx] for idx in pending],
+                source,
+                target,
+            )
+            for idx, trans in zip(pending, out, strict=True):
+                text = texts[idx]
+                results[idx] = trans if Levenshtein.ratio(trans, text) < 0.75 else text
+
+        return [result or "" for result in results]
+
 
 class SelectiveTranslator(Translator):
+    name = "selective"
     inner: Translator
-    detector: lingua.LanguageDetector
+    detection: LanguageDetection
     whitelist: list[str]
 
     def __init__(self, cog: Crosspost, inner: Translator, languages: list[str]):
@@ -118,18 +197,20 @@ class SelectiveTranslator(Translator):
         self.inner = inner
         self.whitelist = languages
 
+    async def warm(self):
+        await self.inner.warm()
+        await self.languages()
+        await self.detection.load()
+
     async def _languages(self) -> Mapping[str, Language]:
         inner_langs = await self.inner.languages()
         lang_codes = set(inner_langs) - {"xx", "zz"}
-        langs = (
-            lang
-            for code in lang_codes
-            if (lang := getattr(lingua.IsoCode639_1, code.upper(), None))
-        )
 
-        self.detector = lingua.LanguageDetectorBuilder.from_iso_codes_639_1(
-            *langs,
-        ).build()
+        self.detection = LanguageDetection(
+            lang_codes,
+            self.cog.detectors,
+            self.cog.detection_executor,
+        )
 
         return {
             "xx": DONT,
@@ -138,15 +219,19 @@ class SelectiveTranslator(Translator):
         }
 
     def languages(self) -> asyncio.Task[Mapping[str, Language]]:
-        if self._lang_task is None:
-            self._lang_task = asyncio.Task(self._languages())
-        return self._lang_task
+        if (
+            (task := self._lang_task) is None
+            or task.done()
+            and (task.cancelled() or task.exception())
+        ):
+            task = self._lang_task = asyncio.Task(self._languages())
+        return task
 
     async def detect(self, text: str) -> Language:
         langs = await self.languages()
 
-        if lang := await asyncio.to_thread(self.detector.detect_language_of, text):
-            return langs[lang.iso_code_639_1.name.lower()]
+        if code := await self.detection.detect(text):
+            return langs[code]
         return DONT
 
     async def translate(self, text: str, source: str, target: str) -> str:
@@ -158,8 +243,250 @@ class SelectiveTranslator(Translator):
 
         return await self.inner.translate(text, source, target)
 
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        langs = await self.languages()
+        if source == "zz":
+            return await super().translate_many(texts, source, target)
+        if source == DONT or source not in langs or source not in self.whitelist:
+            return list(texts)
+
+        return await self.inner.translate_many(texts, source, target)
+
+
+class CachingTranslator(Translator):
+    """Translates text line by line, through a TranslationCache.
+
+    Only lines missing from the cache are sent to the inner translator, together
+    in one request, so text repeated across posts (signatures, tag lines) is only
+    ever translated once."""
+
+    name = "caching"
+    inner: Translator
+    cache: TranslationCache
+
+    def __init__(self, cog: Crosspost, inner: Translator, cache: TranslationCache):
+        super().__init__(cog, "", "")
+        self.inner = inner
+        self.cache = cache
+
+    def languages(self) -> Awaitable[Mapping[str, Language]]:
+        return self.inner.languages()
+
+    async def warm(self):
+        await self.inner.warm()
+
+    async def detect(self, text: str) -> Language:
+        return await self.inner.detect(text)
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        return (await self.translate_many([text], source, target))[0]
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        try:
+            return await self._translate_many(texts, source, target)
+        except TranslationQuotaError:
+            # leave the text untranslated, without caching that
+            return list(texts)
+
+    async def _translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        backend = self.inner.name
+        split = [text.splitlines() for text in texts]
+        keys = {
+            segment: segment_key(segment, source, target, backend)
+            for lines in split
+            for line in lines
+            if (segment := line.strip())
+        }
+        wholes = [segment_key(text, source, target, backend) for text in texts]
+
+        try:
+            found = await self.cache.get_many({*wholes, *keys.values()})
+        except Exception:
+            self.logger.exception("failed to look up cached translations")
+            return await self.inner.translate_many(texts, source, target)
+
+        results: list[str | None] = [found.get(whole) for whole in wholes]
+        # index of the text, its lines missing from the cache, and whether that's all
+        requests: list[tuple[int, list[str], bool]] = []
+        for idx, lines in enumerate(split):
+            if results[idx] is not None:
+                continue
+            segments = dict.fromkeys(
+                segment for line in lines if (segment := line.strip())
+            )
+            missing = [segment for segment in segments if keys[segment] not in found]
+            if missing:
+                requests.append((idx, missing, len(missing) == len(segments)))
+
+        if requests:
+            out = await self.inner.translate_many(
+                ["\n".join(missing) for _, missing, _ in requests],
+                source,
+                target,
+            )
+            new: dict[bytes, str] = {}
+            retry = []
+            for (idx, missing, complete), trans in zip(requests, out, strict=True):
+                trans_lines = trans.split("\n")
+                if len(trans_lines) == len(missing):
+                    for segment, line in zip(missing, trans_lines, strict=True):
+                        new[keys[segment]] = line.strip()
+                elif complete:
+                    # lines were merged or split, so they can't be matched up.
+                    # cache the text as a whole instead
+                    results[idx] = new[wholes[idx]] = trans
+                else:
+                    retry.append(idx)
+
+            if retry:
+                out = await self.inner.translate_many(
+                    [texts[idx] for idx in retry],
+                    source,
+                    target,
+                )
+                for idx, trans in zip(retry, out, strict=True):
+                    results[idx] = new[wholes[idx]] = trans
+
+            found.update(new)
+            self.store(new)
+
+        return [
+            (
+                result
+                if result is not None
+                else "\n".join(
+                    found[keys[segment]] if (segment := line.strip()) else line
+                    for line in lines
+                )
+            )
+            for result, lines in zip(results, split, strict=True)
+        ]
+
+    def store(self, translations: Mapping[bytes, str]):
+        async def store():
+            try:
+                await self.cache.put_many(translations)
+            except Exception:
+                self.logger.exception("failed to cache translations")
+
+        self.cog.bot.shared.create_task(store())
+
+
+def fail(texts: Mapping[str, asyncio.Future[str]], error: Exception):
+    for fut in texts.values():
+        if not fut.done():
+            fut.set_exception(error)
+
+
+class BatchingTranslator(Translator):
+    """Collects texts translated within a short window into one request.
+
+    Texts are batched by source and target language, and a batch is sent once the
+    window passes or it reaches BATCH_SIZE texts. Identical texts in a batch are
+    only sent once.
+
+    Closing it fails every text still waiting, so nothing is left waiting on a
+    translator that's been unloaded."""
+
+    name = "batching"
+    inner: Translator
+    window: float
+    _batches: dict[
+        tuple[str, str],
+        tuple[asyncio.TimerHandle, dict[str, asyncio.Future[str]]],
+    ]
+    _tasks: set[asyncio.Task[None]]
+
+    def __init__(self, cog: Crosspost, inner: Translator, window: float = BATCH_WINDOW):
+        super().__init__(cog, "", "")
+        self.inner = inner
+        self.window = window
+        self._batches = {}
+        self._tasks = set()
+
+    def languages(self) -> Awaitable[Mapping[str, Language]]:
+        return self.inner.languages()
+
+    async def warm(self):
+        await self.inner.warm()
+
+    async def detect(self, text: str) -> Language:
+        return await self.inner.detect(text)
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        loop = asyncio.get_running_loop()
+        key = (source, target)
+        if (batch := self._batches.get(key)) is None:
+            handle = loop.call_later(self.window, self._send, key)
+            batch = self._batches[key] = handle, {}
+        handle, texts = batch
+        if (fut := texts.get(text)) is None:
+            fut = texts[text] = loop.create_future()
+            if len(texts) >= BATCH_SIZE:
+                handle.cancel()
+                self._send(key)
+        # the result is shared, so one caller being cancelled mustn't cancel it
+        return await asyncio.shield(fut)
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        return await self.inner.translate_many(texts, source, target)
+
+    def close(self):
+        for handle, texts in self._batches.values():
+            handle.cancel()
+            fail(texts, TranslatorClosedError())
+        self._batches.clear()
+        for task in self._tasks:
+            task.cancel()
+
+    def _send(self, key: tuple[str, str]):
+        _, texts = self._batches.pop(key)
+        task = asyncio.create_task(self._send_inner(key, texts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_inner(
+        self,
+        key: tuple[str, str],
+        texts: dict[str, asyncio.Future[str]],
+    ):
+        source, target = key
+        try:
+            out = await self.inner.translate_many(list(texts), source, target)
+        except Exception as e:
+            fail(texts, e)
+        except BaseException:
+            fail(texts, TranslatorClosedError())
+            raise
+        else:
+            for fut, trans in zip(texts.values(), out, strict=True):
+                if not fut.done():
+                    fut.set_result(trans)
+
 
 class LibreTranslator(Translator):
+    name = "libre"
+    detection: LanguageDetection
 
     async def _languages(self) -> Mapping[str, Language]:
         self.logger.info("fetching language list")
@@ -173,40 +500,41 @@ class LibreTranslator(Translator):
             data=body,
         )
         data = resp.json()
+        langs = {lang["code"]: Language(lang["code"], lang["name"]) for lang in data}
+
+        self.detection = LanguageDetection(
+            langs,
+            self.cog.detectors,
+            self.cog.detection_executor,
+        )
 
         return {
             "xx": DONT,
             "zz": UNKNOWN,
-            **{lang["code"]: Language(lang["code"], lang["name"]) for lang in data},
+            **langs,
         }
 
     def languages(self) -> asyncio.Task[Mapping[str, Language]]:
-        if (task := self._lang_task) is None or task.done() and task.exception():
+        if (
+            (task := self._lang_task) is None
+            or task.done()
+            and (task.cancelled() or task.exception())
+        ):
             task = self._lang_task = asyncio.Task(self._languages())
         return task
 
-    async def detect(self, text: str) -> Language:
-        self.logger.debug("detecting language for: %s", text)
-        body = {
-            "api_key": self.api_key,
-            "q": text,
-        }
-        resp = await self.cog.session.post(f"{self.api_url}/detect", data=body)
-        data = resp.json()
-
-        for lang in data:
-            if lang["language"] in ("ja", "zh"):
-                lang["confidence"] += 20
-
-        lang = max(data, key=lambda el: el["confidence"])
+    async def warm(self):
+        await self.languages()
+        await self.detection.load()
 
+    async def detect(self, text: str) -> Language:
         langs = await self.languages()
-        out = langs[lang["language"]]
-        conf = lang["confidence"]
-        self.logger.debug("detected language as %s %d%%", out, conf)
-        if conf < 60:
-            return DONT
-        return out
+
+        if code := await self.detection.detect(text):
+            out = langs[code]
+            self.logger.debug("detected language as %s", out)
+            return out
+        return DONT
 
     async def translate(self, text: str, source: str, target: str) -> str:
         self.logger.debug(
@@ -230,8 +558,38 @@ class LibreTranslator(Translator):
 
         return data["translatedText"]
 
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        if len(texts) == 1:
+            return [await self.translate(texts[0], source, target)]
+        self.logger.debug(
+            "%s: translating %d texts from %s to %s",
+            type(self).__name__,
+            len(texts),
+            source,
+            target,
+        )
+        if source == "zz":
+            source = "auto"
+        body = {
+            "api_key": self.api_key,
+            "source": source,
+            "target": target,
+            "q": list(texts),
+        }
+
+        resp = await self.cog.session.post(f"{self.api_url}/translate", json=body)
+        data = resp.json()
+
+        return data["translatedText"]
+
 
 class DeeplTranslator(Translator):
+    name = "deepl"
     headers: dict[str, str]
 
     def __init__(self, cog: Crosspost, api_url: str, api_key: str):
@@ -269,23 +627,35 @@ class DeeplTranslator(Translator):
         return langs
 
     def languages(self) -> asyncio.Task[Mapping[str, Language]]:
-        if self._lang_task is None:
-            self._lang_task = asyncio.Task(self._languages())
-        return self._lang_task
+        if (
+            (task := self._lang_task) is None
+            or task.done()
+            and (task.cancelled() or task.exception())
+        ):
+            task = self._lang_task = asyncio.Task(self._languages())
+        return task
 
     async def detect(self, _text: str) -> Language:
         return UNKNOWN
 
     async def translate(self, text: str, source: str, target: str) -> str:
+        return (await self.translate_many([text], source, target))[0]
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
         self.logger.debug(
             "%s: translating from %s to %s: %s",
             type(self).__name__,
             source,
             target,
-            text,
+            texts,
         )
         data = {
-            "text": [text],
+            "text": list(texts),
             "target_lang": target.upper(),
             "model_type": "prefer_quality_optimized",
         }
@@ -294,16 +664,14 @@ class DeeplTranslator(Translator):
 
         data = json.dumps(data).encode("utf-8")
 
-        try:
-            resp = await self.cog.session.post(
-                f"{self.api_url}/translate",
-                headers={**self.headers, "Content-Type": "application/json"},
-                content=data,
-            )
-        except ResponseError as e:
-            if e.code == 456:
-                self.logger.warning("deepl character limit reached")
-                return text
-            raise
-        else:
-            return resp.json()["translations"][0]["text"]
+        resp = await self.cog.session.post(
+            f"{self.api_url}/translate",
+            headers={**self.headers, "Content-Type": "application/json"},
+            content=data,
+        )
+        if resp.status_code == 456:
+            self.logger.warning("deepl character limit reached")
+            raise TranslationQuotaError(self.name)
+        if resp.status_code not in range(200, 300):
+            raise ResponseError(code=resp.status_code, url=str(resp.url))
+        return [trans["text"] for trans in resp.json()["translations"]]
@@ -40,7 +40,7 @@ class XKCD(Cog):
         """Commands for getting xkcd comics"""
         async with ctx.typing():
             url = "https://xkcd.com/info.0.json"
-            async with ctx.bot.get(url) as resp:
+            async with ctx.bot.get(url, coalesce=True) as resp:
                 self.xkcd_data = resp.json()
             if not inp or inp == "random":
                 await self.random(ctx)
@@ -90,7 +90,7 @@ class XKCD(Cog):
         url = f"https://xkcd.com/{number}/info.0.json"
         data: XkcdData
         try:
-            async with ctx.bot.get(url) as resp:
+            async with ctx.bot.get(url, coalesce=True) as resp:
                 data = resp.json()
         except ResponseError:
             data = {
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import asyncio
-from typing import TYPE_CHECKING, Any, NoReturn, TypeVar
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Generic, NoReturn, TypeVar
 
 import toml
 
@@ -12,6 +14,8 @@ if TYPE_CHECKING:
     from os import PathLike
 
 T = TypeVar("T")
+K = TypeVar("K")
+V = TypeVar("V")
 
 
 def do_every(
@@ -84,3 +88,56 @@ async def aread(path: str | bytes | PathLike, mode: str = "r"):
 def _read(path: str | bytes | PathLike, mode: str):
     with open(path, mode=mode) as fp:
         return fp.read()
+
+
+class AsyncTTLCache(Generic[K, V]):
+    """Caches the results of an async function of one argument for ttl seconds.
+
+    Concurrent calls for a key that isn't cached share a single call. Exceptions
+    aren't cached. Once there are more than maxsize entries, the least recently
+    used are dropped."""
+
+    func: Callable[[K], Awaitable[V]]
+    ttl: float
+    maxsize: int
+    _entries: OrderedDict[K, tuple[float, V]]
+    _pending: dict[K, asyncio.Task[V]]
+
+    def __init__(
+        self,
+        func: Callable[[K], Awaitable[V]],
+        *,
+        ttl: float,
+        maxsize: int = 1024,
+    ):
+        self.func = func
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    async def get(self, key: K) -> V:
+        if (entry := self._entries.get(key)) is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        if (task := self._pending.get(key)) is None:
+            task = asyncio.create_task(self._fill(key))
+            self._pending[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: K) -> V:
+        try:
+            value = await self.func(key)
+        finally:
+            del self._pending[key]
+        self._entries[key] = time.monotonic() + self.ttl, value
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: K):
+        self._entries.pop(key, None)
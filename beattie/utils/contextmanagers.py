@@ -6,21 +6,33 @@ import logging
 from contextlib import AbstractAsyncContextManager
 from typing import TYPE_CHECKING, Any, Generic, TypeVar
 
-from httpx import RemoteProtocolError
+from httpx import QueryParams, RemoteProtocolError
 
 from .exceptions import ResponseError
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping
+    from collections.abc import Hashable, Mapping
     from types import TracebackType
 
     from httpx import AsyncClient, Response
 
 LOGGER = logging.getLogger(__name__)
 
+# requests sent with coalesce=True that haven't finished yet
+_INFLIGHT: dict[Hashable, asyncio.Task[Response]] = {}
+_BODY_KWARGS = frozenset(("content", "data", "files", "json", "cookies"))
+
 
 class get:  # noqa: N801
-    """Returns a response to the first URL that returns a 200 status code."""
+    """Returns a response to the first URL that returns a 200 status code.
+
+    Requests use the session's timeout unless one is passed, rather than having
+    none; pass timeout=None for a request that may legitimately take a long time.
+
+    With coalesce, a request made while an identical one (same session, method,
+    URL, params and headers) is in flight waits for that one instead, and they
+    share the same response object. Only bodiless, non-streamed requests can be
+    coalesced."""
 
     session: AsyncClient
     resp: Response
@@ -28,6 +40,8 @@ class get:  # noqa: N801
     index: int
     method: str
     error_for_status: bool
+    stream: bool
+    coalesce: bool
     kwargs: Mapping[str, Any]
 
     def __init__(
@@ -36,8 +50,13 @@ class get:  # noqa: N801
         *urls: str,
         method: str = "GET",
         error_for_status: bool = True,
+        stream: bool = False,
+        coalesce: bool = False,
         **kwargs: Any,
     ):
+        if coalesce and (stream or not _BODY_KWARGS.isdisjoint(kwargs)):
+            msg = "only bodiless, non-streamed requests can be coalesced"
+            raise ValueError(msg)
         self.session = session
         self.urls = urls
         self.index = 0
@@ -47,11 +66,11 @@ class get:  # noqa: N801
         if "User-Agent" not in headers:
             headers["User-Agent"] = "BeattieBot/1.0 (BeatButton)"
         kwargs["headers"] = headers
-        if "timeout" not in kwargs:
-            kwargs["timeout"] = None
         self.kwargs = kwargs
         self.method = method
         self.error_for_status = error_for_status
+        self.stream = stream
+        self.coalesce = coalesce
 
     async def __aenter__(self) -> Response:
         retry = 0
@@ -74,20 +93,48 @@ class get:  # noqa: N801
         url = self.urls[self.index]
         LOGGER.debug("making a %s request to %s", self.method, url)
 
-        self.resp = await self.session.request(self.method, url, **self.kwargs)
+        if self.stream:
+            request = self.session.build_request(self.method, url, **self.kwargs)
+            self.resp = await self.session.send(request, stream=True)
+        elif self.coalesce:
+            self.resp = await self._coalesced(url)
+        else:
+            self.resp = await self.session.request(self.method, url, **self.kwargs)
 
         if self.error_for_status and self.resp.status_code not in range(200, 300):
             await self.resp.aclose()
             raise ResponseError(code=self.resp.status_code, url=str(self.resp.url))
         return self.resp
 
+    async def _coalesced(self, url: str) -> Response:
+        kwargs = self.kwargs
+        key = (
+            id(self.session),
+            self.method,
+            url,
+            tuple(sorted(QueryParams(kwargs.get("params")).multi_items())),
+            tuple(sorted(kwargs["headers"].items())),
+            repr(kwargs.get("timeout")),
+        )
+        if (task := _INFLIGHT.get(key)) is None:
+            task = asyncio.create_task(
+                self.session.request(self.method, url, **kwargs),
+            )
+            _INFLIGHT[key] = task
+            task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+        else:
+            LOGGER.debug("coalescing %s request to %s", self.method, url)
+        # one waiter being cancelled mustn't cancel the request for the others
+        return await asyncio.shield(task)
+
     async def __aexit__(
         self,
         exc_type: type[BaseException] | None,
         exc: BaseException | None,
         tb: TracebackType | None,
     ):
-        pass
+        if self.stream:
+            await self.resp.aclose()
 
 
 CM = TypeVar("CM", bound=AbstractAsyncContextManager)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import weakref
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable
+
+
+LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=50,
+    keepalive_expiry=90,
+)
+# requests may stream large files for a long time, so rather than the whole request,
+# connecting and each wait for more data are bounded
+TIMEOUT = httpx.Timeout(None, connect=15, read=60)
+PER_HOST_LIMIT = 8
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Response body that calls release once it's closed, or once it's collected if
+    it never is"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self._finalizer = weakref.finalize(self, release)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self._finalizer()
+
+
+class HostSlots:
+    """A host's semaphore, with a count of the requests holding or waiting on it"""
+
+    __slots__ = ("sem", "users")
+
+    def __init__(self, per_host: int):
+        self.sem = asyncio.Semaphore(per_host)
+        self.users = 0
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport allowing a limited number of requests to each host at once.
+
+    A request holds its host's slot until its response is closed, so streamed
+    downloads count for as long as they're being read. A host's semaphore is
+    dropped once nothing holds or waits on it, so only hosts in use are kept."""
+
+    transport: httpx.AsyncBaseTransport
+    per_host: int
+    _hosts: dict[str, HostSlots]
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self.transport = transport
+        self.per_host = per_host
+        self._hosts = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if (slots := self._hosts.get(host)) is None:
+            slots = self._hosts[host] = HostSlots(self.per_host)
+        slots.users += 1
+        # once the response's stream is wrapped, closing it releases the slot
+        wrapped = False
+        try:
+            await slots.sem.acquire()
+            try:
+                resp = await self.transport.handle_async_request(request)
+                assert isinstance(resp.stream, httpx.AsyncByteStream)
+                resp.stream = ReleasingStream(
+                    resp.stream,
+                    functools.partial(self._release, host, slots),
+                )
+                wrapped = True
+            finally:
+                if not wrapped:
+                    slots.sem.release()
+        finally:
+            if not wrapped:
+                self._leave(host, slots)
+        return resp
+
+    def _release(self, host: str, slots: HostSlots):
+        slots.sem.release()
+        self._leave(host, slots)
+
+    def _leave(self, host: str, slots: HostSlots):
+        slots.users -= 1
+        if not slots.users and self._hosts.get(host) is slots:
+            del self._hosts[host]
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def make_client(*, per_host: int = PER_HOST_LIMIT, **kwargs: Any) -> httpx.AsyncClient:
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(http2=True, limits=LIMITS),
+        per_host,
+    )
+    kwargs.setdefault("follow_redirects", True)
+    kwargs.setdefault("timeout", TIMEOUT)
+    return httpx.AsyncClient(transport=transport, **kwargs)
+
+
+class HTTPClients:
+    """Named HTTP clients shared across the bot.
+
+    Clients are created on first use and live until the bot closes, so reloading
+    an extension reuses its connections and cookies instead of opening new ones."""
+
+    _clients: dict[str, httpx.AsyncClient]
+
+    def __init__(self):
+        self._clients = {}
+
+    def get(self, name: str = "default", **kwargs: Any) -> httpx.AsyncClient:
+        """Get the client with the given name, creating it with kwargs if needed"""
+        if (client := self._clients.get(name)) is None or client.is_closed:
+            client = self._clients[name] = make_client(**kwargs)
+        return client
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from beattie.utils.aioutils import AsyncTTLCache
+
+
+class Lookup:
+    """Counts calls, optionally waiting on an event or failing"""
+
+    def __init__(self):
+        self.calls: list[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.fail = False
+
+    async def __call__(self, key: str) -> str:
+        self.calls.append(key)
+        await self.release.wait()
+        if self.fail:
+            msg = f"lookup of {key} failed"
+            raise LookupError(msg)
+        return key.upper()
+
+
+class AsyncTTLCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cached(self):
+        lookup = Lookup()
+        cache = AsyncTTLCache(lookup, ttl=60)
+        assert await cache.get("a") == "A"
+        assert await cache.get("a") == "A"
+        assert lookup.calls == ["a"]
+
+    async def test_expiry(self):
+        lookup = Lookup()
+        cache = AsyncTTLCache(lookup, ttl=0)
+        assert await cache.get("a") == "A"
+        assert await cache.get("a") == "A"
+        assert lookup.calls == ["a", "a"]
+
+    async def test_invalidate(self):
+        lookup = Lookup()
+        cache = AsyncTTLCache(lookup, ttl=60)
+        await cache.get("a")
+        cache.invalidate("a")
+        cache.invalidate("b")
+        await cache.get("a")
+        assert lookup.calls == ["a", "a"]
+
+    async def test_coalesced(self):
+        lookup = Lookup()
+        lookup.release.clear()
+        cache = AsyncTTLCache(lookup, ttl=60)
+        tasks = [asyncio.create_task(cache.get(key)) for key in "aab"]
+        await asyncio.sleep(0)
+        lookup.release.set()
+        assert await asyncio.gather(*tasks) == ["A", "A", "B"]
+        assert lookup.calls == ["a", "b"]
+
+    async def test_cancelled_waiter(self):
+        lookup = Lookup()
+        lookup.release.clear()
+        cache = AsyncTTLCache(lookup, ttl=60)
+        first = asyncio.create_task(cache.get("a"))
+        second = asyncio.create_task(cache.get("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        lookup.release.set()
+        assert await second == "A"
+        assert lookup.calls == ["a"]
+
+    async def test_exceptions_not_cached(self):
+        lookup = Lookup()
+        lookup.fail = True
+        cache = AsyncTTLCache(lookup, ttl=60)
+        for _ in range(2):
+            try:
+                await cache.get("a")
+            except LookupError:
+                pass
+            else:
+                msg = "lookup didn't fail"
+                raise AssertionError(msg)
+        lookup.fail = False
+        assert await cache.get("a") == "A"
+        assert lookup.calls == ["a", "a", "a"]
+
+    async def test_maxsize(self):
+        lookup = Lookup()
+        cache = AsyncTTLCache(lookup, ttl=60, maxsize=2)
+        for key in "abac":
+            await cache.get(key)
+        # b was used least recently, so it was dropped for c
+        for key in "acb":
+            await cache.get(key)
+        assert lookup.calls == ["a", "b", "c", "b"]
+
+
+if __name__ == "__main__":
+    unittest.main()
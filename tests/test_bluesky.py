@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import contextlib
+import copy
+import unittest
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+from beattie.cogs.crosspost.sites.bluesky import (
+    APPVIEW,
+    RECORD_VIEW,
+    VIEW_RECORD,
+    Bluesky,
+)
+from beattie.utils.exceptions import ResponseError
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+DID = "did:plc:author"
+QDID = "did:plc:quoted"
+PDS = "https://pds.test"
+IMAGES = {
+    "$type": "app.bsky.embed.images",
+    "images": [{"image": {"ref": {"$link": "img"}}}],
+}
+QUOTED = {"text": "quoted", "$type": "app.bsky.feed.post", "embed": IMAGES}
+POST = {
+    "text": "post",
+    "$type": "app.bsky.feed.post",
+    "embed": {
+        "$type": "app.bsky.embed.record",
+        "record": {"cid": "cid", "uri": f"at://{QDID}/app.bsky.feed.post/q"},
+    },
+}
+APPVIEW_POSTS = {
+    "posts": [
+        {
+            "uri": f"at://{DID}/app.bsky.feed.post/p",
+            "author": {"did": DID, "handle": "author.test"},
+            "record": POST,
+            "embed": {
+                "$type": RECORD_VIEW,
+                "record": {
+                    "$type": VIEW_RECORD,
+                    "uri": f"at://{QDID}/app.bsky.feed.post/q",
+                    "author": {"did": QDID, "handle": "quoted.test"},
+                    "value": QUOTED,
+                },
+            },
+        },
+    ],
+}
+
+
+class FakeCog:
+    """Stands in for Crosspost, answering requests by URL prefix"""
+
+    def __init__(self, routes: dict[str, Any]):
+        self.routes = routes
+        self.requests: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, **_kwargs: Any) -> AsyncIterator[Any]:
+        self.requests.append(url)
+        for prefix, data in self.routes.items():
+            if url.startswith(prefix):
+                if isinstance(data, Exception):
+                    raise data
+                yield SimpleNamespace(json=lambda data=data: data)
+                return
+        raise ResponseError(404, url)
+
+
+class FakeQueue:
+    def __init__(self):
+        self.author = None
+        self.link = None
+        self.files: list[str] = []
+        self.texts: list[str] = []
+
+    def push_file(self, url: str, **_kwargs: Any):
+        self.files.append(url)
+
+    def push_text(self, text: str, **_kwargs: Any):
+        self.texts.append(text)
+
+
+PDS_ROUTES = {
+    "https://plc.directory/": {
+        "service": [{"type": "AtprotoPersonalDataServer", "serviceEndpoint": PDS}],
+    },
+    f"{PDS}/xrpc/com.atproto.repo.getRecord?repo={DID}": {
+        "uri": f"at://{DID}/app.bsky.feed.post/p",
+        "value": POST,
+    },
+    f"{PDS}/xrpc/com.atproto.repo.getRecord?repo={QDID}": {
+        "uri": f"at://{QDID}/app.bsky.feed.post/q",
+        "value": QUOTED,
+    },
+    f"{PDS}/xrpc/com.atproto.repo.describeRepo": {"handle": "quoted.test"},
+}
+
+
+class BlueskyTest(unittest.IsolatedAsyncioTestCase):
+    async def run_handler(self, routes: dict[str, Any]) -> tuple[FakeCog, FakeQueue]:
+        cog = FakeCog(routes)
+        site = Bluesky(cog)  # type: ignore
+        queue = FakeQueue()
+        await site.handler(None, queue, DID, "p")  # type: ignore
+        return cog, queue
+
+    def check_quote(self, queue: FakeQueue):
+        assert queue.files == [
+            f"https://cdn.bsky.app/img/feed_fullsize/plain/{QDID}/img@jpeg",
+        ]
+        assert queue.texts == [
+            "\N{BRAILLE PATTERN BLANK}↳ @quoted.test — *quoted*",
+            "post",
+        ]
+
+    async def test_appview(self):
+        cog, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": APPVIEW_POSTS},
+        )
+        self.check_quote(queue)
+        assert len(cog.requests) == 1
+
+    async def test_pds_fallback(self):
+        cog, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": ResponseError(502)} | PDS_ROUTES,
+        )
+        self.check_quote(queue)
+        assert len(cog.requests) > 1
+
+    async def test_missing_from_appview(self):
+        _, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": {"posts": []}} | PDS_ROUTES,
+        )
+        self.check_quote(queue)
+
+    async def test_transport_error_fallback(self):
+        error = httpx.ConnectError("connection failed")
+        _, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": error} | PDS_ROUTES,
+        )
+        self.check_quote(queue)
+
+    async def test_malformed_fallback(self):
+        _, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": {"error": "?"}} | PDS_ROUTES,
+        )
+        self.check_quote(queue)
+
+    async def test_blocked_quote_fallback(self):
+        posts = copy.deepcopy(APPVIEW_POSTS)
+        posts["posts"][0]["embed"]["record"] = {
+            "$type": "app.bsky.embed.record#viewBlocked",
+            "uri": f"at://{QDID}/app.bsky.feed.post/q",
+        }
+        _, queue = await self.run_handler(
+            {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": posts} | PDS_ROUTES,
+        )
+        self.check_quote(queue)
+
+    async def test_deleted_quote(self):
+        routes = {f"{APPVIEW}/xrpc/app.bsky.feed.getPosts": {"posts": []}}
+        routes |= PDS_ROUTES
+        del routes[f"{PDS}/xrpc/com.atproto.repo.getRecord?repo={QDID}"]
+        _, queue = await self.run_handler(routes)
+        assert queue.files == []
+        assert queue.texts == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import unittest
+from types import SimpleNamespace
+from typing import Any
+
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+from beattie.cogs.crosspost.cog import bot_size_limit
+
+MB = 1024 * 1024
+
+
+def make_bot(*limits: int) -> Any:
+    guilds = [SimpleNamespace(filesize_limit=limit) for limit in limits]
+    return SimpleNamespace(guilds=guilds, extra={})
+
+
+class SizeLimitTest(unittest.TestCase):
+    def test_largest_guild(self):
+        assert bot_size_limit(make_bot(10 * MB, 50 * MB, 25 * MB)) == 50 * MB
+
+    def test_no_guilds(self):
+        assert bot_size_limit(make_bot()) == DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+    def test_kept_until_changed(self):
+        bot = make_bot(10 * MB)
+        assert bot_size_limit(bot) == 10 * MB
+        bot.guilds.append(SimpleNamespace(filesize_limit=100 * MB))
+        assert bot_size_limit(bot) == 10 * MB
+        bot.extra.pop("crosspost_size_limit")
+        assert bot_size_limit(bot) == 100 * MB
+
+
+if __name__ == "__main__":
+    unittest.main()
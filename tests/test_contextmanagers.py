@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+import httpx
+
+from beattie.utils.contextmanagers import get
+from beattie.utils.exceptions import ResponseError
+
+
+class CoalesceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests: list[httpx.Request] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            await asyncio.sleep(0.01)
+            status = 404 if request.url.path == "/missing" else 200
+            return httpx.Response(status, content=request.url.query)
+
+        self.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.session.aclose()
+
+    async def fetch(self, url: str, **kwargs: object) -> httpx.Response:
+        async with get(self.session, url, coalesce=True, **kwargs) as resp:
+            return resp
+
+    async def test_single_flight(self):
+        resps = await asyncio.gather(
+            *(self.fetch("https://a.test/", params={"q": "1"}) for _ in range(5)),
+        )
+        assert len(self.requests) == 1
+        assert all(resp is resps[0] for resp in resps)
+        assert resps[0].content == b"q=1"
+
+        await self.fetch("https://a.test/", params={"q": "1"})
+        assert len(self.requests) == 2
+
+    async def test_distinct_requests(self):
+        await asyncio.gather(
+            self.fetch("https://a.test/", params={"q": "1"}),
+            self.fetch("https://a.test/", params={"q": "2"}),
+            self.fetch("https://a.test/", headers={"X-Test": "1"}),
+            self.fetch("https://a.test/"),
+        )
+        assert len(self.requests) == 4
+
+    async def test_shared_error(self):
+        results = await asyncio.gather(
+            *(self.fetch("https://a.test/missing") for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert len(self.requests) == 1
+        assert all(isinstance(result, ResponseError) for result in results)
+
+    async def test_cancelled_waiter(self):
+        first = asyncio.create_task(self.fetch("https://a.test/"))
+        second = asyncio.create_task(self.fetch("https://a.test/"))
+        await asyncio.sleep(0)
+        first.cancel()
+        resp = await second
+        assert resp.status_code == 200
+        assert len(self.requests) == 1
+
+    async def test_rejects_body_and_stream(self):
+        for kwargs in ({"stream": True}, {"json": {}}, {"content": b""}):
+            rejected = False
+            try:
+                get(self.session, "https://a.test/", coalesce=True, **kwargs)
+            except ValueError:
+                rejected = True
+            assert rejected
+
+
+if __name__ == "__main__":
+    unittest.main()
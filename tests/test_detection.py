@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import TYPE_CHECKING
+
+import lingua
+
+from beattie.cogs.crosspost.detection import (
+    LanguageDetection,
+    is_trivial,
+    make_executor,
+    most_confident,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+JAPANESE = "今日はとても良い天気ですね。散歩に行きましょう。"
+FRENCH = "Je pense que nous devrions aller au marché demain matin."
+AMBIGUOUS = "Restaurant Hotel Taxi Menu"
+
+
+class CountingDetection(LanguageDetection):
+    """LanguageDetection recording each batch sent to lingua"""
+
+    batches: list[list[str]]
+
+    def _detect_many(self, texts: Sequence[str]) -> list[str | None]:
+        self.batches.append(list(texts))
+        return super()._detect_many(texts)
+
+
+class TrivialTest(unittest.TestCase):
+    def test_trivial(self):
+        assert is_trivial("")
+        assert is_trivial("!!! 123 :)")
+        assert is_trivial("https://example.com/a/long/path/to/something")
+        assert is_trivial("short text")
+        assert not is_trivial("猫")
+        assert not is_trivial("this is long enough to be worth detecting")
+
+
+class ConfidenceTest(unittest.TestCase):
+    def test_most_confident(self):
+        values = [
+            lingua.ConfidenceValue(lingua.Language.ENGLISH, 0.7),
+            lingua.ConfidenceValue(lingua.Language.FRENCH, 0.3),
+        ]
+        assert most_confident(values) == "en"
+
+    def test_unsure(self):
+        values = [
+            lingua.ConfidenceValue(lingua.Language.ENGLISH, 0.55),
+            lingua.ConfidenceValue(lingua.Language.FRENCH, 0.45),
+        ]
+        assert most_confident(values) is None
+        assert most_confident([]) is None
+
+    def test_boosted(self):
+        values = [
+            lingua.ConfidenceValue(lingua.Language.JAPANESE, 0.45),
+            lingua.ConfidenceValue(lingua.Language.CHINESE, 0.55),
+        ]
+        assert most_confident(values) == "zh"
+
+
+class LanguageDetectionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.detectors = {}
+        self.executor = make_executor()
+        self.detection = CountingDetection(
+            ["en", "ja", "fr", "pt-BR"],
+            self.detectors,
+            self.executor,
+        )
+        self.detection.batches = []
+
+    async def asyncTearDown(self):
+        self.executor.shutdown()
+
+    async def test_codes(self):
+        assert self.detection.codes == {"en", "ja", "fr"}
+
+    async def test_batched(self):
+        # texts are only batched once the detector is loaded, as after warm up
+        await self.detection.load()
+        langs = await asyncio.gather(
+            self.detection.detect(JAPANESE),
+            self.detection.detect(FRENCH),
+            self.detection.detect(JAPANESE),
+            self.detection.detect("ok"),
+        )
+        assert langs == ["ja", "fr", "ja", None]
+        assert self.detection.batches == [[JAPANESE, FRENCH]]
+
+    async def test_ambiguous(self):
+        assert await self.detection.detect(AMBIGUOUS) is None
+
+    async def test_single(self):
+        assert await self.detection.detect(FRENCH) == "fr"
+        assert await self.detection.detect(JAPANESE) == "ja"
+        assert len(self.detection.batches) == 2
+
+    async def test_shared_detector(self):
+        await asyncio.gather(self.detection.load(), self.detection.load())
+        detector = self.detection.detector
+        assert detector is not None
+        assert self.detectors == {frozenset(("en", "ja", "fr")): detector}
+        other = LanguageDetection(["fr", "ja", "en"], self.detectors, self.executor)
+        assert other.detector is detector
+        assert other.executor is self.executor
+
+
+if __name__ == "__main__":
+    unittest.main()
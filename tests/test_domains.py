@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import unittest
+
+from beattie.cogs.crosspost.domains import DomainResolver
+
+
+class DomainResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.resolver = DomainResolver(maxsize=8)
+        self.resolver.warm()
+
+    def test_resolve(self):
+        info = self.resolver.resolve("files.example.co.uk")
+        assert info.subdomain == "files"
+        assert info.domain == "example"
+        assert info.suffix == "co.uk"
+
+    def test_private_suffix(self):
+        info = self.resolver.resolve("someone.github.io")
+        assert info.domain == "github"
+        assert info.suffix == "io"
+
+    def test_cached(self):
+        resolver = self.resolver
+        resolver.resolve("example.com")
+        resolver.resolve("example.com")
+        info = resolver.cache_info()
+        assert info.hits == 1
+        assert info.misses == 1
+        assert info.maxsize == 8
+
+
+if __name__ == "__main__":
+    unittest.main()
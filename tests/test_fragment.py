@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+from beattie.cogs.crosspost.fragment import FallbackFragment, FileFragment, FileSpec
+from beattie.cogs.crosspost.media_cache import MediaCache
+from beattie.cogs.crosspost.postprocess import ffmpeg_gif_pp
+from beattie.cogs.crosspost.spool import Spool
+
+if TYPE_CHECKING:
+    from collections.abc import Coroutine
+
+CTX: Any = SimpleNamespace(guild=None)
+BIG = DEFAULT_FILE_SIZE_LIMIT_BYTES * 2
+
+
+class FakeCog:
+    """Stands in for Crosspost, serving canned sizes and bodies"""
+
+    def __init__(
+        self,
+        probed: dict[str, int | None],
+        bodies: dict[str, int | bytes],
+    ):
+        self.probed = probed
+        self.bodies = bodies
+        self.probes: list[str] = []
+        self.downloads: list[str] = []
+        self.max_sizes: list[int | None] = []
+        self.media_cache = MediaCache(Path("/nonexistent"))
+        self.tasks: list[asyncio.Task[Any]] = []
+        self.bot = SimpleNamespace(shared=SimpleNamespace(create_task=self.create_task))
+
+    def create_task(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task[Any]:
+        task = asyncio.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    async def probe_size(self, url: str, **_kwargs: Any) -> int | None:
+        self.probes.append(url)
+        return self.probed.get(url)
+
+    async def save(
+        self,
+        url: str,
+        *,
+        max_size: int = None,
+        **_kwargs: Any,
+    ) -> tuple[Spool, str | None]:
+        self.downloads.append(url)
+        self.max_sizes.append(max_size)
+        body = self.bodies[url]
+        return Spool(b"\0" * body if isinstance(body, int) else body), None
+
+    def max_size_limit(self) -> int:
+        return BIG * 2
+
+
+def make_fallback(cog: FakeCog, *specs: FileSpec) -> FallbackFragment:
+    queue: Any = SimpleNamespace(cog=cog, cache=None)
+    return FallbackFragment(queue, *specs)
+
+
+async def halve(frag: Any):
+    frag.pp_filename = frag.filename
+    frag.pp_data = Spool(frag.file_data.read()[: len(frag.file_data) // 2])
+
+
+class FallbackProbeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_probe_skips_download(self):
+        cog = FakeCog({"big.png": BIG, "small.png": 10}, {})
+        fall = make_fallback(cog, FileSpec("big.png"), FileSpec("small.png"))
+        frag = await fall.to_file(CTX)
+        assert frag.urls == ("small.png",)
+        assert cog.probes == ["big.png", "small.png"]
+        assert cog.downloads == []
+
+    async def test_unknown_size_downloads(self):
+        cog = FakeCog({}, {"a.png": 10})
+        fall = make_fallback(cog, FileSpec("a.png"))
+        frag = await fall.to_file(CTX)
+        assert cog.downloads == ["a.png"]
+        assert cog.max_sizes == [BIG * 2]
+        assert frag.file_data.read() == b"\0" * 10
+
+    async def test_postprocess_downloads(self):
+        cog = FakeCog({"a.png": BIG}, {"a.png": BIG})
+        fall = make_fallback(cog, FileSpec("a.png", postprocess=halve))
+        frag = await fall.to_file(CTX)
+        assert cog.probes == []
+        assert cog.downloads == ["a.png"]
+        assert cog.max_sizes == [None]
+        assert len(frag.pp_data or ()) == BIG // 2
+
+
+class PostprocessCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cog = FakeCog({}, {"a.png": b"same", "b.png": b"same", "c.png": b"other"})
+        self.cog.media_cache = MediaCache(Path(tmp.name))
+        await self.cog.media_cache.load()
+        self.runs: list[tuple[bytes, Any]] = []
+
+    async def reverse(self, frag: Any):
+        data = frag.file_data.read()
+        self.runs.append((data, frag.pp_extra))
+        frag.pp_filename = f"reversed_{frag.filename}"
+        frag.pp_data = Spool(data[::-1])
+
+    async def process(self, url: str, pp_extra: Any = None) -> FileFragment:
+        queue: Any = SimpleNamespace(cog=self.cog, cache=None)
+        frag = FileFragment(queue, url, postprocess=self.reverse, pp_extra=pp_extra)
+        await frag.save()
+        # let the cache write finish, as it would before the next upload
+        await asyncio.gather(*self.cog.tasks)
+        return frag
+
+    async def test_cached_by_input(self):
+        await self.process("a.png")
+        frag = await self.process("b.png")
+        assert self.runs == [(b"same", None)]
+        assert frag.pp_data is not None
+        assert frag.pp_data.read() == b"emas"
+        assert frag.pp_filename == "reversed_a.png"
+
+    async def test_distinct_inputs(self):
+        await self.process("a.png")
+        await self.process("c.png")
+        await self.process("a.png", pp_extra=1)
+        assert self.runs == [(b"same", None), (b"other", None), (b"same", 1)]
+
+
+class FitToTest(unittest.IsolatedAsyncioTestCase):
+    async def processed(self, pp_size: int) -> FileFragment:
+        queue: Any = SimpleNamespace(cog=FakeCog({}, {}), cache=None)
+        frag = FileFragment(queue, "a.mp4", postprocess=ffmpeg_gif_pp)
+        frag.file_data = Spool(b"original")
+        frag.pp_data = Spool(b"\0" * pp_size)
+        frag.pp_filename = "a.gif"
+        frag.dl_task = asyncio.create_task(asyncio.sleep(0))
+        await frag.dl_task
+        frag.fit_to(100)
+        return frag
+
+    async def test_redo_for_smaller(self):
+        frag = await self.processed(80)
+        frag.fit_to(50)
+        assert frag.target_size == 50
+        assert frag.dl_task is None
+        assert frag.pp_data is None
+        assert frag.file_data.read() == b"original"
+
+    async def test_keep_fitting(self):
+        frag = await self.processed(40)
+        frag.fit_to(50)
+        assert frag.target_size == 50
+        assert frag.dl_task is not None
+        assert frag.pp_data is not None
+
+    async def test_keep_for_larger(self):
+        frag = await self.processed(80)
+        frag.fit_to(200)
+        assert frag.target_size == 100
+        assert frag.pp_data is not None
+
+    async def test_redo_downscaled_for_larger(self):
+        frag = await self.processed(80)
+        frag.pp_downscaled = True
+        frag.fit_to(200)
+        assert frag.target_size == 200
+        assert frag.dl_task is None
+        assert frag.pp_data is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import unittest
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost import hls
+from beattie.cogs.crosspost.exceptions import FileTooLargeError
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+BASE = "https://example.com/video/master.m3u8"
+
+MASTER = """\
+#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="en",URI="audio/en.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="ja",DEFAULT=YES,URI="audio/ja.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,CODECS="avc1.4d401f,mp4a.40.2",AUDIO="aud"
+low.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=4000000,CODECS="avc1.640028,mp4a.40.2",AUDIO="aud"
+high.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=6000000,CODECS="hvc1.1.6.L120,mp4a.40.2"
+https://cdn.example.com/hevc.m3u8
+"""
+
+MEDIA = """\
+#EXTM3U
+#EXT-X-TARGETDURATION:4
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:4.0,
+seg0.m4s
+#EXTINF:4.0,
+seg1.m4s
+#EXTINF:2.5,
+seg2.m4s
+#EXT-X-ENDLIST
+"""
+
+AUDIO = """\
+#EXTM3U
+#EXT-X-TARGETDURATION:6
+#EXTINF:6.0,
+aud0.aac
+#EXTINF:4.5,
+aud1.aac
+#EXT-X-ENDLIST
+"""
+
+
+class FakeResponse:
+    def __init__(self, url: str, content: bytes):
+        self.url = url
+        self.content = content
+        self.text = content.decode()
+
+
+class FakeCog:
+    """Serves fixed responses by URL, recording the URLs requested"""
+
+    def __init__(self, responses: dict[str, bytes]):
+        self.responses = responses
+        self.requested: list[str] = []
+
+    @asynccontextmanager
+    async def get(self, url: str, **_: Any) -> AsyncIterator[FakeResponse]:
+        self.requested.append(url)
+        yield FakeResponse(url, self.responses[url])
+
+
+class ParseTest(unittest.TestCase):
+    def test_attributes(self):
+        assert hls.parse_attributes(
+            '#EXT-X-STREAM-INF:BANDWIDTH=1,CODECS="avc1.4d401f,mp4a.40.2",AUDIO="a"',
+        ) == {"BANDWIDTH": "1", "CODECS": "avc1.4d401f,mp4a.40.2", "AUDIO": "a"}
+
+    def test_is_master(self):
+        assert hls.is_master(MASTER)
+        assert not hls.is_master(MEDIA)
+
+    def test_master(self):
+        low, high, hevc = hls.parse_master(MASTER, BASE)
+        assert low == hls.Variant(
+            "https://example.com/video/low.m3u8",
+            800000,
+            ("avc1.4d401f", "mp4a.40.2"),
+            "https://example.com/video/audio/ja.m3u8",
+        )
+        assert high.url == "https://example.com/video/high.m3u8"
+        assert high.bandwidth == 4000000
+        assert hevc.url == "https://cdn.example.com/hevc.m3u8"
+        assert hevc.audio is None
+
+    def test_remuxable(self):
+        low, _, hevc = hls.parse_master(MASTER, BASE)
+        assert low.remuxable is True
+        assert hevc.remuxable is False
+        assert hls.Variant(BASE, 0, (), None).remuxable is None
+
+    def test_first_audio_without_default(self):
+        master = MASTER.replace(",DEFAULT=YES", "")
+        low, _, _ = hls.parse_master(master, BASE)
+        assert low.audio == "https://example.com/video/audio/en.m3u8"
+
+    def test_media(self):
+        playlist = hls.parse_media(MEDIA, "https://example.com/video/high.m3u8")
+        assert playlist == hls.MediaPlaylist(
+            "https://example.com/video/init.mp4",
+            [f"https://example.com/video/seg{i}.m4s" for i in range(3)],
+            10.5,
+        )
+
+    def test_media_without_init(self):
+        media = MEDIA.replace('#EXT-X-MAP:URI="init.mp4"\n', "")
+        playlist = hls.parse_media(media, BASE)
+        assert playlist is not None
+        assert playlist.init is None
+
+    def test_unencrypted(self):
+        media = MEDIA.replace("#EXTINF", "#EXT-X-KEY:METHOD=NONE\n#EXTINF", 1)
+        assert hls.parse_media(media, BASE) is not None
+
+    def test_encrypted(self):
+        media = MEDIA.replace(
+            "#EXTINF",
+            '#EXT-X-KEY:METHOD=AES-128,URI="key.bin"\n#EXTINF',
+            1,
+        )
+        assert hls.parse_media(media, BASE) is None
+
+    def test_byterange(self):
+        media = MEDIA.replace("seg1.m4s", "#EXT-X-BYTERANGE:1000@0\nseg1.m4s")
+        assert hls.parse_media(media, BASE) is None
+        media = MEDIA.replace('URI="init.mp4"', 'URI="init.mp4",BYTERANGE="800@0"')
+        assert hls.parse_media(media, BASE) is None
+
+    def test_init_changes(self):
+        media = MEDIA.replace("seg2.m4s", '#EXT-X-MAP:URI="init2.mp4"\nseg2.m4s')
+        assert hls.parse_media(media, BASE) is None
+
+    def test_live(self):
+        assert hls.parse_media(MEDIA.replace("#EXT-X-ENDLIST\n", ""), BASE) is None
+
+    def test_empty(self):
+        assert hls.parse_media("#EXTM3U\n#EXT-X-ENDLIST\n", BASE) is None
+
+
+def media_responses() -> dict[str, bytes]:
+    return {
+        f"https://example.com/video/{name}.m3u8": MEDIA.encode()
+        for name in ("low", "high")
+    } | {
+        "https://cdn.example.com/hevc.m3u8": MEDIA.encode(),
+        "https://example.com/video/audio/ja.m3u8": AUDIO.encode(),
+    }
+
+
+class ChooseVariantTest(unittest.IsolatedAsyncioTestCase):
+    async def choose(self, budget: float | None) -> tuple[str, bool] | None:
+        cog: Any = FakeCog(media_responses())
+        if (
+            chosen := await hls.choose_variant(cog, MASTER, BASE, None, budget)
+        ) is None:
+            return None
+        variant, playlist, downscaled = chosen
+        assert playlist.duration == 10.5
+        return variant.url, downscaled
+
+    async def test_unlimited(self):
+        # the HEVC variant has the highest bandwidth, but can't be remuxed
+        assert await self.choose(None) == ("https://example.com/video/high.m3u8", False)
+
+    async def test_fits(self):
+        budget = 4000000 * 10.5 / 8
+        assert await self.choose(budget) == (
+            "https://example.com/video/high.m3u8",
+            False,
+        )
+
+    async def test_downscaled(self):
+        budget = 4000000 * 10.5 / 8 - 1
+        assert await self.choose(budget) == ("https://example.com/video/low.m3u8", True)
+
+    async def test_nothing_fits(self):
+        assert await self.choose(1) == ("https://example.com/video/low.m3u8", True)
+
+    async def test_only_unremuxable(self):
+        master = "\n".join(MASTER.splitlines()[-2:])
+        cog: Any = FakeCog(media_responses())
+        chosen = await hls.choose_variant(cog, master, BASE, None, None)
+        assert chosen is not None
+        assert chosen[0].remuxable is False
+
+    async def test_fetches(self):
+        cog: Any = FakeCog(media_responses())
+        await hls.choose_variant(cog, MASTER, BASE, None, None)
+        assert cog.requested == ["https://example.com/video/high.m3u8"]
+        cog.requested.clear()
+        await hls.choose_variant(cog, MASTER, BASE, None, 1)
+        assert cog.requested == [
+            "https://example.com/video/high.m3u8",
+            "https://example.com/video/low.m3u8",
+        ]
+
+    async def test_no_variants(self):
+        cog: Any = FakeCog({})
+        assert await hls.choose_variant(cog, "#EXTM3U\n", BASE, None, None) is None
+
+
+def segment_responses() -> dict[str, bytes]:
+    return (
+        {"https://example.com/video/init.mp4": b"init"}
+        | {
+            f"https://example.com/video/seg{i}.m4s": f"seg{i}".encode()
+            for i in range(3)
+        }
+        | {
+            f"https://example.com/video/audio/aud{i}.aac": f"aud{i}".encode()
+            for i in range(2)
+        }
+    )
+
+
+class DownloadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_download(self):
+        cog: Any = FakeCog(segment_responses())
+        playlist = hls.parse_media(MEDIA, BASE)
+        assert playlist is not None
+        spool = await hls.download(cog, playlist, None, None)
+        assert spool.read() == b"initseg0seg1seg2"
+
+    async def test_too_large(self):
+        cog: Any = FakeCog(segment_responses())
+        playlist = hls.parse_media(MEDIA, BASE)
+        assert playlist is not None
+        try:
+            await hls.download(cog, playlist, None, 10)
+        except FileTooLargeError:
+            pass
+        else:
+            msg = "download exceeded max_size"
+            raise AssertionError(msg)
+
+    async def test_stream(self):
+        cog: Any = FakeCog(media_responses() | segment_responses())
+        stream = await hls.fetch_stream(
+            cog,
+            MASTER,
+            BASE,
+            None,
+            budget=None,
+            max_size=None,
+        )
+        assert stream is not None
+        assert stream.video.read() == b"initseg0seg1seg2"
+        assert stream.audio is not None
+        assert stream.audio.read() == b"aud0aud1"
+        assert stream.duration == 10.5
+        assert stream.remuxable is True
+        assert not stream.downscaled
+
+
+if __name__ == "__main__":
+    unittest.main()
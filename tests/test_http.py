@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import unittest
+from typing import TYPE_CHECKING
+
+import httpx
+
+from beattie.utils.http import HostLimitedTransport
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class Body(httpx.AsyncByteStream):
+    """Streamed body, like the ones the real transport returns"""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield b"body"
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/fail":
+        msg = "connection failed"
+        raise httpx.ConnectError(msg, request=request)
+    return httpx.Response(200, stream=Body())
+
+
+def make_client(per_host: int) -> httpx.AsyncClient:
+    transport = HostLimitedTransport(httpx.MockTransport(handler), per_host)
+    return httpx.AsyncClient(transport=transport)
+
+
+class HostLimitedTransportTest(unittest.IsolatedAsyncioTestCase):
+    async def test_slot_held_until_close(self):
+        async with make_client(1) as client:
+            first = await client.send(
+                client.build_request("GET", "https://a.test/"),
+                stream=True,
+            )
+            second = asyncio.create_task(client.get("https://a.test/"))
+            other = await asyncio.wait_for(client.get("https://b.test/"), 1)
+            assert other.content == b"body"
+            await asyncio.sleep(0.01)
+            assert not second.done()
+            await first.aclose()
+            resp = await asyncio.wait_for(second, 1)
+            assert resp.content == b"body"
+
+    async def test_released_on_read(self):
+        async with make_client(1) as client:
+            for _ in range(3):
+                resp = await asyncio.wait_for(client.get("https://a.test/"), 1)
+                assert resp.content == b"body"
+
+    async def test_released_on_error(self):
+        async with make_client(1) as client:
+            failed = False
+            try:
+                await client.get("https://a.test/fail")
+            except httpx.ConnectError:
+                failed = True
+            assert failed
+            resp = await asyncio.wait_for(client.get("https://a.test/"), 1)
+            assert resp.status_code == 200
+
+    async def test_idle_hosts_dropped(self):
+        async with make_client(1) as client:
+            transport = client._transport
+            assert isinstance(transport, HostLimitedTransport)
+            resp = await client.send(
+                client.build_request("GET", "https://a.test/"),
+                stream=True,
+            )
+            await client.get("https://b.test/")
+            failed = False
+            try:
+                await client.get("https://c.test/fail")
+            except httpx.ConnectError:
+                failed = True
+            assert failed
+            assert set(transport._hosts) == {"a.test"}
+            await resp.aclose()
+            assert transport._hosts == {}
+
+    async def test_released_on_collect(self):
+        async with make_client(1) as client:
+            resp = await client.send(
+                client.build_request("GET", "https://a.test/"),
+                stream=True,
+            )
+            del resp
+            gc.collect()
+            resp = await asyncio.wait_for(client.get("https://a.test/"), 1)
+            assert resp.content == b"body"
+
+
+if __name__ == "__main__":
+    unittest.main()
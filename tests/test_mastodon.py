@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+
+from beattie.cogs.crosspost.sites import mastodon
+from beattie.cogs.crosspost.sites.mastodon import NEGATIVE_TTL, POSITIVE_TTL, Mastodon
+from beattie.utils.exceptions import ResponseError
+
+
+class FakeState:
+    def __init__(self):
+        self.data: dict[tuple[str, str], Any] = {}
+
+    def get(self, site: str, key: str, default: Any = None) -> Any:
+        return self.data.get((site, key), default)
+
+    def set(self, site: str, key: str, value: Any):
+        self.data[site, key] = value
+
+
+class FakeMastodon(Mastodon):
+    """Mastodon with nodeinfo sniffing replaced by a canned answer"""
+
+    result: str | Exception
+    sniffs: int
+
+    async def sniff(self, domain: str) -> str:  # noqa: ARG002
+        self.sniffs += 1
+        await asyncio.sleep(0)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class DetectionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with patch.object(mastodon, "CONFIG", "/nonexistent/mastodon.toml"):
+            self.site = FakeMastodon(SimpleNamespace(state=FakeState()))  # type: ignore
+        self.site.result = "mastodon"
+        self.site.sniffs = 0
+
+    def detect(self, software: str | None, age: float):
+        self.site.cog.state.set(
+            "mastodon",
+            "example.com",
+            {"software": software, "checked": time.time() - age},
+        )
+
+    def checked(self) -> float:
+        return self.site.detection("example.com")["checked"]  # type: ignore
+
+    async def test_single_flight(self):
+        results = await asyncio.gather(
+            *(self.site.software("example.com") for _ in range(5)),
+        )
+        assert results == ["mastodon"] * 5
+        assert self.site.sniffs == 1
+        assert self.site.probes == {}
+        assert self.site.detection("example.com")["software"] == "mastodon"  # type: ignore
+
+    async def test_fresh(self):
+        self.detect(None, NEGATIVE_TTL - 60)
+        assert await self.site.software("example.com") is None
+        self.detect("misskey", POSITIVE_TTL - 60)
+        assert await self.site.software("example.com") == "misskey"
+        assert self.site.sniffs == 0
+
+    async def test_negative_expired(self):
+        self.detect(None, NEGATIVE_TTL + 60)
+        assert await self.site.software("example.com") == "mastodon"
+        assert self.site.sniffs == 1
+
+    async def test_positive_refreshed_in_background(self):
+        self.detect("misskey", POSITIVE_TTL + 60)
+        before = self.checked()
+        assert await self.site.software("example.com") == "misskey"
+        await asyncio.gather(*self.site.probes.values())
+        assert self.site.sniffs == 1
+        assert self.checked() > before
+        assert await self.site.software("example.com") == "mastodon"
+
+    async def test_failed_refresh_logged(self):
+        self.detect("misskey", POSITIVE_TTL + 60)
+        self.site.result = RuntimeError("unexpected")
+        with self.assertLogs(self.site.logger, "ERROR") as logs:
+            assert await self.site.software("example.com") == "misskey"
+            await asyncio.wait(self.site.probes.values())
+            await asyncio.sleep(0)
+        [record] = logs.records
+        assert record.exc_info is not None
+        assert isinstance(record.exc_info[1], RuntimeError)
+        assert self.site.probes == {}
+
+    async def test_transient_failure_keeps_positive(self):
+        self.detect("misskey", POSITIVE_TTL + 60)
+        before = self.checked()
+        for error in (httpx.ConnectError("down"), ResponseError(503)):
+            self.site.result = error
+            assert await self.site.determine("example.com") == "misskey"
+        assert self.checked() == before
+
+    async def test_permanent_failure(self):
+        self.detect("misskey", POSITIVE_TTL + 60)
+        self.site.result = ResponseError(404)
+        assert await self.site.determine("example.com") is None
+        assert self.site.detection("example.com")["software"] is None  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
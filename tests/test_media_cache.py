@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from beattie.cogs.crosspost import media_cache
+from beattie.cogs.crosspost.media_cache import MediaCache, is_playlist, key_digest
+from beattie.cogs.crosspost.spool import Spool
+
+
+class MediaCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.cache = await self.make_cache()
+
+    async def make_cache(self) -> MediaCache:
+        cache = MediaCache(self.root, ttl=60)
+        await cache.load()
+        return cache
+
+    async def test_get(self):
+        await self.cache.put("a.png", Spool(b"data"), "a.png")
+        assert "a.png" in self.cache
+        entry = await self.cache.get("a.png")
+        assert entry is not None
+        assert entry.data.read() == b"data"
+        assert entry.filename == "a.png"
+
+    async def test_expired(self):
+        await self.cache.put("a.png", Spool(b"data"), None)
+        await self.cache.put("pp:a", Spool(b"data"), None, immutable=True)
+        now = media_cache.time.time()
+        with patch.object(media_cache.time, "time", return_value=now + 120):
+            assert "a.png" not in self.cache
+            assert await self.cache.get("a.png") is None
+            assert await self.cache.get("pp:a") is not None
+            reloaded = await self.make_cache()
+            assert await reloaded.get("a.png") is None
+            assert await reloaded.get("pp:a") is not None
+
+    async def test_reloaded(self):
+        await self.cache.put("a.png", Spool(b"data"), "a.png")
+        reloaded = await self.make_cache()
+        entry = await reloaded.get("a.png")
+        assert entry is not None
+        assert entry.filename == "a.png"
+
+    async def test_old_keys_expired(self):
+        await self.cache.put("a.png", Spool(b"data"), "a.png")
+        kdigest = key_digest("a.png")
+        key_path = self.root / "keys" / kdigest[:2] / kdigest
+        digest = key_path.read_text().partition("\n")[0]
+        key_path.write_text(f"{digest}\na.png")
+        reloaded = await self.make_cache()
+        assert "a.png" not in reloaded
+        assert not key_path.exists()
+
+
+class PlaylistTest(unittest.TestCase):
+    def test_is_playlist(self):
+        assert is_playlist("https://a.test/index.m3u8?token=1", None)
+        assert is_playlist("https://a.test/video", "application/vnd.apple.mpegURL")
+        assert is_playlist("https://a.test/video", "audio/mpegurl; charset=utf-8")
+        assert not is_playlist("https://a.test/video.mp4", "video/mp4")
+        assert not is_playlist("https://a.test/a.png", None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from beattie.cogs.crosspost import postprocess, spool
+from beattie.cogs.crosspost.postprocess import (
+    ANIMATION,
+    AUDIO_BITRATE,
+    IMAGE,
+    MIN_VIDEO_BITRATE,
+    VIDEO,
+    MediaInfo,
+    PostprocessScheduler,
+    encode_video,
+    feed_frames,
+    feed_spool,
+    frame_pts,
+    gif_ladder,
+    gif_settings,
+    moov_first,
+    video_settings,
+)
+from beattie.cogs.crosspost.spool import Spool
+
+MB = 1024 * 1024
+
+
+def box(kind: bytes, body: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(body), kind) + body
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.scheduler = PostprocessScheduler(workers=1)
+        self.order: list[str] = []
+
+    async def job(self, name: str, priority: int, size: int = 0):
+        async with self.scheduler.slot(priority, size):
+            self.order.append(name)
+            await asyncio.sleep(0)
+
+    async def test_priority_order(self):
+        scheduler = self.scheduler
+        async with scheduler.slot(IMAGE):
+            tasks = [
+                asyncio.create_task(self.job(name, priority, size))
+                for name, priority, size in [
+                    ("video", VIDEO, 10),
+                    ("large image", IMAGE, 100),
+                    ("animation", ANIMATION, 0),
+                    ("small image", IMAGE, 5),
+                ]
+            ]
+            await asyncio.sleep(0)
+            assert scheduler.queued == 4
+            assert scheduler.running == 1
+        await asyncio.gather(*tasks)
+        assert self.order == ["small image", "large image", "animation", "video"]
+        assert scheduler.running == 0
+        assert scheduler.completed == 5
+        assert scheduler.max_queued == 4
+
+    async def test_limit(self):
+        scheduler = PostprocessScheduler(workers=2)
+        active = peak = 0
+
+        async def job():
+            nonlocal active, peak
+            async with scheduler.slot(IMAGE):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(job() for _ in range(5)))
+        assert peak == 2
+        assert scheduler.running == 0
+
+    async def test_cancel_queued(self):
+        scheduler = self.scheduler
+        async with scheduler.slot(IMAGE):
+            cancelled = asyncio.create_task(self.job("cancelled", IMAGE))
+            waiting = asyncio.create_task(self.job("waiting", VIDEO))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            assert scheduler.queued == 1
+        await waiting
+        assert self.order == ["waiting"]
+        assert scheduler.running == 0
+
+    async def test_timeout(self):
+        with patch.dict(postprocess.PP_TIMEOUTS, {IMAGE: 0.05}):
+            timed_out = False
+            try:
+                await self.scheduler.pipe("sleep", "5", priority=IMAGE)
+            except TimeoutError:
+                timed_out = True
+        assert timed_out
+        assert self.scheduler.timeouts == 1
+        assert self.scheduler.running == 0
+
+
+class FakeScheduler:
+    """Records the processes it's asked to run, writing to their output"""
+
+    def __init__(self):
+        self.calls: list[tuple[tuple[Any, ...], Path | None]] = []
+
+    async def pipe(
+        self,
+        *args: Any,
+        output: Path = None,
+        **_kwargs: Any,
+    ) -> tuple[Spool | None, bytes]:
+        self.calls.append((args, output))
+        return Spool(b"video"), b""
+
+
+class EncodeVideoTest(unittest.IsolatedAsyncioTestCase):
+    async def test_faststart(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch.object(spool, "SPOOL_DIR", Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        scheduler = FakeScheduler()
+        frag: Any = SimpleNamespace(
+            cog=SimpleNamespace(pp_scheduler=scheduler),
+            target_size=None,
+        )
+        await encode_video(frag, ["-i", "in.ts"], None, None, "a.mp4")
+        [(args, output)] = scheduler.calls
+        assert output is not None
+        assert args[-1] == output
+        assert "+faststart" in args
+        assert "pipe:1" not in args
+        assert frag.pp_filename == "a.mp4"
+        assert frag.pp_data.read() == b"video"
+
+
+class FitTest(unittest.TestCase):
+    def test_gif_ladder(self):
+        ladder = gif_ladder(MediaInfo(640, 480, 30, 2, frozenset()))
+        assert ladder[0] == (640, 30, 640 * 480 * 30 * 2)
+        assert ladder[1][:2] == (640, 15)
+        assert ladder[-1][:2] == (160, 10)
+        assert all(
+            a[2] >= b[2] for a, b in zip(ladder[::3], ladder[3::3], strict=False)
+        )
+
+    def test_gif_ladder_slow(self):
+        ladder = gif_ladder(MediaInfo(640, 480, 12, 2, frozenset()))
+        assert [fps for width, fps, _ in ladder if width == 640] == [12, 10]
+
+    def test_gif_settings(self):
+        info = MediaInfo(640, 480, 30, 2, frozenset())
+        assert gif_settings(info, 100 * MB, 0.25)[:2] == (640, 30)
+        width, fps, pixels = gif_settings(info, 2 * MB, 0.25)
+        assert (width, fps) != (640, 30)
+        assert 0.25 * pixels <= 2 * MB
+        assert gif_settings(info, 1, 0.25) == gif_ladder(info)[-1]
+
+    def test_video_settings(self):
+        info = MediaInfo(1920, 1080, 30, 60, frozenset())
+        bitrate, height = video_settings(info, 100 * MB)
+        assert height == 1080
+        assert bitrate == int(100 * MB * 8 * 0.9 / 60) - AUDIO_BITRATE
+        _, height = video_settings(info, 10 * MB)
+        assert height < 1080
+        assert video_settings(info, 1) == (MIN_VIDEO_BITRATE, 360)
+
+
+class FramePtsTest(unittest.TestCase):
+    def test_frames(self):
+        assert frame_pts([30, 50, 100]) == "setpts='gte(N,1)*30+gte(N,2)*50'"
+
+    def test_single_frame(self):
+        assert frame_pts([60]) == "setpts='0'"
+
+
+class MoovFirstTest(unittest.TestCase):
+    def test_moov_first(self):
+        data = box(b"ftyp", b"isom") + box(b"moov") + box(b"mdat", b"data")
+        assert moov_first(data)
+
+    def test_mdat_first(self):
+        data = box(b"ftyp", b"isom") + box(b"mdat", b"data") + box(b"moov")
+        assert not moov_first(data)
+
+    def test_large_box(self):
+        large = struct.pack(">I4sQ", 1, b"free", 20) + b"\0" * 4
+        assert moov_first(box(b"ftyp") + large + box(b"moov"))
+
+    def test_truncated(self):
+        assert not moov_first(box(b"ftyp", b"isom")[:6])
+        assert not moov_first(struct.pack(">I4s", 0, b"ftyp") + box(b"moov"))
+
+
+class PipeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.scheduler = PostprocessScheduler(workers=2)
+
+    async def test_pipe(self):
+        spool, err = await self.scheduler.pipe(
+            "cat",
+            priority=IMAGE,
+            feed=feed_spool(Spool(b"hello")),
+        )
+        assert spool is not None
+        assert spool.read() == b"hello"
+        assert err == b""
+        assert self.scheduler.running == 0
+        assert self.scheduler.completed == 1
+
+    async def test_on_disk(self):
+        data = bytes(range(256)) * 1024
+        src = Spool(data)
+        src.materialize()
+        spool, _ = await self.scheduler.pipe(
+            "cat",
+            priority=IMAGE,
+            feed=feed_spool(src),
+        )
+        assert spool is not None
+        assert spool.read() == data
+
+    async def test_failure(self):
+        spool, err = await self.scheduler.pipe(
+            "sh",
+            "-c",
+            "echo out; echo err >&2; exit 1",
+            priority=IMAGE,
+            stderr=True,
+        )
+        assert spool is None
+        assert err == b"err\n"
+
+    async def test_no_output(self):
+        spool, _ = await self.scheduler.pipe("true", priority=IMAGE)
+        assert spool is None
+
+    async def test_stops_reading(self):
+        spool, _ = await self.scheduler.pipe(
+            "head",
+            "-c",
+            "4",
+            priority=IMAGE,
+            feed=feed_spool(Spool(b"\0" * 1024 * 1024)),
+        )
+        assert spool is not None
+        assert spool.read() == b"\0" * 4
+
+    async def test_output(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "out.mp4"
+        spool, _ = await self.scheduler.pipe(
+            "sh",
+            "-c",
+            'printf hello > "$0"',
+            path,
+            priority=VIDEO,
+            output=path,
+        )
+        assert spool is not None
+        assert spool.read() == b"hello"
+        assert not path.exists()
+
+    async def test_output_failure(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "out.mp4"
+        spool, _ = await self.scheduler.pipe(
+            "sh",
+            "-c",
+            'printf partial > "$0"; exit 1',
+            path,
+            priority=VIDEO,
+            output=path,
+        )
+        assert spool is None
+        assert not path.exists()
+
+    async def test_frames(self):
+        fp = BytesIO()
+        with ZipFile(fp, "w") as zfp:
+            for i in range(3):
+                zfp.writestr(f"{i:06}.jpg", f"frame{i}")
+        names = ["000000.jpg", "000001.jpg", "000002.jpg"]
+        spool, _ = await self.scheduler.pipe(
+            "cat",
+            priority=IMAGE,
+            feed=feed_frames(Spool(fp.getvalue()), names),
+        )
+        assert spool is not None
+        assert spool.read() == b"frame0frame1frame2"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import Any, ClassVar
+
+from beattie.cogs.crosspost.exceptions import DownloadError
+from beattie.cogs.crosspost.queue import FragmentQueue
+from beattie.cogs.crosspost.spool import Spool
+
+
+class FakeContext:
+    guild = None
+
+    def __init__(self):
+        self.sent: list[dict[str, Any]] = []
+
+    async def send(self, content: str | None = None, **kwargs: Any):
+        # the file batch list is cleared after sending, so keep a copy
+        if (files := kwargs.get("files")) is not None:
+            kwargs["files"] = list(files)
+        self.sent.append({"content": content, **kwargs})
+
+
+class FileFragment:
+    """Stands in for a downloaded FileFragment; matched by class name"""
+
+    log: ClassVar[list[tuple[str, str]]] = []
+
+    def __init__(self, name: str, delay: float = 0):
+        self.delay = delay
+        self.filename = name
+        self.file_data = Spool(name.encode())
+        self.pp_data = None
+        self.oversize = None
+        self.can_link = True
+        self.urls = [name]
+        self.dl_task: asyncio.Task[None] | None = None
+
+    def save(self) -> asyncio.Task[None]:
+        if self.dl_task is None:
+            self.dl_task = asyncio.create_task(self._save())
+        return self.dl_task
+
+    async def _save(self):
+        self.log.append(("start", self.filename))
+        await asyncio.sleep(self.delay)
+        self.log.append(("done", self.filename))
+
+    def touch(self):
+        pass
+
+    def fit_to(self, limit: int):
+        self.target_size = limit
+
+
+class FallbackFragment:
+    """Stands in for FallbackFragment, tracking how many resolve at once"""
+
+    active = 0
+    peak = 0
+
+    def __init__(self, name: str, delay: float, *, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.started = False
+        self.cancelled = False
+
+    async def to_file(self, _ctx: FakeContext) -> FileFragment:
+        cls = type(self)
+        self.started = True
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            cls.active -= 1
+        if self.fail:
+            msg = "resolve failed"
+            raise RuntimeError(msg)
+        return FileFragment(self.name)
+
+
+def make_queue(
+    resolve_limit: int = 4,
+    prefetch_depth: int | None = None,
+    prefetch_parallelism: int | None = None,
+) -> FragmentQueue:
+    queue = FragmentQueue.__new__(FragmentQueue)
+    queue.site = SimpleNamespace(
+        resolve_limit=resolve_limit,
+        prefetch_depth=prefetch_depth,
+        prefetch_parallelism=prefetch_parallelism,
+    )
+    return queue
+
+
+SETTINGS: Any = SimpleNamespace(language_or_default=lambda: "en")
+
+
+class PresentTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        FallbackFragment.active = FallbackFragment.peak = 0
+        FileFragment.log = []
+
+    async def test_resolves_concurrently_in_order(self):
+        queue = make_queue(resolve_limit=2)
+        ctx = FakeContext()
+        fallbacks = [
+            FallbackFragment(str(i), delay) for i, delay in enumerate((0.03, 0.01, 0))
+        ]
+        items: Any = [(frag, False) for frag in fallbacks]
+        embedded = await queue.present(
+            ctx,  # type: ignore
+            items=items,
+            settings=SETTINGS,
+            force=False,
+        )
+        assert embedded
+        assert FallbackFragment.peak == 2
+        [message] = ctx.sent
+        assert [file.filename for file in message["files"]] == ["0", "1", "2"]
+
+    async def test_failure_cancels_rest(self):
+        queue = make_queue(resolve_limit=1)
+        ctx = FakeContext()
+        bad = FallbackFragment("bad", 0, fail=True)
+        rest = [FallbackFragment(str(i), 1) for i in range(2)]
+        items: Any = [(frag, False) for frag in (bad, *rest)]
+        failed = False
+        try:
+            await queue.present(
+                ctx,  # type: ignore
+                items=items,
+                settings=SETTINGS,
+                force=False,
+            )
+        except DownloadError:
+            failed = True
+        assert failed
+        await asyncio.sleep(0)
+        assert rest[0].cancelled
+        assert not rest[1].started
+        assert FallbackFragment.active == 0
+
+    async def test_prefetch_window(self):
+        queue = make_queue(prefetch_depth=1)
+        ctx = FakeContext()
+        frags = [FileFragment(str(i), 0.01) for i in range(5)]
+        items: Any = [(frag, False) for frag in frags]
+        await queue.present(
+            ctx,  # type: ignore
+            items=items,
+            settings=SETTINGS,
+            force=False,
+        )
+        log = FileFragment.log
+        assert len(log) == 10
+        # never more than one file ahead of the one being sent
+        for i in range(2, 5):
+            assert log.index(("done", str(i - 2))) < log.index(("start", str(i)))
+
+
+if __name__ == "__main__":
+    unittest.main()
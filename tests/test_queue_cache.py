@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost.queue_cache import QueueCache
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class FakeQueue:
+    """Stands in for FragmentQueue, reporting size changes the same way"""
+
+    def __init__(self, size: int, *, counted: bool = True):
+        self.size = size
+        self.counted = counted
+        self.cache: Any = None
+        self.fragments: list[FakeFragment] = []
+
+    def resize(self, delta: int):
+        self.size += delta
+        if (cache := self.cache) is not None:
+            cache.size += delta
+
+    def file_fragments(self) -> Iterator[FakeFragment]:
+        return iter(self.fragments)
+
+
+class FakeFragment:
+    """Stands in for FileFragment, reporting downloaded bytes the same way"""
+
+    def __init__(self, queue: FakeQueue, nbytes: int = 0):
+        self.queue = queue
+        self.nbytes = nbytes
+        self.dl_task: asyncio.Task[None] | None = None
+        queue.fragments.append(self)
+
+    def load(self, nbytes: int):
+        delta = nbytes - self.nbytes
+        self.nbytes = nbytes
+        if (cache := self.queue.cache) is not None:
+            cache.resize_file(self, delta)
+
+    def release(self):
+        self.dl_task = None
+        self.load(0)
+
+
+class QueueCacheTest(unittest.TestCase):
+    def test_insert(self):
+        cache = QueueCache(max_size=100, max_file_size=100)
+        queue = FakeQueue(10)
+        FakeFragment(queue, 5)
+        FakeFragment(queue, 0)
+        cache[("a",)] = queue
+        assert queue.cache is cache
+        assert len(cache) == 1
+        assert ("a",) in cache
+        assert cache.size == 10
+        assert cache.file_size == 5
+        assert cache.posts == 1
+
+    def test_uncounted(self):
+        cache = QueueCache()
+        cache[("a",)] = FakeQueue(10, counted=False)
+        assert cache.posts == 0
+
+    def test_replace(self):
+        cache = QueueCache()
+        old = FakeQueue(10)
+        FakeFragment(old, 5)
+        cache[("a",)] = old
+        cache[("a",)] = FakeQueue(20)
+        assert old.cache is None
+        assert len(cache) == 1
+        assert cache.size == 20
+        assert cache.file_size == 0
+        assert cache.posts == 1
+
+    def test_pop(self):
+        cache = QueueCache()
+        queue = FakeQueue(10)
+        FakeFragment(queue, 5)
+        cache[("a",)] = queue
+        assert cache.pop(("a",)) is queue
+        assert cache.pop(("a",)) is None
+        assert queue.cache is None
+        assert cache.size == 0
+        assert cache.file_size == 0
+        assert cache.posts == 0
+
+    def test_resize(self):
+        cache = QueueCache()
+        queue = FakeQueue(10)
+        frag = FakeFragment(queue)
+        cache[("a",)] = queue
+        queue.resize(15)
+        frag.load(40)
+        assert cache.size == 25
+        assert cache.file_size == 40
+        frag.load(30)
+        assert cache.file_size == 30
+        frag.release()
+        assert cache.file_size == 0
+        cache.pop(("a",))
+        queue.resize(5)
+        assert cache.size == 0
+
+    def test_evict_queues(self):
+        cache = QueueCache(max_size=25, max_file_size=100)
+        queues = [FakeQueue(10) for _ in range(3)]
+        for i, queue in enumerate(queues):
+            cache[(str(i),)] = queue
+        cache.get(("0",))
+        assert cache.evict() == 1
+        assert list(cache) == [("2",), ("0",)]
+        assert cache.oldest() is queues[2]
+        assert queues[1].cache is None
+        assert cache.size == 20
+        assert cache.posts == 2
+        assert cache.evict() == 0
+
+    def test_evict_files_first(self):
+        cache = QueueCache(max_size=100, max_file_size=25)
+        queue = FakeQueue(10)
+        frags = [FakeFragment(queue) for _ in range(3)]
+        cache[("a",)] = queue
+        for frag in frags:
+            frag.load(10)
+        cache.touch(frags[0])
+        assert cache.evict() == 0
+        assert len(cache) == 1
+        assert cache.file_size == 20
+        assert [frag.nbytes for frag in frags] == [10, 0, 10]
+
+
+class QueueCacheDownloadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_evict_skips_downloading(self):
+        cache = QueueCache(max_size=100, max_file_size=15)
+        queue = FakeQueue(10)
+        frags = [FakeFragment(queue) for _ in range(2)]
+        cache[("a",)] = queue
+        for frag in frags:
+            frag.load(10)
+        frags[0].dl_task = task = asyncio.create_task(asyncio.sleep(1))
+        try:
+            cache.evict()
+        finally:
+            task.cancel()
+        assert [frag.nbytes for frag in frags] == [10, 0]
+        assert cache.file_size == 10
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import re
+import unittest
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost.router import SiteRouter, link_host
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+
+class FakeSite:
+    def __init__(
+        self,
+        name: str,
+        pattern: str,
+        hosts: Collection[str] = (),
+        *,
+        fallback: bool = False,
+    ):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.hosts = hosts
+        self.fallback = fallback
+
+    def __repr__(self) -> str:
+        return f"FakeSite({self.name!r})"
+
+
+class SiteRouterTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.twitter = FakeSite(
+            "twitter",
+            r"https?://(?:www\.)?(?:twitter|x)\.com/\w+/status/\d+",
+            ("twitter.com", "x.com"),
+        )
+        self.tumblr = FakeSite(
+            "tumblr",
+            r"https?://(?:[\w-]+\.)?tumblr\.com/[\w-]+/\d+",
+            ("tumblr.com",),
+        )
+        self.tumblr_media = FakeSite(
+            "tumblr_media",
+            r"https?://\w+\.media\.tumblr\.com/\S+",
+            ("media.tumblr.com",),
+        )
+        self.opengraph = FakeSite("opengraph", r"https?://\S+", fallback=True)
+        self.sites: list[Any] = [
+            self.twitter,
+            self.tumblr,
+            self.tumblr_media,
+            self.opengraph,
+        ]
+        self.router = SiteRouter(self.sites)
+
+    def routed(self, link: str, blacklist: Collection[str] = ()) -> list[Any]:
+        return [site for _, site in self.router.route(link, blacklist)]
+
+    def test_host(self):
+        link = "https://twitter.com/i/status/972064856609210368"
+        assert self.routed(link) == [self.twitter]
+        link = "https://x.com/i/status/972064856609210368"
+        assert self.routed(link) == [self.twitter]
+
+    def test_subdomain(self):
+        link = "https://www.twitter.com/i/status/972064856609210368"
+        assert self.routed(link) == [self.twitter]
+        assert self.routed("https://staff.tumblr.com/post/123") == [self.tumblr]
+
+    def test_case_insensitive(self):
+        assert self.router.candidates("WWW.Twitter.COM") == [self.twitter]
+
+    def test_most_specific_host(self):
+        assert self.router.candidates("64.media.tumblr.com") == [self.tumblr_media]
+        assert self.router.candidates("staff.tumblr.com") == [self.tumblr]
+
+    def test_suffix_is_not_subdomain(self):
+        assert self.router.candidates("nottwitter.com") == [self.opengraph]
+
+    def test_fallback(self):
+        assert self.routed("https://example.com/page") == [self.opengraph]
+
+    def test_claimed_host_skips_fallback(self):
+        # the fallback pattern matches every link, but hosts a site claims only run
+        # that site's patterns
+        assert self.routed("https://twitter.com/home") == []
+
+    def test_blacklist(self):
+        link = "https://twitter.com/i/status/972064856609210368"
+        assert self.routed(link, blacklist={"twitter"}) == []
+        assert self.routed("https://example.com/page", blacklist={"opengraph"}) == []
+
+    def test_match(self):
+        link = "https://twitter.com/i/status/972064856609210368"
+        [(m, _)] = self.router.route(f"see {link} here")
+        assert m.group(0) == link
+
+    def test_link_host(self):
+        assert link_host("https://Example.com:8080/a") == "example.com"
+        assert link_host("not a link") == ""
+        assert link_host("http://[::1") == ""
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import gc
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from beattie.cogs.crosspost import spool
+from beattie.cogs.crosspost.exceptions import FileTooLargeError
+from beattie.cogs.crosspost.spool import Spool, SpoolWriter, clean_spool_dir
+
+
+class SpoolDirMixin(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name) / "spool"
+        patcher = patch.object(spool, "SPOOL_DIR", self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def files(self) -> list[Path]:
+        return sorted(self.dir.glob("*")) if self.dir.exists() else []
+
+
+class SpoolTest(SpoolDirMixin):
+    def test_in_memory(self):
+        data = Spool(b"hello")
+        assert data.in_memory
+        assert len(data) == 5
+        assert data
+        assert not Spool()
+        assert data.read() == b"hello"
+        with data.open() as fp:
+            assert fp.read() == b"hello"
+        assert self.files() == []
+
+    def test_materialize(self):
+        data = Spool(b"hello")
+        path = data.materialize()
+        assert not data.in_memory
+        assert data.materialize() == path
+        assert path.read_bytes() == b"hello"
+        assert data.read() == b"hello"
+        with data.open() as fp, data.open() as fp2:
+            assert fp.read() == fp2.read() == b"hello"
+
+    def test_deleted_when_collected(self):
+        data = Spool(b"hello")
+        path = data.materialize()
+        del data
+        gc.collect()
+        assert not path.exists()
+
+    def test_adopt(self):
+        self.dir.mkdir(parents=True)
+        small = self.dir / "small"
+        small.write_bytes(b"small")
+        data = Spool.adopt(small, threshold=10)
+        assert data.in_memory
+        assert not small.exists()
+        assert data.read() == b"small"
+
+        large = self.dir / "large"
+        large.write_bytes(b"x" * 20)
+        data = Spool.adopt(large, threshold=10)
+        assert data.path == large
+        assert len(data) == 20
+
+    def test_clean(self):
+        self.dir.mkdir(parents=True)
+        old = self.dir / "old"
+        new = self.dir / "new"
+        old.write_bytes(b"")
+        new.write_bytes(b"")
+        os.utime(old, (0, 0))
+        clean_spool_dir(1000)
+        assert self.files() == [new]
+
+
+class SpoolWriterTest(SpoolDirMixin, unittest.IsolatedAsyncioTestCase):
+    async def test_small(self):
+        writer = SpoolWriter(threshold=10)
+        await writer.write(b"abc")
+        await writer.write(b"def")
+        data = await writer.close()
+        assert data.in_memory
+        assert data.read() == b"abcdef"
+        assert self.files() == []
+
+    async def test_spills(self):
+        writer = SpoolWriter(threshold=10)
+        for chunk in (b"abcd", b"efgh", b"ijkl", b"mnop"):
+            await writer.write(chunk)
+        assert len(self.files()) == 1
+        data = await writer.close()
+        assert not data.in_memory
+        assert len(data) == 16
+        assert data.read() == b"abcdefghijklmnop"
+
+    async def test_max_size(self):
+        writer = SpoolWriter(threshold=4, max_size=10)
+        await writer.write(b"abcdef")
+        size = None
+        try:
+            await writer.write(b"ghijkl")
+        except FileTooLargeError as e:
+            size = e.size
+        assert size == 12
+        await writer.abort()
+        assert self.files() == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import unittest
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost.state import SiteState
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class FakeConnection:
+    def __init__(self, pool: FakePool):
+        self.pool = pool
+
+    async def execute(self, _query: str):
+        pass
+
+    async def fetch(self, _query: str) -> list[dict[str, Any]]:
+        return [
+            {"site": site, "key": key, "value": json.dumps(value)}
+            for (site, key), value in self.pool.rows.items()
+        ]
+
+    async def executemany(self, query: str, args: list[tuple[Any, ...]]):
+        if self.pool.fail:
+            msg = "database unavailable"
+            raise OSError(msg)
+        self.pool.batches.append(args)
+        for site, key, *value in args:
+            if query.startswith("DELETE"):
+                del self.pool.rows[site, key]
+            else:
+                self.pool.rows[site, key] = json.loads(value[0])
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        yield
+
+
+class FakePool:
+    """Stands in for asyncpg.Pool, keeping rows in a dict"""
+
+    def __init__(self, rows: dict[tuple[str, str], Any] = None):
+        self.rows = rows or {}
+        self.batches: list[list[tuple[Any, ...]]] = []
+        self.fail = False
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[FakeConnection]:
+        yield FakeConnection(self)
+
+
+class SiteStateTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = FakePool({("site", "old"): {"a": 1}})
+        self.state = SiteState(self.pool, delay=0.01)  # type: ignore
+        await self.state.async_init()
+
+    async def test_load(self):
+        assert self.state.get("site", "old") == {"a": 1}
+        assert self.state.get("site", "missing", 5) == 5
+        assert self.state.items("other") == {}
+
+    async def test_debounced(self):
+        state = self.state
+        state.set("site", "a", 1)
+        state.set("site", "a", 2)
+        state.set("site", "b", 3)
+        assert state.get("site", "a") == 2
+        assert self.pool.batches == []
+        await asyncio.sleep(0.05)
+        assert len(self.pool.batches) == 1
+        assert self.pool.rows["site", "a"] == 2
+        assert self.pool.rows["site", "b"] == 3
+
+    async def test_flush(self):
+        self.state.set("site", "a", 1)
+        self.state.delete("site", "old")
+        await self.state.flush()
+        assert self.pool.rows == {("site", "a"): 1}
+        await asyncio.sleep(0.05)
+        assert len(self.pool.batches) == 2
+
+    async def test_seed(self):
+        self.state.seed("site", {"old": 0, "new": 0})
+        assert self.state.items("site") == {"old": {"a": 1}, "new": 0}
+
+    async def test_listeners(self):
+        changes = []
+        unsubscribe = self.state.subscribe(
+            "site",
+            lambda key, value: changes.append((key, value)),
+        )
+        self.state.set("site", "a", 1)
+        self.state.set("other", "a", 1)
+        self.state.delete("site", "old")
+        self.state.delete("site", "old")
+        unsubscribe()
+        self.state.set("site", "a", 2)
+        assert changes == [("a", 1), ("old", None)]
+
+    async def test_failed_write_kept(self):
+        self.state.set("site", "a", 1)
+        self.pool.fail = True
+        failed = False
+        try:
+            await self.state.flush()
+        except OSError:
+            failed = True
+        assert failed
+        self.state.set("site", "b", 2)
+        self.pool.fail = False
+        await self.state.flush()
+        assert self.pool.rows["site", "a"] == 1
+        assert self.pool.rows["site", "b"] == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost.translation_cache import segment_key
+from beattie.cogs.crosspost.translator import CachingTranslator, Language, Translator
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Coroutine, Mapping, Sequence
+
+
+class FakeTranslator(Translator):
+    """Uppercases text, recording each batch it's asked to translate"""
+
+    name = "fake"
+
+    def __init__(self):
+        super().__init__(None, "", "")  # pyright: ignore[reportArgumentType]
+        self.requests: list[list[str]] = []
+        self.merge = False
+
+    async def languages(self) -> Mapping[str, Language]:
+        return {}
+
+    async def detect(self, text: str) -> Language:  # noqa: ARG002
+        return Language("ja", "Japanese")
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        return (await self.translate_many([text], source, target))[0]
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,  # noqa: ARG002
+        target: str,  # noqa: ARG002
+    ) -> list[str]:
+        self.requests.append(list(texts))
+        if self.merge:
+            return [" ".join(text.split("\n")).upper() for text in texts]
+        return [text.upper() for text in texts]
+
+
+class FakeCache:
+    """Stands in for TranslationCache, keeping translations in a dict"""
+
+    def __init__(self):
+        self.translations: dict[bytes, str] = {}
+
+    async def get_many(self, keys: Collection[bytes]) -> dict[bytes, str]:
+        return {key: self.translations[key] for key in keys if key in self.translations}
+
+    async def put_many(self, translations: Mapping[bytes, str]):
+        self.translations.update(translations)
+
+
+class SegmentKeyTest(unittest.TestCase):
+    def test_normalized(self):
+        key = segment_key("caf\u00e9", "fr", "en", "deepl")
+        assert segment_key("cafe\u0301", "fr", "en", "deepl") == key
+        assert segment_key("  caf\u00e9\n", "fr", "en", "deepl") == key
+
+    def test_distinct(self):
+        key = segment_key("hello", "fr", "en", "deepl")
+        assert segment_key("hello", "fr", "en", "libre") != key
+        assert segment_key("hello", "de", "en", "deepl") != key
+        assert segment_key("hello", "fr", "de", "deepl") != key
+        assert segment_key("hell", "ofr", "en", "deepl") != key
+
+
+class CachingTranslatorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.tasks: list[asyncio.Task[Any]] = []
+
+        def create_task(coro: Coroutine[Any, Any, Any]) -> asyncio.Task[Any]:
+            task = asyncio.create_task(coro)
+            self.tasks.append(task)
+            return task
+
+        cog: Any = SimpleNamespace(
+            bot=SimpleNamespace(shared=SimpleNamespace(create_task=create_task)),
+        )
+        self.inner = FakeTranslator()
+        self.cache = FakeCache()
+        cache: Any = self.cache
+        self.translator = CachingTranslator(cog, self.inner, cache)
+
+    async def translate(self, *texts: str) -> list[str]:
+        out = await self.translator.translate_many(texts, "ja", "en")
+        await asyncio.gather(*self.tasks)
+        return out
+
+    async def test_lines_cached(self):
+        assert await self.translate("a\nb", "b\n\nc") == ["A\nB", "B\n\nC"]
+        assert self.inner.requests == [["a\nb", "b\nc"]]
+        assert await self.translate("c\n a\nd") == ["C\nA\nD"]
+        assert self.inner.requests[1:] == [["d"]]
+
+    async def test_fully_cached(self):
+        await self.translate("a\nb")
+        assert await self.translate("b\na") == ["B\nA"]
+        assert len(self.inner.requests) == 1
+
+    async def test_merged_lines(self):
+        self.inner.merge = True
+        assert await self.translate("a\nb") == ["A B"]
+        self.inner.merge = False
+        assert await self.translate("a\nb") == ["A B"]
+        assert len(self.inner.requests) == 1
+
+    async def test_merged_partial(self):
+        await self.translate("a")
+        self.inner.merge = True
+        # b and c can't be matched up, so the whole text is translated again
+        assert await self.translate("a\nb\nc") == ["A B C"]
+        assert self.inner.requests[1:] == [["b\nc"], ["a\nb\nc"]]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+from beattie.cogs.crosspost.detection import make_executor
+from beattie.cogs.crosspost.exceptions import (
+    TranslationQuotaError,
+    TranslatorClosedError,
+)
+from beattie.cogs.crosspost.translator import (
+    BATCH_SIZE,
+    BatchingTranslator,
+    HybridTranslator,
+    Language,
+    Translator,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Coroutine, Mapping, Sequence
+
+
+class FakeTranslator(Translator):
+    """Prefixes text with its name, recording each batch it's asked to translate"""
+
+    def __init__(self, name: str, *, error: Exception | None = None):
+        super().__init__(None, "", "")  # pyright: ignore[reportArgumentType]
+        self.name = name
+        self.error = error
+        self.requests: list[tuple[list[str], str, str]] = []
+        self.lang_failures = 0
+
+    async def languages(self) -> Mapping[str, Language]:
+        if self.lang_failures:
+            self.lang_failures -= 1
+            msg = "language list unavailable"
+            raise ConnectionError(msg)
+        return {"ja": Language("ja", "Japanese"), "en": Language("en", "English")}
+
+    async def detect(self, text: str) -> Language:  # noqa: ARG002
+        return Language("ja", "Japanese")
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        return (await self.translate_many([text], source, target))[0]
+
+    async def translate_many(
+        self,
+        texts: Sequence[str],
+        source: str,
+        target: str,
+    ) -> list[str]:
+        self.requests.append((list(texts), source, target))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [f"{self.name}: {text}" for text in texts]
+
+
+def make_cog() -> Any:
+    def create_task(coro: Coroutine[Any, Any, Any]) -> asyncio.Task[Any]:
+        return asyncio.create_task(coro)
+
+    return SimpleNamespace(
+        bot=SimpleNamespace(shared=SimpleNamespace(create_task=create_task)),
+        detectors={},
+        detection_executor=make_executor(),
+    )
+
+
+class BatchingTranslatorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.inner = FakeTranslator("inner")
+        self.translator = BatchingTranslator(make_cog(), self.inner, window=0.01)
+
+    async def test_batched(self):
+        out = await asyncio.gather(
+            self.translator.translate("a", "ja", "en"),
+            self.translator.translate("b", "ja", "en"),
+            self.translator.translate("a", "ja", "en"),
+            self.translator.translate("a", "zh", "en"),
+        )
+        assert out == ["inner: a", "inner: b", "inner: a", "inner: a"]
+        assert sorted(self.inner.requests, key=lambda req: req[1]) == [
+            (["a", "b"], "ja", "en"),
+            (["a"], "zh", "en"),
+        ]
+
+    async def test_full_batch_sent_early(self):
+        self.translator.window = 60
+        texts = [str(i) for i in range(BATCH_SIZE + 1)]
+        tasks = [
+            asyncio.create_task(self.translator.translate(text, "ja", "en"))
+            for text in texts
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=1)
+        assert len(done) == BATCH_SIZE
+        assert len(pending) == 1
+        assert self.inner.requests == [(texts[:BATCH_SIZE], "ja", "en")]
+        for task in pending:
+            task.cancel()
+
+    async def test_error_shared(self):
+        self.inner.error = TranslationQuotaError("inner")
+        results = await asyncio.gather(
+            self.translator.translate("a", "ja", "en"),
+            self.translator.translate("b", "ja", "en"),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, TranslationQuotaError) for result in results)
+        assert len(self.inner.requests) == 1
+
+    async def test_close_fails_pending(self):
+        self.translator.window = 60
+        task = asyncio.create_task(self.translator.translate("a", "ja", "en"))
+        await asyncio.sleep(0)
+        self.translator.close()
+        results = await asyncio.gather(task, return_exceptions=True)
+        assert isinstance(results[0], TranslatorClosedError)
+        assert self.inner.requests == []
+
+    async def test_close_fails_in_flight(self):
+        started = asyncio.Event()
+
+        async def hang(*_args: Any) -> list[str]:
+            started.set()
+            await asyncio.sleep(60)
+            return []
+
+        self.inner.translate_many = hang  # type: ignore
+        tasks = [
+            asyncio.create_task(self.translator.translate(text, "ja", "en"))
+            for text in "ab"
+        ]
+        await asyncio.wait_for(started.wait(), 1)
+        self.translator.close()
+        results = await asyncio.wait_for(
+            asyncio.gather(*tasks, return_exceptions=True),
+            1,
+        )
+        assert all(isinstance(result, TranslatorClosedError) for result in results)
+
+
+class HybridTranslatorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_quota_falls_back(self):
+        libre = FakeTranslator("libre")
+        deepl = FakeTranslator("deepl", error=TranslationQuotaError("deepl"))
+        translator = HybridTranslator(make_cog(), libre, deepl)  # type: ignore
+        out = await translator.translate_many(["a", "b"], "ja", "en")
+        assert out == ["libre: a", "libre: b"]
+        assert deepl.requests == [(["a", "b"], "ja", "en")]
+        assert libre.requests == [(["a", "b"], "ja", "en")]
+
+    async def test_deepl_preferred(self):
+        libre = FakeTranslator("libre")
+        deepl = FakeTranslator("deepl")
+        translator = HybridTranslator(make_cog(), libre, deepl)  # type: ignore
+        out = await translator.translate_many(["a", "b"], "ja", "en")
+        assert out == ["deepl: a", "deepl: b"]
+        assert libre.requests == []
+
+    async def test_languages_retried(self):
+        libre = FakeTranslator("libre")
+        deepl = FakeTranslator("deepl")
+        deepl.lang_failures = 1
+        translator = HybridTranslator(make_cog(), libre, deepl)  # type: ignore
+        failed = False
+        try:
+            await translator.languages()
+        except ConnectionError:
+            failed = True
+        assert failed
+        langs = await translator.languages()
+        assert set(langs) == {"xx", "zz", "ja", "en"}
+
+
+if __name__ == "__main__":
+    unittest.main()